@@ -1,19 +1,35 @@
 
 # app.py
-from flask import send_file, Flask, render_template, request, jsonify, session, send_from_directory, url_for
+from flask import send_file, Flask, Response, render_template, request, jsonify, session, send_from_directory, url_for, stream_with_context, g
 from flask_cors import CORS
-import os, logging, re, httpx, io, zipfile
+import os, logging, io, json, threading, time, hmac, itertools, secrets
 from dotenv import load_dotenv
 from openai import AzureOpenAI
 
 from utils import (
-    ask_markdown_azure,
+    ask_markdown_azure, stream_markdown_azure, deadline_after,
     generate_project_document,
-    _md_link, _is_yes, _is_no,
+    _md_link,
     save_tree_json, process_uploaded_excel,
     causas_tree_to_markdown, objetivos_tree_to_markdown,
     conversation_flow,
-    SYSTEM_PRIMER
+    SYSTEM_PRIMER, DOC_PROMPT
+)
+from llm_transport import make_http_client
+from llm_limiter import BUSY_MESSAGE, LLMBusy, admitted_clients, limiter_from_env
+from chat_flow import ChatFlow
+from assets import AssetManifest
+from jobs import JobQueue, STATUS_DONE, STATUS_ERROR
+from retention import referenced_artifacts, retention_from_env
+from llm_cache import CompletionCache
+from session_store import make_session_interface
+from tree_cache import TreeCache, content_hash
+from tree_store import find_tree
+from metrics import CONTENT_TYPE, HTTP_SECONDS, UPLOAD_BYTES, metrics_from_env, register_stats
+from tracing import span, to_chrome_trace, to_folded, tracer_from_env
+from explanations import (
+    PrecomputedExplanations, explanation_messages, generate_explanation, static_topics,
+    EXPLANATION_MAX_TOKENS, EXPLANATION_TEMPERATURE
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -31,13 +47,186 @@ FORMULARIOS_JSON_DIR = os.path.join(app.static_folder, 'formularios_json')
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
 os.makedirs(FORMULARIOS_DIR, exist_ok=True)
 os.makedirs(FORMULARIOS_JSON_DIR, exist_ok=True)
+DATA_DIR = os.getenv('APP_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+# Sesión del lado del servidor: la cookie solo lleva un id opaco (SESSION_BACKEND=sqlite|file|cookie)
+_session_interface = make_session_interface(
+    os.getenv('SESSION_BACKEND', 'sqlite'), DATA_DIR,
+    idle_ttl=float(os.getenv('SESSION_IDLE_TTL', str(2 * 3600)))
+)
+if _session_interface is not None:
+    app.session_interface = _session_interface
 
-client = AzureOpenAI(
+# Pool HTTP con timeouts por fase (LLM_POOL_*, LLM_*_TIMEOUT, LLM_HTTP2); llm_transport.stats() da el estado del pool
+http_client, llm_transport = make_http_client()
+azure_client = AzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
     api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-05-01-preview"),
-    http_client=httpx.Client(verify=False)
+    http_client=http_client,
+    timeout=http_client.timeout,
+    # Sin reintentos del SDK: ante un 429 el backoff lo hace el limitador (Retry-After compartido)
+    max_retries=0
+)
+# Control de admisión compartido entre workers (LLM_MAX_CONCURRENCY, LLM_TPM_LIMIT, LLM_RPM_LIMIT, LLM_QUEUE_*):
+# el chat rechaza rápido si la cola está llena; la generación del documento espera dentro de su plazo
+llm_limiter = limiter_from_env(DATA_DIR)
+client, doc_client = admitted_clients(azure_client, llm_limiter)
+# Plazos totales por llamada (segundos): chat interactivo y generación del documento
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "90"))
+DOC_DEADLINE = float(os.getenv("DOC_DEADLINE", "600"))
+
+# ---------- Caché de respuestas del LLM ----------
+completion_cache = CompletionCache(
+    max_entries=int(os.getenv('LLM_CACHE_SIZE', '256')),
+    ttl_s=float(os.getenv('LLM_CACHE_TTL', str(24 * 3600))),
+    disk_path=os.path.join(DATA_DIR, 'llm_cache.sqlite3') if os.getenv('LLM_CACHE_DISK', '1') == '1' else None
+)
+
+# ---------- Cola de generación de documentos ----------
+# Árboles ya parseados en la subida, por hash del .xlsx (evita releer el JSON al generar)
+tree_cache = TreeCache(
+    max_bytes=int(os.getenv('TREE_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+    ttl_s=float(os.getenv('TREE_CACHE_TTL', str(2 * 3600)))
+)
+
+def _generate_document_job(payload: dict) -> dict:
+    responses = payload["responses"]
+    tree = None
+    if responses.get("upload_plantilla"):
+        base_plantilla = os.path.splitext(responses["upload_plantilla"])[0]
+        tree_path = os.path.join(FORMULARIOS_JSON_DIR, f"{base_plantilla}.tree")
+        with span("arbol.cargar"):
+            tree = tree_cache.get_or_load(responses.get("upload_plantilla_sha256"), tree_path)
+    filepath = generate_project_document(
+        responses,
+        client=doc_client,
+        documents_dir=DOCUMENTS_DIR,
+        causas_tree=tree,  # Si no hay árbol, se cargará desde JSON
+        objetivos_tree=tree,
+        formularios_json_dir=FORMULARIOS_JSON_DIR,
+        deadline=deadline_after(DOC_DEADLINE),
+        cache=completion_cache
+    )
+    return {"filename": os.path.basename(filepath)}
+
+job_queue = JobQueue(
+    os.path.join(DATA_DIR, 'jobs.sqlite3'),
+    max_workers=int(os.getenv('DOC_JOBS_WORKERS', '2'))
+)
+job_queue.register('generate_document', _generate_document_job)
+job_queue.recover()
+
+# ---------- Retención de documentos y plantillas subidas ----------
+# Borra por antigüedad y por cuota (LRU por última descarga), nunca lo que use una sesión viva
+retention = retention_from_env(
+    DOCUMENTS_DIR, FORMULARIOS_DIR, FORMULARIOS_JSON_DIR, DATA_DIR,
+    referenced=lambda: referenced_artifacts(_session_interface, job_queue),
+    session_ttl_s=float(os.getenv('SESSION_IDLE_TTL', str(2 * 3600)))
 )
+if os.getenv('RETENTION_ENABLED', '1') == '1':
+    retention.start(float(os.getenv('RETENTION_INTERVAL', '3600')))
+
+# ---------- Métricas (/metrics) ----------
+# Cada worker acumula en memoria y vuelca a data/metrics.sqlite3; /metrics suma todos los workers
+metrics = metrics_from_env(DATA_DIR)
+register_stats("completion_cache", completion_cache.stats)
+register_stats("tree_cache", tree_cache.stats)
+register_stats("llm_transport", llm_transport.stats)
+register_stats("doc_prompt", DOC_PROMPT.stats)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+if os.getenv('METRICS_ENABLED', '1') == '1':
+    metrics.start()
+
+# ---------- Trazas y perfilado bajo demanda (X-Trace / X-Profile, TRACE_SAMPLE_RATE) ----------
+tracer = tracer_from_env(DATA_DIR)
+TRACE_TOKEN = os.getenv('TRACE_TOKEN', '')
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+    root = tracer.start(f"{request.method} {request.path}", request.headers)
+    if root is not None:
+        root.__enter__().set(endpoint=request.endpoint or "sin_ruta")
+        g.trace_root = root
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "sin_ruta",
+                             method=request.method, status=response.status_code)
+    root = g.get('trace_root')
+    if root is not None:
+        root.span.set(status=response.status_code)
+        response.headers['X-Trace-Id'] = root.trace.id
+    return response
+
+@app.teardown_request
+def _finish_trace(exc):
+    root = g.pop('trace_root', None)
+    if root is not None:
+        root.__exit__(type(exc) if exc else None, exc, None)
+
+@app.errorhandler(LLMBusy)
+def _llm_busy(e):
+    # Saturación (cola llena o cuota de Azure agotada): 429 con un mensaje para el usuario, no un 500
+    return jsonify({"ok": False, "error_code": "busy", "response": str(e), "format": "markdown"}), 429, \
+        {"Retry-After": str(max(1, round(e.retry_after)))}
+
+def _authorized(token: str) -> bool:
+    return not token or hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if os.getenv('METRICS_ENABLED', '1') != '1':
+        return "Métricas deshabilitadas", 404
+    if not _authorized(METRICS_TOKEN):
+        return "No autorizado", 401
+    extra = []
+    # Calculados al consultar: valen para todos los workers (sesiones y cola son compartidas)
+    if hasattr(_session_interface, "live_values"):
+        per_step = {}
+        for _, step in _session_interface.live_values(["current_step"]):
+            per_step[step] = per_step.get(step, 0) + 1
+        extra += [("idec_active_sessions", "gauge", "Sesiones activas por paso del flujo.", {"step": step}, n)
+                  for step, n in sorted(per_step.items())]
+    extra += [("idec_jobs", "gauge", "Trabajos de generación por estado.", {"status": status}, n)
+              for status, n in sorted(job_queue.counts().items())]
+    extra += [("idec_llm_admission", "gauge", "Estado global del control de admisión al LLM.", {"stat": stat}, value)
+              for stat, value in llm_limiter.snapshot().items()]
+    return Response(metrics.render(extra), content_type=CONTENT_TYPE, headers={"Cache-Control": "no-cache"})
+
+@app.route('/debug/traces')
+def list_traces():
+    # Sin TRACE_TOKEN las trazas no se exponen (solo para operadores)
+    if not TRACE_TOKEN:
+        return "No encontrado", 404
+    if not _authorized(TRACE_TOKEN):
+        return "No autorizado", 401
+    limit = request.args.get('limit', '50')
+    if not limit.isdigit() or not 1 <= int(limit) <= 1000:
+        return jsonify({"error": "limit debe ser un entero entre 1 y 1000"}), 400
+    return jsonify({"traces": tracer.store.recent(int(limit))})
+
+@app.route('/debug/traces/<trace_id>')
+def get_trace(trace_id):
+    """?format=json (por defecto) | chrome (chrome://tracing, Perfetto) | folded (flamegraph.pl, speedscope)."""
+    if not TRACE_TOKEN:
+        return "No encontrado", 404
+    if not _authorized(TRACE_TOKEN):
+        return "No autorizado", 401
+    data = tracer.store.load(trace_id)
+    if data is None:
+        return jsonify({"error": "Traza no encontrada"}), 404
+    fmt = request.args.get('format', 'json')
+    if fmt == 'chrome':
+        return jsonify(to_chrome_trace(data))
+    if fmt == 'folded':
+        if data["profile"] is None:
+            return jsonify({"error": "La traza no se perfiló (use X-Profile)"}), 404
+        return Response(to_folded(data), mimetype='text/plain')
+    return jsonify(data)
 
 @app.route('/')
 def index():
@@ -47,55 +236,14 @@ def index():
     session['mode'] = 'flow'
     return render_template('index.html')
 
-@app.route('/download_templates')
-def download_templates():
-    # Ruta a las plantillas de Excel
-    templates_folder = os.path.join(BASE_DIR, "plantillas_excel")
-    
-    if not os.path.exists(templates_folder):
-        logger.error(f"La carpeta de plantillas no existe: {templates_folder}")
-        return "Carpeta de plantillas no encontrada", 404
-
-    # Obtener todos los archivos Excel de la carpeta
-    excel_files = []
-    for root, _, files in os.walk(templates_folder):
-        for file in files:
-            if file.lower().endswith(('.xlsx', '.xls')):
-                file_path = os.path.join(root, file)
-                excel_files.append((file_path, file))
-    
-    if not excel_files:
-        logger.error(f"No se encontraron archivos Excel en: {templates_folder}")
-        return "No se encontraron plantillas", 404
-    
-    # Si solo hay un archivo, descargarlo directamente
-    if len(excel_files) == 1:
-        file_path, filename = excel_files[0]
-        return send_file(
-            file_path,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
-    
-    # Si hay múltiples archivos, crear ZIP
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for file_path, filename in excel_files:
-            zf.write(file_path, filename)
-    memory_file.seek(0)
-
-    return send_file(
-        memory_file,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name='plantillas_excel.zip'
-    )
-
-@app.route('/download_manual')
-def download_manual():
-    # Buscar manual en diferentes ubicaciones y formatos
-    possible_names = [
+# ---------- Descargas fijas (plantillas y manual) ----------
+# Resueltas una vez al arrancar; se reconstruyen solas si cambian los archivos en disco
+TEMPLATES_DIR = os.path.join(BASE_DIR, "plantillas_excel")
+asset_manifest = AssetManifest(
+    templates_dir=TEMPLATES_DIR,
+    # Buscar manual en diferentes ubicaciones y formatos (static/documents y static)
+    manual_dirs=[DOCUMENTS_DIR, app.static_folder],
+    manual_names=[
         'manual_de_uso.pdf',
         'manual_de_uso.docx',
         'Manual_de_Uso.pdf',
@@ -103,44 +251,74 @@ def download_manual():
         'manual.pdf',
         'Manual.pdf'
     ]
-    
-    # Buscar en static/documents y en static
-    search_paths = [
-        DOCUMENTS_DIR,
-        app.static_folder
-    ]
-    
-    for search_path in search_paths:
-        for name in possible_names:
-            manual_path = os.path.join(search_path, name)
-            if os.path.isfile(manual_path):
-                # Determinar mimetype basado en extensión
-                if name.endswith('.pdf'):
-                    mimetype = 'application/pdf'
-                elif name.endswith('.docx'):
-                    mimetype = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                else:
-                    mimetype = 'application/octet-stream'
-                
-                return send_file(
-                    manual_path,
-                    mimetype=mimetype,
-                    as_attachment=True,
-                    download_name='manual_de_uso.pdf' if name.endswith('.pdf') else 'manual_de_uso.docx'
-                )
-    
-    # Si no se encuentra, devolver error
-    logger.warning("Manual de uso no encontrado")
-    return "Manual de uso no disponible", 404
+)
+asset_manifest.warm()
+
+def _send_asset(asset):
+    """ETag fuerte + Last-Modified: responde 304 a If-None-Match/If-Modified-Since y 206 a Range."""
+    return send_file(
+        io.BytesIO(asset.data),
+        mimetype=asset.mimetype,
+        as_attachment=True,
+        download_name=asset.download_name,
+        etag=asset.etag,
+        last_modified=asset.last_modified,
+        conditional=True
+    )
+
+@app.route('/download_templates')
+def download_templates():
+    asset = asset_manifest.templates()
+    if asset is None:
+        if not os.path.exists(TEMPLATES_DIR):
+            logger.error(f"La carpeta de plantillas no existe: {TEMPLATES_DIR}")
+            return "Carpeta de plantillas no encontrada", 404
+        logger.error(f"No se encontraron archivos Excel en: {TEMPLATES_DIR}")
+        return "No se encontraron plantillas", 404
+    # Una sola plantilla se entrega tal cual; si hay varias, el ZIP precalculado
+    return _send_asset(asset)
+
+@app.route('/download_manual')
+def download_manual():
+    asset = asset_manifest.manual()
+    if asset is None:
+        logger.warning("Manual de uso no encontrado")
+        return "Manual de uso no disponible", 404
+    return _send_asset(asset)
 
 @app.route('/download/<path:filename>')
 def download_file(filename):
     try:
-        return send_from_directory(DOCUMENTS_DIR, filename, as_attachment=True)
+        response = send_from_directory(DOCUMENTS_DIR, filename, as_attachment=True)
+        retention.record_use(os.path.join(DOCUMENTS_DIR, filename))
+        return response
     except Exception as e:
         logger.error(f"Error descargando archivo: {e}")
         return "Error al descargar el archivo", 404
 
+def _session_owner(create: bool = False):
+    """Id de la sesión actual: el sid del servidor o, con la sesión en cookie, un token guardado en ella."""
+    sid = getattr(session, "sid", None)
+    if sid is None:
+        sid = session.setdefault('job_owner', secrets.token_urlsafe(16)) if create else session.get('job_owner')
+    return sid
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    owner = _session_owner()
+    # Un trabajo de otra sesión se responde igual que uno inexistente
+    if job is None or not owner or job["session_id"] != owner:
+        return jsonify({"ok": False, "error": "Trabajo no encontrado"}), 404
+    payload = {"ok": True, "id": job["id"], "status": job["status"]}
+    if job["status"] == STATUS_DONE:
+        url = url_for('download_file', filename=job["result"]["filename"])
+        payload["download_url"] = url
+        payload["response"] = f"✅ Flujo completado. Documento generado. {_md_link(url, 'Descargar documento')}"
+    elif job["status"] == STATUS_ERROR:
+        payload["response"] = "❌ No fue posible generar el documento. Usa *Reiniciar* para intentarlo de nuevo."
+    return jsonify(payload)
+
 @app.route('/plantilla/<tipo>')
 def plantilla(tipo):
     fname = 'plantillas_excel/PlantillaCausa.xlsx' if tipo == 'causa' else 'plantillas_excel/PlantillaObjetivo.xlsx' if tipo == 'objetivo' else None
@@ -150,6 +328,14 @@ def plantilla(tipo):
     return send_from_directory(BASE_DIR, fname, as_attachment=True)
 
 # ---------- Upload + validación + parse + JSON ----------
+def _reuse_upload(path: str) -> bool:
+    """Marca como recién usado un archivo ya subido; False si no existe (o la retención lo acaba de borrar)."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
 @app.route('/api/upload_formulario', methods=['POST'])
 def upload_formulario():
     if 'file' not in request.files:
@@ -164,31 +350,40 @@ def upload_formulario():
     if not original_name.lower().endswith('.xlsx'):
         return jsonify({"ok": False, "error_code": "not_xlsx", "error": "El archivo debe ser un Excel .xlsx."}), 400
 
-    # Guardar archivo
+    # Guardar archivo (direccionado por contenido: la misma plantilla se guarda y se parsea una sola vez)
     data = f.read()
-    proyecto = session.get('responses', {}).get('nombre_proyecto', 'proyecto')
-    slug = re.sub(r'[^A-Za-z0-9_\-]+', '_', proyecto).strip('_') or 'proyecto'
-    
+    UPLOAD_BYTES.observe(len(data))
+    digest = content_hash(data)
+
     responses = session.get('responses', {})
     previews_md = []
     json_files = []
     
-    # Procesar plantilla general
-    filename = f"plantilla-{slug}.xlsx"
+    filename = f"plantilla-{digest}.xlsx"
     save_path = os.path.join(FORMULARIOS_DIR, filename)
-    with open(save_path, 'wb') as out:
-        out.write(data)
+    if not _reuse_upload(save_path):
+        tmp_path = f"{save_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, save_path)
     
     responses["upload_plantilla"] = filename
+    responses["upload_plantilla_sha256"] = digest
     session['responses'] = responses
     
     # Procesar plantilla general (sin división entre causas y objetivos)
     try:
-        # La función process_uploaded_excel procesa toda la plantilla (causas y objetivos juntos)
-        info = process_uploaded_excel('plantilla', save_path, FORMULARIOS_JSON_DIR)
-        
-        # El árbol contiene todas las hojas procesadas con causas y objetivos
-        trees = info.get("tree", {})
+        # Plantilla ya conocida: se reutiliza el árbol memoizado (memoria o disco) sin parsear
+        known_json = find_tree(FORMULARIOS_JSON_DIR, f"plantilla-{digest}")
+        trees = tree_cache.get_or_load(digest, known_json) if known_json and _reuse_upload(known_json) else None
+        if trees is not None:
+            info = {"json_path": known_json, "tree": trees, "preview_md": None}
+        else:
+            # La función process_uploaded_excel procesa toda la plantilla (causas y objetivos juntos)
+            info = process_uploaded_excel('plantilla', save_path, FORMULARIOS_JSON_DIR)
+            # El árbol contiene todas las hojas procesadas con causas y objetivos
+            trees = info.get("tree", {})
+            tree_cache.put(digest, trees)
         
         # NO guardar los árboles completos en la sesión (son muy grandes para cookies)
         # Solo guardar referencias a los archivos JSON que ya se guardaron en disco
@@ -226,12 +421,98 @@ def reset_conversation():
     return jsonify({"status": "ok", "message": "Conversación reiniciada"})
 
 # ---------- Chat Libre ----------
+ALT_INTRO_MD = "💬 Has activado el **Chat Libre** para resolver esta duda.\n\n"
+
+# Temas fijos que se explican cuando el usuario responde "No" en las compuertas (ver "alt_topic")
+ALT_TOPICS = static_topics()
+# Artefacto generado offline con `python explanations.py`; si falta o está desactualizado se usa el LLM
+precomputed_explanations = PrecomputedExplanations()
+
+def _alt_chat_messages(user_message: str):
+    return [{"role":"system","content":SYSTEM_PRIMER + "\nResponde en Markdown válido, sin HTML."},
+            {"role":"user","content":user_message}]
+
+def _wants_stream(data: dict) -> bool:
+    """El front pide streaming con {"stream": true}; otros clientes siguen recibiendo JSON."""
+    return bool(data.get("stream"))
+
+def _sse_response(chunks, prefix: str = ""):
+    """Responde como Server-Sent Events: un evento 'data' por fragmento y 'done' al final."""
+    def events():
+        try:
+            if prefix:
+                yield f"data: {json.dumps({'delta': prefix}, ensure_ascii=False)}\n\n"
+            for delta in chunks:
+                yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except LLMBusy as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e), 'error_code': 'busy'}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.exception("Error durante el streaming de la respuesta")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _admitted_stream(chunks):
+    """Pide el primer fragmento antes de responder: si el LLM está saturado, LLMBusy sale como 429
+    sin tocar la sesión; los demás errores se siguen informando dentro del stream."""
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return iter(())
+    except LLMBusy:
+        raise
+    except Exception as e:
+        def failed():
+            raise e
+            yield
+        return failed()
+    return itertools.chain([first], chunks)
+
+# El modo 'alt' solo se activa cuando la explicación ya fue admitida (un 429 deja al usuario en el flujo)
 def _bootstrap_alt_explanation(topic_md: str):
+    md = generate_explanation(topic_md, client=client, cache=completion_cache,
+                              deadline=deadline_after(LLM_CALL_DEADLINE))
     session['mode'] = 'alt'
-    system_msg = {"role": "system", "content": SYSTEM_PRIMER + "\nResponde SIEMPRE en Markdown claro, con viñetas y ejemplo."}
-    user_msg   = {"role": "user", "content": f"{topic_md}\n\nTermina con: 'Cuando estés listo, escribe **Finalizar** para volver al flujo.'"}  # noqa: E501
-    md = ask_markdown_azure([system_msg, user_msg], client=client, max_tokens=1000, temperature=0.4)
-    return "💬 Has activado el **Chat Libre** para resolver esta duda.\n\n" + md
+    return ALT_INTRO_MD + md
+
+def _bootstrap_alt_explanation_stream(topic_md: str):
+    chunks = _admitted_stream(stream_markdown_azure(
+        explanation_messages(topic_md), client=client, max_tokens=EXPLANATION_MAX_TOKENS,
+        temperature=EXPLANATION_TEMPERATURE, cache=completion_cache,
+        deadline=deadline_after(LLM_CALL_DEADLINE), site="explicacion"
+    ))
+    session['mode'] = 'alt'
+    return _sse_response(chunks, prefix=ALT_INTRO_MD)
+
+def _prewarm_gate_explanations():
+    """Llena la caché con las explicaciones fijas que no estén precalculadas (sin costo si ya están en disco)."""
+    for step_key, topic_md in ALT_TOPICS.items():
+        if precomputed_explanations.get(step_key, topic_md) is not None:
+            continue
+        try:
+            generate_explanation(topic_md, client=client, cache=completion_cache)
+        except Exception:
+            logger.exception("No se pudo precalentar la caché del LLM")
+
+if os.getenv('LLM_CACHE_PREWARM', '0') == '1':
+    threading.Thread(target=_prewarm_gate_explanations, name="llm-cache-prewarm", daemon=True).start()
+
+def _gate_explanation(step_key: str, data: dict):
+    topic_md = ALT_TOPICS[step_key]
+    md = precomputed_explanations.get(step_key, topic_md)
+    if md is not None:
+        # Explicación precalculada: sin llamada al LLM
+        session['mode'] = 'alt'
+        if _wants_stream(data):
+            return _sse_response([md], prefix=ALT_INTRO_MD)
+        return jsonify({"response": ALT_INTRO_MD + md, "format": "markdown"})
+    if _wants_stream(data):
+        return _bootstrap_alt_explanation_stream(topic_md)
+    return jsonify({"response": _bootstrap_alt_explanation(topic_md), "format": "markdown"})
 
 @app.route('/api/chat_alt', methods=['POST'])
 def chat_alt():
@@ -250,344 +531,50 @@ def chat_alt():
             "format": "markdown"
         })
 
+    if _wants_stream(data):
+        return _sse_response(stream_markdown_azure(
+            _alt_chat_messages(user_message),
+            client=client,
+            model_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            max_tokens=1500, temperature=0.4, max_rounds=3,
+            cache=completion_cache, deadline=deadline_after(LLM_CALL_DEADLINE), site="chat_libre"
+        ))
+
     md = ask_markdown_azure(
-        [{"role":"system","content":SYSTEM_PRIMER + "\nResponde en Markdown válido, sin HTML."},
-         {"role":"user","content":user_message}],
+        _alt_chat_messages(user_message),
         client=client,
         model_name=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        max_tokens=1500, temperature=0.4, max_rounds=3
+        max_tokens=1500, temperature=0.4, max_rounds=3,
+        cache=completion_cache, deadline=deadline_after(LLM_CALL_DEADLINE), site="chat_libre"
     )
     return jsonify({"response": md, "format": "markdown"})
 
 # ---------- Flujo ----------
-def _upload_prompt_with_link(step_key: str) -> str:
-    if step_key == 'upload_plantilla':
-        return ("📄 **Cargar plantilla.**\n\n"
-                "1. Descargue la plantilla en la parte superior del chat.\n"
-                "2. Seleccione la **PlantillaIDEC-IA.xlsx**.\n"
-                "3. Diligénciela con los árboles de problemas, objetivos, productos e indicadores.\n"
-                "4. Súbala en el recuadro que aparece debajo.\n\n")
-    return ""
+def _start_document_job(responses: dict):
+    """Encola la generación del documento y devuelve el payload para que el front consulte el estado."""
+    if llm_limiter.queue_full():
+        # Sin encolar: el usuario sigue en el mismo paso y puede reintentar
+        return jsonify({"ok": False, "error_code": "busy", "response": BUSY_MESSAGE, "format": "markdown",
+                        "current_step": session.get('current_step')}), 429, {"Retry-After": "30"}
+    session['current_step'] = "finalizado"
+    # ---- Generar documento enriquecido con árboles (en segundo plano) ----
+    # Los árboles no están en la sesión (muy grandes para cookies), se cargarán desde JSON
+    job_id = job_queue.submit('generate_document', {"responses": responses}, session_id=_session_owner(create=True))
+    session['document_job_id'] = job_id
+    return jsonify({
+        "response": "⏳ Estamos generando tu documento. Esto puede tardar un par de minutos…",
+        "current_step": "finalizado", "format": "markdown",
+        "job": {"id": job_id, "status_url": url_for('job_status', job_id=job_id)}
+    })
+
+# Tabla de transiciones compilada una vez: despacho O(1) y respuestas fijas ya serializadas
+chat_flow = ChatFlow(conversation_flow, start_job=_start_document_job, gate_explanation=_gate_explanation)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     if session.get("mode") == "alt":
         return chat_alt()
-
-    data = request.get_json() or {}
-    user_message = (data.get('message') or '').strip()
-    user_lower = user_message.lower()
-
-    current_step = session.get('current_step', 'intro_bienvenida')
-    responses = session.get('responses', {})
-
-    # Inicio rápido
-    if current_step == 'intro_bienvenida' and user_lower in ('iniciar', 'start'):
-        intro = conversation_flow['intro_bienvenida']
-        return jsonify({"response": intro['prompt'], "current_step": "intro_bienvenida", "options": intro.get('options', []), "format": "markdown"})
-
-    # Intro options
-    if current_step == 'intro_bienvenida' and user_lower == 'tengo dudas respecto al proceso, me gustaría resolverlas antes de empezar':
-        session['current_step'] = 'gate_1_ciclo'
-        step = conversation_flow['gate_1_ciclo']
-        return jsonify({"response": step['prompt'], "current_step": "gate_1_ciclo", "options": step['options'], "format": "markdown"})
-
-    if current_step == 'intro_bienvenida' and user_lower == 'sí, entiendo el proceso y deseo continuar':
-        session['current_step'] = conversation_flow['intro_bienvenida']['next_step']
-        step = conversation_flow[session['current_step']]
-        # Si es elige_vertical, mostrar multiselección
-        if session['current_step'] == 'elige_vertical':
-            return jsonify({
-                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
-                "current_step": "elige_vertical",
-                "format": "markdown",
-                "multiselect": {
-                    "items": [
-                        "IDEC",
-                        "IA"
-                    ],
-                    "submit_text": "Confirmar"
-                }
-            })
-        payload = {"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"}
-        if "options" in step: payload["options"] = step["options"]
-        return jsonify(payload)
-
-    # Reanudar del chat libre
-    if session.pop('resume_from_alt', False) or user_lower in ('continuar flujo', 'volver al flujo'):
-        step_key = session.get('current_step', 'intro_bienvenida')
-        step_conf = conversation_flow.get(step_key, {})
-        resp_text = step_conf.get("prompt", "…")
-
-        if step_key == 'elige_vertical':
-            step = conversation_flow['elige_vertical']
-            return jsonify({
-                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
-                "current_step": "elige_vertical",
-                "format": "markdown",
-                "multiselect": {
-                    "items": [
-                        "IDEC",
-                        "IA"
-                    ],
-                    "submit_text": "Confirmar"
-                }
-            })
-
-        if step_key == 'idec_componentes':
-            step = conversation_flow['idec_componentes']
-            return jsonify({
-                "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
-                "current_step": "idec_componentes",
-                "format": "markdown",
-                "multiselect": {
-                    "items": [
-                        "Gobernanza de datos",
-                        "Interoperabilidad",
-                        "Herramientas técnicas y tecnológicas",
-                        "Seguridad y privacidad de datos",
-                        "Datos",
-                        "Aprovechamiento de datos"
-                    ],
-                    "submit_text": "Confirmar"
-                }
-            })
-
-        if step_key == 'upload_plantilla':
-            resp_text = _upload_prompt_with_link(step_key)
-            return jsonify({
-                "response": resp_text, "current_step": step_key, "format": "markdown",
-                "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
-            })
-        payload = {"response": resp_text, "current_step": step_key, "format": "markdown"}
-        if "options" in step_conf: payload["options"] = step_conf["options"]
-        return jsonify(payload)
-
-    # Gates
-    if current_step == 'gate_1_ciclo':
-        if _is_yes(user_lower):
-            session['current_step'] = conversation_flow['gate_1_ciclo']['next_step']
-            step = conversation_flow['gate_2_herramienta']
-            return jsonify({"response": step['prompt'], "current_step": "gate_2_herramienta", "options": step['options'], "format": "markdown"})
-        elif _is_no(user_lower):
-            session['after_alt_next_step'] = "gate_2_herramienta"
-            md = _bootstrap_alt_explanation("Explica el ciclo de inversión pública y sus fases principales.")
-            return jsonify({"response": md, "format": "markdown"})
-        else:
-            step = conversation_flow['gate_1_ciclo']
-            return jsonify({"response": step['prompt'], "current_step": "gate_1_ciclo", "options": step['options'], "format": "markdown"})
-
-    if current_step == 'gate_2_herramienta':
-        if _is_yes(user_lower):
-            session['current_step'] = conversation_flow['gate_2_herramienta']['next_step']
-            step = conversation_flow[session['current_step']]
-            # Si es elige_vertical, mostrar multiselección
-            if session['current_step'] == 'elige_vertical':
-                return jsonify({
-                    "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
-                    "current_step": "elige_vertical",
-                    "format": "markdown",
-                    "multiselect": {
-                        "items": [
-                            "IDEC",
-                            "IA"
-                        ],
-                        "submit_text": "Confirmar"
-                    }
-                })
-            payload = {"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"}
-            if "options" in step: payload["options"] = step["options"]
-            return jsonify(payload)
-        elif _is_no(user_lower):
-            session['after_alt_next_step'] = "elige_vertical"
-            md = _bootstrap_alt_explanation("Explica por qué esta herramienta es de orientación y cómo el borrador sirve como insumo en formulación (MGA).")
-            return jsonify({"response": md, "format": "markdown"})
-        else:
-            step = conversation_flow['gate_2_herramienta']
-            return jsonify({"response": step['prompt'], "current_step": "gate_2_herramienta", "options": step['options'], "format": "markdown"})
-
-    # Registro inicial simple
-    if current_step == 'rol_abierto' and user_message:
-        responses[current_step] = user_message
-        session['responses'] = responses
-        session['current_step'] = 'elige_vertical'
-        step = conversation_flow['elige_vertical']
-        return jsonify({
-            "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
-            "current_step": "elige_vertical",
-            "format": "markdown",
-            "multiselect": {
-                "items": [
-                    "IDEC",
-                    "IA"
-                ],
-                "submit_text": "Confirmar"
-            }
-        })
-
-    # Elegir vertical (multiselección)
-    if current_step == 'elige_vertical':
-        if user_message.startswith('__msel__:'):
-            raw = user_message.split(':', 1)[1]
-            selected = [v.strip() for v in raw.split('|') if v.strip()]
-            
-            if not selected:
-                session['current_step'] = 'finalizado'
-                msg = "❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. Usa *Reiniciar* para empezar de nuevo."
-                return jsonify({"response": msg, "current_step": "finalizado", "format": "markdown"})
-            
-            # Normalizar las selecciones
-            has_idec = any('idec' in s.lower() for s in selected)
-            has_ia = any('ia' in s.lower() or 'inteligencia artificial' in s.lower() for s in selected)
-            
-            # Guardar las verticales seleccionadas
-            verticales = []
-            if has_idec:
-                verticales.append('IDEC')
-            if has_ia:
-                verticales.append('IA')
-            responses['vertical'] = ' y '.join(verticales) if len(verticales) > 1 else verticales[0] if verticales else 'Ninguna'
-            session['responses'] = responses
-            
-            # Si incluye IDEC, va a seleccionar componentes primero
-            if has_idec:
-                session['current_step'] = 'idec_componentes'
-                step = conversation_flow['idec_componentes']
-                return jsonify({
-                    "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
-                    "current_step": "idec_componentes",
-                    "format": "markdown",
-                    "multiselect": {
-                        "items": [
-                            "Gobernanza de datos",
-                            "Interoperabilidad",
-                            "Herramientas técnicas y tecnológicas",
-                            "Seguridad y privacidad de datos",
-                            "Datos",
-                            "Aprovechamiento de datos"
-                        ],
-                        "submit_text": "Confirmar"
-                    }
-                })
-            # Si solo IA, va directo a nombre_proyecto
-            elif has_ia:
-                session['current_step'] = conversation_flow['elige_vertical']['next_step']  # nombre_proyecto
-                step = conversation_flow[session['current_step']]
-                return jsonify({"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"})
-            else:
-                session['current_step'] = 'finalizado'
-                msg = "❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. Usa *Reiniciar* para empezar de nuevo."
-                return jsonify({"response": msg, "current_step": "finalizado", "format": "markdown"})
-        else:
-            # Mostrar multiselección
-            step = conversation_flow['elige_vertical']
-            return jsonify({
-                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
-                "current_step": "elige_vertical",
-                "format": "markdown",
-                "multiselect": {
-                    "items": [
-                        "IDEC",
-                        "IA"
-                    ],
-                    "submit_text": "Confirmar"
-                }
-            })
-
-    # IDEC multiselección
-    if current_step == 'idec_componentes':
-        if user_message.startswith('__msel__:'):
-            raw = user_message.split(':', 1)[1]
-            comps = [c.strip() for c in raw.split('|') if c.strip()]
-            if comps:
-                responses['idec_componentes'] = comps
-                session['responses'] = responses
-                session['current_step'] = conversation_flow['idec_componentes']['next_step']  # nombre_proyecto
-                step = conversation_flow[session['current_step']]
-                return jsonify({"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"})
-        step = conversation_flow['idec_componentes']
-        return jsonify({
-            "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
-            "current_step": "idec_componentes",
-            "format": "markdown",
-            "multiselect": {
-                "items": [
-                    "Gobernanza de datos",
-                    "Interoperabilidad",
-                    "Herramientas técnicas y tecnológicas",
-                    "Seguridad y privacidad de datos",
-                    "Datos",
-                    "Aprovechamiento de datos"
-                ],
-                "submit_text": "Confirmar"
-            }
-        })
-
-    # PASOS DE CARGA
-    if current_step == 'upload_plantilla':
-        step_key = current_step
-        required_flag = "upload_plantilla"
-
-        # Solo procesar si el usuario explícitamente intenta continuar (no mensajes vacíos)
-        if user_message and user_message.strip() and re.search(r'\b(continuar|siguiente)\b', user_lower):
-            if required_flag in session.get('responses', {}):
-                # Archivo subido, avanzar al siguiente paso
-                next_step = conversation_flow[step_key]['next_step']
-                session['current_step'] = next_step
-                step_conf = conversation_flow[next_step]
-                text = step_conf.get("prompt", "…")
-                payload = {"response": text, "current_step": next_step, "format": "markdown"}
-                if "options" in step_conf: payload["options"] = step_conf["options"]
-                if next_step == 'upload_plantilla':
-                    payload["response"] = _upload_prompt_with_link(next_step)
-                    payload["upload"] = {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
-                return jsonify(payload)
-            else:
-                # Usuario intenta continuar sin haber subido el archivo
-                text = _upload_prompt_with_link(step_key) + "\n\n> ⚠️ Aún no has subido el archivo. Por favor súbelo y luego escribe **Continuar**."
-                return jsonify({
-                    "response": text, "current_step": step_key, "format": "markdown",
-                    "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
-                })
-
-        # Si el usuario no ha escrito "continuar" explícitamente, solo mostrar el mensaje básico sin advertencia
-        # Esto incluye cuando el usuario llega al paso por primera vez o escribe cualquier otra cosa
-        text = _upload_prompt_with_link(step_key)
-        return jsonify({
-            "response": text, "current_step": step_key, "format": "markdown",
-            "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
-        })
-
-    # Guardar y avanzar (genérico)
-    responses[current_step] = user_message
-    session['responses'] = responses
-
-    next_step = conversation_flow.get(current_step, {}).get("next_step")
-    if (not next_step) or (next_step == "finalizado"):
-        session['current_step'] = "finalizado"
-        # ---- Generar documento enriquecido con árboles ----
-        # Los árboles no están en la sesión (muy grandes para cookies), se cargarán desde JSON
-        filepath = generate_project_document(
-            responses,
-            client=client,
-            documents_dir=DOCUMENTS_DIR,
-            causas_tree=None,  # Se cargará desde JSON
-            objetivos_tree=None,  # Se cargará desde JSON
-            formularios_json_dir=FORMULARIOS_JSON_DIR
-        )
-        filename = os.path.basename(filepath)
-        md_link = _md_link(url_for('download_file', filename=filename), "Descargar documento")
-        return jsonify({"response": f"✅ Flujo completado. Documento generado. {md_link}", "current_step": "finalizado", "format": "markdown"})
-
-    session['current_step'] = next_step
-    step_conf = conversation_flow.get(next_step, {})
-    text = step_conf.get("prompt", "…")
-    payload = {"response": text, "current_step": next_step, "format": "markdown"}
-    if "options" in step_conf: payload["options"] = step_conf["options"]
-    if next_step == 'upload_plantilla':
-        payload["response"] = _upload_prompt_with_link(next_step)
-        payload["upload"]  = {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
-    return jsonify(payload)
+    return chat_flow.dispatch(request.get_json() or {})
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
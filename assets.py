@@ -0,0 +1,149 @@
+
+# assets.py
+# ============================================================
+# Manifiesto de archivos descargables (plantillas y manual de uso):
+# - Se resuelven una vez: rutas, contenido en memoria, ETag fuerte (SHA-256) y fecha
+# - Con varias plantillas, el ZIP se arma una sola vez y de forma determinista
+#   (mismo contenido -> mismos bytes -> mismo ETag en todos los workers)
+# - Se reconstruye solo si cambia la huella (mtime/tamaño) de las carpetas o archivos vigilados
+# ============================================================
+
+from __future__ import annotations
+import os
+import io
+import time
+import hashlib
+import logging
+import zipfile
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class Asset(NamedTuple):
+    data: bytes
+    mimetype: str
+    download_name: str
+    etag: str
+    last_modified: float
+
+
+class _Entry(NamedTuple):
+    asset: Optional[Asset]
+    watched: Tuple[str, ...]
+    signature: tuple
+
+
+def _signature(paths: Sequence[str]) -> tuple:
+    """Huella barata de rutas vigiladas: (mtime_ns, tamaño) por ruta; None si no existe."""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _etag(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetManifest:
+    """Archivos descargables resueltos y cacheados; cada consulta solo hace unos os.stat."""
+
+    def __init__(self, *, templates_dir: str, manual_dirs: Sequence[str], manual_names: Sequence[str]):
+        self.templates_dir = templates_dir
+        self.manual_dirs = list(manual_dirs)
+        self.manual_names = list(manual_names)
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    # ---------- API ----------
+    def templates(self) -> Optional[Asset]:
+        """La plantilla única, o un ZIP con todas si hay varias; None si no hay ninguna."""
+        return self._get("templates", self._build_templates)
+
+    def manual(self) -> Optional[Asset]:
+        return self._get("manual", self._build_manual)
+
+    def warm(self) -> None:
+        for name, asset in (("plantillas", self.templates()), ("manual", self.manual())):
+            if asset is None:
+                logger.warning("Descargas: %s no disponible", name)
+            else:
+                logger.info("Descargas: %s listo (%s, %d bytes)", name, asset.download_name, len(asset.data))
+
+    # ---------- Internos ----------
+    def _get(self, name: str, build: Callable[[], Tuple[Optional[Asset], List[str]]]) -> Optional[Asset]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and _signature(entry.watched) == entry.signature:
+                return entry.asset
+            asset, watched = build()
+            # Huella tomada después de leer: si algo cambia durante la lectura se reconstruye en la siguiente
+            self._entries[name] = _Entry(asset, tuple(watched), _signature(watched))
+            if entry is not None:
+                logger.info("Descargas: '%s' reconstruido por cambios en disco", name)
+            return asset
+
+    def _build_templates(self) -> Tuple[Optional[Asset], List[str]]:
+        folder = self.templates_dir
+        if not os.path.isdir(folder):
+            return None, [folder]
+        dirs, files = [], []
+        for root, _, names in os.walk(folder):
+            dirs.append(root)
+            for name in names:
+                if name.lower().endswith((".xlsx", ".xls")):
+                    files.append((name, os.path.join(root, name)))
+        files.sort()
+        if not files:
+            return None, dirs
+        watched = dirs + [path for _, path in files]
+
+        if len(files) == 1:
+            name, path = files[0]
+            data = _read(path)
+            return Asset(data, XLSX_MIMETYPE, name, _etag(data), os.path.getmtime(path)), watched
+
+        buf = io.BytesIO()
+        mtimes = []
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, path in files:
+                mtime = os.path.getmtime(path)
+                mtimes.append(mtime)
+                info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                zf.writestr(info, _read(path))
+        data = buf.getvalue()
+        return Asset(data, "application/zip", "plantillas_excel.zip", _etag(data), max(mtimes)), watched
+
+    def _build_manual(self) -> Tuple[Optional[Asset], List[str]]:
+        # Las carpetas se vigilan siempre: un manual nuevo con mayor prioridad cambia su mtime
+        watched = list(self.manual_dirs)
+        for folder in self.manual_dirs:
+            for name in self.manual_names:
+                path = os.path.join(folder, name)
+                if not os.path.isfile(path):
+                    continue
+                if name.endswith(".pdf"):
+                    mimetype, download_name = "application/pdf", "manual_de_uso.pdf"
+                elif name.endswith(".docx"):
+                    mimetype, download_name = DOCX_MIMETYPE, "manual_de_uso.docx"
+                else:
+                    mimetype, download_name = "application/octet-stream", "manual_de_uso.docx"
+                data = _read(path)
+                return Asset(data, mimetype, download_name, _etag(data), os.path.getmtime(path)), watched + [path]
+        return None, watched
@@ -0,0 +1,407 @@
+# benchmarks/bench_chat_flow.py
+# ============================================================
+# Flujo guiado (/api/chat): tiempo por petición de la cadena de "if current_step == ..."
+# anterior (copia literal de app.chat) frente a la tabla de transiciones de chat_flow.ChatFlow,
+# sobre cada camino del flujo (solo la vista, sin HTTP).
+# Las transiciones en sí se verifican en tests/test_chat_flow.py.
+#
+# Uso: python benchmarks/bench_chat_flow.py [--repeat 2000]
+# ============================================================
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "bench")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="bench_chat_"))
+os.environ["RETENTION_ENABLED"] = "0"
+
+import app as appmod  # noqa: E402
+from flask import jsonify, session, url_for  # noqa: E402
+from utils import conversation_flow, _is_yes, _is_no  # noqa: E402
+from app import _gate_explanation, _start_document_job  # noqa: E402
+
+# Sin efectos externos: id de trabajo fijo y explicaciones "precalculadas"
+appmod.job_queue.submit = lambda kind, payload: "job-bench"
+appmod.precomputed_explanations.get = lambda step_key, topic_md: f"Explicación de {step_key}"
+
+
+# ---------- Versión anterior (copia de app.chat antes del cambio) ----------
+def _upload_prompt_with_link(step_key: str) -> str:
+    if step_key == 'upload_plantilla':
+        return ("📄 **Cargar plantilla.**\n\n"
+                "1. Descargue la plantilla en la parte superior del chat.\n"
+                "2. Seleccione la **PlantillaIDEC-IA.xlsx**.\n"
+                "3. Diligénciela con los árboles de problemas, objetivos, productos e indicadores.\n"
+                "4. Súbala en el recuadro que aparece debajo.\n\n")
+    return ""
+
+def legacy_chat(data):
+    user_message = (data.get('message') or '').strip()
+    user_lower = user_message.lower()
+
+    current_step = session.get('current_step', 'intro_bienvenida')
+    responses = session.get('responses', {})
+
+    # Inicio rápido
+    if current_step == 'intro_bienvenida' and user_lower in ('iniciar', 'start'):
+        intro = conversation_flow['intro_bienvenida']
+        return jsonify({"response": intro['prompt'], "current_step": "intro_bienvenida", "options": intro.get('options', []), "format": "markdown"})
+
+    # Intro options
+    if current_step == 'intro_bienvenida' and user_lower == 'tengo dudas respecto al proceso, me gustaría resolverlas antes de empezar':
+        session['current_step'] = 'gate_1_ciclo'
+        step = conversation_flow['gate_1_ciclo']
+        return jsonify({"response": step['prompt'], "current_step": "gate_1_ciclo", "options": step['options'], "format": "markdown"})
+
+    if current_step == 'intro_bienvenida' and user_lower == 'sí, entiendo el proceso y deseo continuar':
+        session['current_step'] = conversation_flow['intro_bienvenida']['next_step']
+        step = conversation_flow[session['current_step']]
+        # Si es elige_vertical, mostrar multiselección
+        if session['current_step'] == 'elige_vertical':
+            return jsonify({
+                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
+                "current_step": "elige_vertical",
+                "format": "markdown",
+                "multiselect": {
+                    "items": [
+                        "IDEC",
+                        "IA"
+                    ],
+                    "submit_text": "Confirmar"
+                }
+            })
+        payload = {"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"}
+        if "options" in step: payload["options"] = step["options"]
+        return jsonify(payload)
+
+    # Reanudar del chat libre
+    if session.pop('resume_from_alt', False) or user_lower in ('continuar flujo', 'volver al flujo'):
+        step_key = session.get('current_step', 'intro_bienvenida')
+        step_conf = conversation_flow.get(step_key, {})
+        resp_text = step_conf.get("prompt", "…")
+
+        if step_key == 'elige_vertical':
+            step = conversation_flow['elige_vertical']
+            return jsonify({
+                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
+                "current_step": "elige_vertical",
+                "format": "markdown",
+                "multiselect": {
+                    "items": [
+                        "IDEC",
+                        "IA"
+                    ],
+                    "submit_text": "Confirmar"
+                }
+            })
+
+        if step_key == 'idec_componentes':
+            step = conversation_flow['idec_componentes']
+            return jsonify({
+                "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
+                "current_step": "idec_componentes",
+                "format": "markdown",
+                "multiselect": {
+                    "items": [
+                        "Gobernanza de datos",
+                        "Interoperabilidad",
+                        "Herramientas técnicas y tecnológicas",
+                        "Seguridad y privacidad de datos",
+                        "Datos",
+                        "Aprovechamiento de datos"
+                    ],
+                    "submit_text": "Confirmar"
+                }
+            })
+
+        if step_key == 'upload_plantilla':
+            resp_text = _upload_prompt_with_link(step_key)
+            return jsonify({
+                "response": resp_text, "current_step": step_key, "format": "markdown",
+                "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
+            })
+        payload = {"response": resp_text, "current_step": step_key, "format": "markdown"}
+        if "options" in step_conf: payload["options"] = step_conf["options"]
+        return jsonify(payload)
+
+    # Gates
+    if current_step == 'gate_1_ciclo':
+        if _is_yes(user_lower):
+            session['current_step'] = conversation_flow['gate_1_ciclo']['next_step']
+            step = conversation_flow['gate_2_herramienta']
+            return jsonify({"response": step['prompt'], "current_step": "gate_2_herramienta", "options": step['options'], "format": "markdown"})
+        elif _is_no(user_lower):
+            session['after_alt_next_step'] = "gate_2_herramienta"
+            return _gate_explanation("gate_1_ciclo", data)
+        else:
+            step = conversation_flow['gate_1_ciclo']
+            return jsonify({"response": step['prompt'], "current_step": "gate_1_ciclo", "options": step['options'], "format": "markdown"})
+
+    if current_step == 'gate_2_herramienta':
+        if _is_yes(user_lower):
+            session['current_step'] = conversation_flow['gate_2_herramienta']['next_step']
+            step = conversation_flow[session['current_step']]
+            # Si es elige_vertical, mostrar multiselección
+            if session['current_step'] == 'elige_vertical':
+                return jsonify({
+                    "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
+                    "current_step": "elige_vertical",
+                    "format": "markdown",
+                    "multiselect": {
+                        "items": [
+                            "IDEC",
+                            "IA"
+                        ],
+                        "submit_text": "Confirmar"
+                    }
+                })
+            payload = {"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"}
+            if "options" in step: payload["options"] = step["options"]
+            return jsonify(payload)
+        elif _is_no(user_lower):
+            session['after_alt_next_step'] = "elige_vertical"
+            return _gate_explanation("gate_2_herramienta", data)
+        else:
+            step = conversation_flow['gate_2_herramienta']
+            return jsonify({"response": step['prompt'], "current_step": "gate_2_herramienta", "options": step['options'], "format": "markdown"})
+
+    # Registro inicial simple
+    if current_step == 'rol_abierto' and user_message:
+        responses[current_step] = user_message
+        session['responses'] = responses
+        session['current_step'] = 'elige_vertical'
+        step = conversation_flow['elige_vertical']
+        return jsonify({
+            "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
+            "current_step": "elige_vertical",
+            "format": "markdown",
+            "multiselect": {
+                "items": [
+                    "IDEC",
+                    "IA"
+                ],
+                "submit_text": "Confirmar"
+            }
+        })
+
+    # Elegir vertical (multiselección)
+    if current_step == 'elige_vertical':
+        if user_message.startswith('__msel__:'):
+            raw = user_message.split(':', 1)[1]
+            selected = [v.strip() for v in raw.split('|') if v.strip()]
+            
+            if not selected:
+                session['current_step'] = 'finalizado'
+                msg = "❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. Usa *Reiniciar* para empezar de nuevo."
+                return jsonify({"response": msg, "current_step": "finalizado", "format": "markdown"})
+            
+            # Normalizar las selecciones
+            has_idec = any('idec' in s.lower() for s in selected)
+            has_ia = any('ia' in s.lower() or 'inteligencia artificial' in s.lower() for s in selected)
+            
+            # Guardar las verticales seleccionadas
+            verticales = []
+            if has_idec:
+                verticales.append('IDEC')
+            if has_ia:
+                verticales.append('IA')
+            responses['vertical'] = ' y '.join(verticales) if len(verticales) > 1 else verticales[0] if verticales else 'Ninguna'
+            session['responses'] = responses
+            
+            # Si incluye IDEC, va a seleccionar componentes primero
+            if has_idec:
+                session['current_step'] = 'idec_componentes'
+                step = conversation_flow['idec_componentes']
+                return jsonify({
+                    "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
+                    "current_step": "idec_componentes",
+                    "format": "markdown",
+                    "multiselect": {
+                        "items": [
+                            "Gobernanza de datos",
+                            "Interoperabilidad",
+                            "Herramientas técnicas y tecnológicas",
+                            "Seguridad y privacidad de datos",
+                            "Datos",
+                            "Aprovechamiento de datos"
+                        ],
+                        "submit_text": "Confirmar"
+                    }
+                })
+            # Si solo IA, va directo a nombre_proyecto
+            elif has_ia:
+                session['current_step'] = conversation_flow['elige_vertical']['next_step']  # nombre_proyecto
+                step = conversation_flow[session['current_step']]
+                return jsonify({"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"})
+            else:
+                session['current_step'] = 'finalizado'
+                msg = "❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. Usa *Reiniciar* para empezar de nuevo."
+                return jsonify({"response": msg, "current_step": "finalizado", "format": "markdown"})
+        else:
+            # Mostrar multiselección
+            step = conversation_flow['elige_vertical']
+            return jsonify({
+                "response": step['prompt'] + "\n\nSelecciona una o más opciones y pulsa **Confirmar**.",
+                "current_step": "elige_vertical",
+                "format": "markdown",
+                "multiselect": {
+                    "items": [
+                        "IDEC",
+                        "IA"
+                    ],
+                    "submit_text": "Confirmar"
+                }
+            })
+
+    # IDEC multiselección
+    if current_step == 'idec_componentes':
+        if user_message.startswith('__msel__:'):
+            raw = user_message.split(':', 1)[1]
+            comps = [c.strip() for c in raw.split('|') if c.strip()]
+            if comps:
+                responses['idec_componentes'] = comps
+                session['responses'] = responses
+                session['current_step'] = conversation_flow['idec_componentes']['next_step']  # nombre_proyecto
+                step = conversation_flow[session['current_step']]
+                return jsonify({"response": step['prompt'], "current_step": session['current_step'], "format": "markdown"})
+        step = conversation_flow['idec_componentes']
+        return jsonify({
+            "response": step['prompt'] + "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**.",
+            "current_step": "idec_componentes",
+            "format": "markdown",
+            "multiselect": {
+                "items": [
+                    "Gobernanza de datos",
+                    "Interoperabilidad",
+                    "Herramientas técnicas y tecnológicas",
+                    "Seguridad y privacidad de datos",
+                    "Datos",
+                    "Aprovechamiento de datos"
+                ],
+                "submit_text": "Confirmar"
+            }
+        })
+
+    # PASOS DE CARGA
+    if current_step == 'upload_plantilla':
+        step_key = current_step
+        required_flag = "upload_plantilla"
+
+        # Solo procesar si el usuario explícitamente intenta continuar (no mensajes vacíos)
+        if user_message and user_message.strip() and re.search(r'\b(continuar|siguiente)\b', user_lower):
+            if required_flag in session.get('responses', {}):
+                # Archivo subido, avanzar al siguiente paso
+                next_step = conversation_flow[step_key]['next_step']
+                if next_step == 'finalizado':
+                    return _start_document_job(session.get('responses', {}))
+                session['current_step'] = next_step
+                step_conf = conversation_flow[next_step]
+                text = step_conf.get("prompt", "…")
+                payload = {"response": text, "current_step": next_step, "format": "markdown"}
+                if "options" in step_conf: payload["options"] = step_conf["options"]
+                if next_step == 'upload_plantilla':
+                    payload["response"] = _upload_prompt_with_link(next_step)
+                    payload["upload"] = {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
+                return jsonify(payload)
+            else:
+                # Usuario intenta continuar sin haber subido el archivo
+                text = _upload_prompt_with_link(step_key) + "\n\n> ⚠️ Aún no has subido el archivo. Por favor súbelo y luego escribe **Continuar**."
+                return jsonify({
+                    "response": text, "current_step": step_key, "format": "markdown",
+                    "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
+                })
+
+        # Si el usuario no ha escrito "continuar" explícitamente, solo mostrar el mensaje básico sin advertencia
+        # Esto incluye cuando el usuario llega al paso por primera vez o escribe cualquier otra cosa
+        text = _upload_prompt_with_link(step_key)
+        return jsonify({
+            "response": text, "current_step": step_key, "format": "markdown",
+            "upload": {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
+        })
+
+    # Guardar y avanzar (genérico)
+    responses[current_step] = user_message
+    session['responses'] = responses
+
+    next_step = conversation_flow.get(current_step, {}).get("next_step")
+    if (not next_step) or (next_step == "finalizado"):
+        return _start_document_job(responses)
+
+    session['current_step'] = next_step
+    step_conf = conversation_flow.get(next_step, {})
+    text = step_conf.get("prompt", "…")
+    payload = {"response": text, "current_step": next_step, "format": "markdown"}
+    if "options" in step_conf: payload["options"] = step_conf["options"]
+    if next_step == 'upload_plantilla':
+        payload["response"] = _upload_prompt_with_link(next_step)
+        payload["upload"]  = {"expect_upload": True, "tipo": "plantilla", "download_url": url_for('download_templates')}
+    return jsonify(payload)
+
+
+# ---------- Caminos ----------
+MSEL_CASES = ["hola", "__msel__:", "__msel__:IDEC", "__msel__:IA", "__msel__:IDEC|IA",
+              "__msel__:Otro", "__msel__:Inteligencia Artificial"]
+
+
+def transition_cases():
+    """(estado inicial de la sesión, mensaje) para cada camino del flujo."""
+    out = []
+    for msg in ("iniciar", "Start", "Tengo dudas respecto al proceso, me gustaría resolverlas antes de empezar",
+                "Sí, entiendo el proceso y deseo continuar", "hola", ""):
+        out.append(({"current_step": "intro_bienvenida"}, msg))
+    for step in ("gate_1_ciclo", "gate_2_herramienta"):
+        for msg in ("Sí, lo conozco", "No, no lo tengo claro", "tal vez"):
+            out.append(({"current_step": step}, msg))
+    for msg in MSEL_CASES:
+        out.append(({"current_step": "elige_vertical", "responses": {}}, msg))
+    for msg in ("__msel__:Datos|Interoperabilidad", "__msel__:", "__msel__: | ", "hola"):
+        out.append(({"current_step": "idec_componentes", "responses": {"vertical": "IDEC"}}, msg))
+    for step in ("nombre_proyecto", "localizacion", "problema_oportunidad"):
+        out.append(({"current_step": step, "responses": {}}, "Respuesta libre"))
+    uploaded = {"upload_plantilla": "plantilla-x.xlsx", "upload_plantilla_sha256": "x"}
+    for responses in ({}, uploaded):
+        for msg in ("hola", "Continuar", "siguiente paso", ""):
+            out.append(({"current_step": "upload_plantilla", "responses": dict(responses)}, msg))
+    out.append(({"current_step": "finalizado", "responses": {}}, "otra cosa"))
+    out.append(({}, "hola"))
+    # Reanudación tras el chat libre en cada paso (y en uno desconocido)
+    for step in list(conversation_flow) + ["finalizado"]:
+        out.append(({"current_step": step, "resume_from_alt": True}, "lo que sea"))
+        out.append(({"current_step": step}, "Continuar flujo"))
+    return out
+
+
+def run(fn, state, msg):
+    session.clear()
+    session.update({k: (dict(v) if isinstance(v, dict) else v) for k, v in state.items()})
+    resp = fn({"message": msg})
+    return resp.status_code, resp.get_data(), dict(session)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    flow = appmod.chat_flow
+    cases = transition_cases()
+    with appmod.app.test_request_context("/api/chat", method="POST"):
+        print(f"{len(cases)} caminos x {args.repeat} repeticiones")
+        for name, fn in (("anterior", legacy_chat), ("tabla", flow.dispatch)):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                for state, msg in cases:
+                    run(fn, state, msg)
+            per_req = (time.perf_counter() - t0) / (args.repeat * len(cases))
+            print(f"{name}: {per_req * 1e6:.1f} µs/petición")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_docx_skeleton.py
+# ============================================================
+# Compara armar cada .docx desde cero (Document() + nota aclaratoria + cuerpo + texto final)
+# contra abrir el esqueleto precalculado y renderizar solo el cuerpo, en una ráfaga de N
+# documentos. Mide tiempo por documento, pico de memoria asignada y verifica que el XML
+# del cuerpo resultante sea idéntico.
+#
+# Uso: python benchmarks/bench_docx_skeleton.py [--docs 50]
+# ============================================================
+
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from docx import Document  # noqa: E402
+from docx.enum.text import WD_ALIGN_PARAGRAPH  # noqa: E402
+import utils  # noqa: E402
+from markdown_docx import render_markdown  # noqa: E402
+
+BODY_MD = "\n\n".join(
+    f"## {title}\n\nTexto de la sección con **datos** y *énfasis*.\n\n- Punto uno\n- Punto dos"
+    for title, _ in utils.DOC_SECTIONS
+)
+TITLE = "Proyecto de prueba"
+
+
+def fresh_document(md_text: str) -> bytes:
+    """Ruta anterior: todo se renderiza en cada documento."""
+    doc = Document()
+    doc.add_heading(TITLE, level=0).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    render_markdown(doc, utils.NOTA_ACLARA_MD)
+    render_markdown(doc, md_text, justify=True)
+    render_markdown(doc, utils.TEXTO_FINAL_MD)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def skeleton_document(md_text: str) -> bytes:
+    doc, marker = utils._document_from_skeleton()
+    doc.paragraphs[0].add_run(TITLE)
+    render_markdown(doc, md_text, justify=True, before=marker)
+    marker.getparent().remove(marker)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def body_xml(data: bytes) -> str:
+    return Document(io.BytesIO(data)).element.body.xml
+
+
+def burst(fn, docs: int):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for _ in range(docs):
+        fn(BODY_MD)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / docs, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=50)
+    args = ap.parse_args()
+
+    utils._document_from_skeleton()  # construye el esqueleto fuera de la medición
+    same = body_xml(fresh_document(BODY_MD)) == body_xml(skeleton_document(BODY_MD))
+    for name, fn in (("desde cero", fresh_document), ("esqueleto", skeleton_document)):
+        per_doc, peak = burst(fn, args.docs)
+        print(f"{name}: {per_doc * 1000:.1f} ms/doc | pico asignado {peak / 1024 / 1024:.1f} MiB")
+    print(f"XML del cuerpo idéntico: {same}")
+
+
+if __name__ == "__main__":
+    main()
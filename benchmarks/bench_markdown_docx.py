@@ -0,0 +1,174 @@
+# benchmarks/bench_markdown_docx.py
+# ============================================================
+# Compara el render anterior (línea a línea con _add_markdown_line) contra
+# markdown_docx.render_markdown sobre un documento sintético de N líneas
+# con el subconjunto de Markdown que ya se soportaba.
+#
+# Equivalencia: misma secuencia de párrafos, estilos, texto y formato de runs
+# (negrita/itálica/monoespaciado); los hipervínculos se comparan como "texto (url)",
+# que es como los escribía el render anterior.
+#
+# Uso: python benchmarks/bench_markdown_docx.py [--lines 20000] [--repeat 3]
+# ============================================================
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from docx import Document  # noqa: E402
+from docx.enum.text import WD_BREAK  # noqa: E402
+from docx.oxml.ns import qn  # noqa: E402
+from docx.shared import Pt  # noqa: E402
+from markdown_docx import render_markdown  # noqa: E402
+
+
+# ---------- Render anterior (copia de utils antes del cambio) ----------
+def legacy_add_rich_text(paragraph, text: str) -> None:
+    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1 (\2)', text)
+    token_re = re.compile(r'(\*\*.+?\*\*|\*.+?\*|`.+?`)')
+    parts = token_re.split(text)
+    for part in parts:
+        if not part:
+            continue
+        if part.startswith("**") and part.endswith("**"):
+            run = paragraph.add_run(part[2:-2])
+            run.bold = True
+        elif part.startswith("*") and part.endswith("*"):
+            run = paragraph.add_run(part[1:-1])
+            run.italic = True
+        elif part.startswith("`") and part.endswith("`"):
+            run = paragraph.add_run(part[1:-1])
+            run.font.name = "Courier New"
+            run.font.size = Pt(10)
+        else:
+            paragraph.add_run(part)
+
+
+def legacy_add_markdown_line(doc, line: str) -> None:
+    s = line.strip()
+    if not s:
+        return
+    if s == '---':
+        p = doc.add_paragraph(); p.add_run().add_break(WD_BREAK.LINE); return
+    if s.startswith('#### '):
+        doc.add_heading(s[5:], level=4); return
+    if s.startswith('### '):
+        doc.add_heading(s[4:], level=3); return
+    if s.startswith('## '):
+        doc.add_heading(s[3:], level=2); return
+    if s.startswith('# '):
+        doc.add_heading(s[2:], level=1); return
+    if re.match(r'^\d+\.\s', s):
+        p = doc.add_paragraph(style='List Number'); legacy_add_rich_text(p, re.sub(r'^\d+\.\s', '', s, 1)); return
+    if s.startswith('- ') or s.startswith('* '):
+        p = doc.add_paragraph(style='List Bullet'); legacy_add_rich_text(p, s[2:]); return
+    p = doc.add_paragraph(); legacy_add_rich_text(p, s)
+
+
+def legacy_render(text: str):
+    doc = Document()
+    for line in text.splitlines():
+        legacy_add_markdown_line(doc, line)
+    return doc
+
+
+def new_render(text: str):
+    doc = Document()
+    render_markdown(doc, text)
+    return doc
+
+
+# ---------- Documento sintético ----------
+BLOCK = [
+    "## Sección {n}",
+    "",
+    "Párrafo con **negrita**, *itálica*, `código` y un [enlace](https://www.dnp.gov.co/p{n}) al final.",
+    "",
+    "### Causa {n}",
+    "Texto de la causa con datos: 12.345 habitantes y **45 %** de cobertura.",
+    "#### Efecto directo",
+    "- Primer efecto con *énfasis*",
+    "- Segundo efecto con [**Catálogo**](https://colaboracion.dnp.gov.co/c{n})",
+    "1. Paso uno",
+    "2. Paso dos con `valor`",
+    "---",
+]
+
+
+def synthetic_markdown(lines: int) -> str:
+    out, n = [], 0
+    while len(out) < lines:
+        n += 1
+        out.extend(line.format(n=n) for line in BLOCK)
+    return "\n".join(out[:lines])
+
+
+# ---------- Equivalencia ----------
+def _runs(doc, p_elm):
+    """Runs (texto, negrita, itálica, mono) con los hipervínculos aplanados como 'texto (url)'."""
+    rels = doc.part.rels
+    out = []
+    for child in p_elm.iterchildren():
+        if child.tag == qn("w:r"):
+            out.append(_run_tuple(child))
+        elif child.tag == qn("w:hyperlink"):
+            url = rels[child.get(qn("r:id"))].target_ref
+            out.extend(_run_tuple(r) for r in child.iterchildren(qn("w:r")))
+            out.append((f" ({url})", False, False, False))
+    merged = []
+    for run in out:
+        if not run[0]:
+            continue
+        if merged and merged[-1][1:] == run[1:]:
+            merged[-1] = (merged[-1][0] + run[0],) + run[1:]
+        else:
+            merged.append(run)
+    return merged
+
+
+def _run_tuple(r):
+    rpr = r.find(qn("w:rPr"))
+    text = "".join(t.text or "" for t in r.iter(qn("w:t")))
+    if r.find(qn("w:br")) is not None:
+        text += "\n"
+    if rpr is None:
+        return (text, False, False, False)
+    fonts = rpr.find(qn("w:rFonts"))
+    return (text, rpr.find(qn("w:b")) is not None, rpr.find(qn("w:i")) is not None,
+            fonts is not None and fonts.get(qn("w:ascii")) == "Courier New")
+
+
+def signature(doc):
+    return [(p.style.name, _runs(doc, p._p)) for p in doc.paragraphs]
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    text = synthetic_markdown(args.lines)
+    same = signature(legacy_render(text)) == signature(new_render(text))
+    t_old = _best_of(legacy_render, text, args.repeat)
+    t_new = _best_of(new_render, text, args.repeat)
+    print(f"{args.lines} líneas: anterior {t_old:.2f} s | nuevo {t_new:.2f} s | x{t_old / t_new:.1f} | "
+          f"salida equivalente: {same}")
+
+
+if __name__ == "__main__":
+    main()
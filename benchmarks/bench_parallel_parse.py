@@ -0,0 +1,72 @@
+# benchmarks/bench_parallel_parse.py
+# ============================================================
+# Escalamiento del parseo por hoja en un pool de procesos sobre un
+# libro sintético grande (por defecto 50 hojas x 5000 filas, A–W).
+#
+# Uso: python benchmarks/bench_parallel_parse.py [--sheets 50] [--rows 5000] [--workers 1,2,4]
+# ============================================================
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import Workbook  # noqa: E402
+import utils  # noqa: E402
+
+
+def build_workbook(path: str, sheets: int, rows: int, seed: int = 7) -> None:
+    """Hojas con la forma de la plantilla: causas en A–K y objetivos en L–W."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Hoja-{s + 1}")
+        ws.append(["Causas"] + [None] * 10 + ["Objetivos"])
+        ws.append(["ID", "Descripción", "Efecto"] + [None] * 8 + ["ID", "Descripción", "Medio", "Fin"])
+        for r in range(rows):
+            c, ci = f"C{r // 10 + 1}", f"C{r // 10 + 1}CI{r % 10 + 1}"
+            o, mi = f"O{r // 10 + 1}", f"O{r // 10 + 1}MI{r % 10 + 1}"
+            causas = [c if r % 10 == 0 else None, f"Causa {r} {rnd.random():.6f}", f"Efecto {r}", None,
+                      c, ci, f"Causa indirecta {r}", None, ci, f"{ci}E1", f"Efecto indirecto {r}"]
+            objetivos = [o if r % 10 == 0 else None, f"Objetivo {r}", f"Medio {r}", f"Fin {r}", None,
+                         o, mi, f"Medio indirecto {r}", None, mi, f"{mi}F1", f"Fin indirecto {r}"]
+            ws.append(causas + objetivos)
+    wb.save(path)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sheets", type=int, default=50)
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--workers", default=f"1,2,4,{os.cpu_count() or 1}")
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.gettempdir(), f"bench_{args.sheets}x{args.rows}.xlsx")
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        build_workbook(path, args.sheets, args.rows)
+        print(f"Libro sintético creado en {time.perf_counter() - t0:.1f} s: {path}")
+    print(f"{args.sheets} hojas x {args.rows} filas, {os.path.getsize(path) / 1e6:.1f} MB, CPUs: {os.cpu_count()}")
+
+    workers_list = sorted({int(w) for w in args.workers.split(",") if w.strip()})
+    baseline, base_json = None, None
+    for w in workers_list:
+        if w > 1:
+            utils.parse_excel_all_sheets(path, workers=w)  # calienta el pool (arranque de procesos)
+        t0 = time.perf_counter()
+        tree = utils.parse_excel_all_sheets(path, workers=w)
+        dt = time.perf_counter() - t0
+        out = json.dumps(tree, ensure_ascii=False, indent=2)
+        baseline = baseline or dt
+        base_json = base_json or out
+        print(f"workers={w:<3} {dt:7.2f} s  speedup x{baseline / dt:.2f}  JSON idéntico: {out == base_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# benchmarks/bench_parse.py
+# ============================================================
+# Compara el parser anterior (pd.read_excel + dos xlsx temporales por hoja,
+# copiado abajo tal como estaba en utils.py) contra el parser de una sola
+# pasada (utils.parse_excel_all_sheets) sobre las plantillas incluidas.
+#
+# Uso: python benchmarks/bench_parse.py [--repeat N]
+# ============================================================
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+from openpyxl import load_workbook  # noqa: E402
+import utils  # noqa: E402
+
+# El original escribía en /tmp/causas_tmp.xlsx y /tmp/objetivos_tmp.xlsx; aquí en un directorio propio
+_TMP_DIR = tempfile.mkdtemp(prefix="bench-parse-")
+
+
+# ---------- Parser anterior (copia de utils antes del cambio) ----------
+def _legacy_num_from_id(id_str: str) -> int:
+    """Convierte ID tipo 'C1' o 'O3' a número para ordenar de forma estable."""
+    if not id_str:
+        return 999999
+    digits = ''.join(ch for ch in id_str if ch.isdigit())
+    return int(digits) if digits else 999999
+
+
+def legacy_split_sheet_blocks(df: pd.DataFrame):
+    """
+    Divide automáticamente la hoja en dos bloques:
+    - CAUSAS: columnas 0–10
+    - OBJETIVOS: columnas 11–22
+    """
+    CAUSAS_COLS = list(range(0, 11))
+    OBJ_COLS = list(range(11, 23))
+
+    df_causas = df.iloc[:, CAUSAS_COLS].dropna(how="all")
+    df_obj = df.iloc[:, OBJ_COLS].dropna(how="all")
+
+    return df_causas, df_obj
+
+
+# -------------------------- Parsers Excel --------------------------
+# Causas: A,B,C  | D (sep) | E,F,G (CI) | H (sep) | I,J,K (Efectos Indirectos)
+def legacy_parse_causas_xlsx(xlsx_path: str, *, sheet: Optional[str] = None, start_row: int = 3) -> Dict[str, Any]:
+    wb = load_workbook(xlsx_path, data_only=True)
+    ws = wb[sheet] if sheet else wb.active
+    causas: Dict[str, Any] = {}
+    ci_to_parent: Dict[str, str] = {}
+
+    for row in ws.iter_rows(min_row=start_row, values_only=True):
+        vals = list(row); vals += [None] * (11 - len(vals))
+        A,B,C,D,E,F,G,H,I,J,K = vals[:11]
+
+        if A:
+            id_causa = str(A).strip()
+            causas.setdefault(id_causa, {
+                "id": id_causa,
+                "descripcion": (str(B).strip() if B else None),
+                "efecto_directo": {"descripcion": (str(C).strip() if C else None)},
+                "causas_indirectas": {}
+            })
+
+        parent = str(E).strip() if E else None
+        ci_id  = str(F).strip() if F else None
+        ci_desc= str(G).strip() if G else None
+        if parent and ci_id:
+            base = causas.setdefault(parent, {
+                "id": parent, "descripcion": None,
+                "efecto_directo": {"descripcion": None},
+                "causas_indirectas": {}
+            })
+            base["causas_indirectas"].setdefault(ci_id, {
+                "id": ci_id, "descripcion": ci_desc, "efectos_indirectos": []
+            })
+            if ci_desc:
+                base["causas_indirectas"][ci_id]["descripcion"] = ci_desc
+            ci_to_parent[ci_id] = parent
+
+            if "*" in causas:
+                pend = causas["*"]["causas_indirectas"].pop(ci_id, None)
+                if pend:
+                    base["causas_indirectas"][ci_id]["efectos_indirectos"].extend(pend.get("efectos_indirectos", []))
+                    if not base["causas_indirectas"][ci_id].get("descripcion"):
+                        base["causas_indirectas"][ci_id]["descripcion"] = pend.get("descripcion")
+                if not causas["*"]["causas_indirectas"]:
+                    causas.pop("*", None)
+
+        ci_ref   = str(I).strip() if I else None
+        eff_id   = str(J).strip() if J else None
+        eff_desc = str(K).strip() if K else None
+        if ci_ref and eff_id:
+            parent = ci_to_parent.get(ci_ref)
+            ci_node = None
+            if parent and parent in causas:
+                ci_node = causas[parent]["causas_indirectas"].setdefault(
+                    ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
+                )
+            else:
+                for c in causas.values():
+                    if ci_ref in c["causas_indirectas"]:
+                        ci_node = c["causas_indirectas"][ci_ref]; break
+                if ci_node is None:
+                    dummy = causas.setdefault("*", {
+                        "id":"*","descripcion":None,
+                        "efecto_directo":{"descripcion":None},
+                        "causas_indirectas": {}
+                    })
+                    ci_node = dummy["causas_indirectas"].setdefault(
+                        ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
+                    )
+            ci_node["efectos_indirectos"].append({"id": eff_id, "descripcion": eff_desc})
+
+    out: List[Dict[str, Any]] = []
+    for cid, c in list(causas.items()):
+        if cid == "*": continue
+        c["causas_indirectas"] = list(c["causas_indirectas"].values())
+        has_content = c.get("descripcion") or (c.get("efecto_directo") or {}).get("descripcion") or c["causas_indirectas"]
+        if not has_content: continue
+        out.append(c)
+
+    out.sort(key=lambda x: (_legacy_num_from_id(x.get("id", "")), x.get("id", "")))
+    return {"tipo": "causas", "items": out}
+
+
+# Objetivos: A,B,C,D | E (sep) | F,G,H (MI) | I (sep) | J,K,L (Fines Indirectos)
+def legacy_parse_objetivos_xlsx(xlsx_path: str, *, sheet: Optional[str] = None, start_row: int = 3) -> Dict[str, Any]:
+    wb = load_workbook(xlsx_path, data_only=True)
+    ws = wb[sheet] if sheet else wb.active
+    objetivos: Dict[str, Any] = {}
+    mi_to_parent: Dict[str, str] = {}
+
+    for row in ws.iter_rows(min_row=start_row, values_only=True):
+        vals = list(row); vals += [None] * (12 - len(vals))
+        A,B,C,D,E,F,G,H,I,J,K,L = vals[:12]
+
+        if A:
+            id_obj = str(A).strip()
+            objetivos.setdefault(id_obj, {
+                "id": id_obj,
+                "descripcion": (str(B).strip() if B else None),
+                "medio_directo": {"descripcion": (str(C).strip() if C else None)},
+                "fin_directo": {"descripcion": (str(D).strip() if D else None)},
+                "medios_indirectos": {}
+            })
+
+        parent = str(F).strip() if F else None
+        mi_id  = str(G).strip() if G else None
+        mi_desc= str(H).strip() if H else None
+        if parent and mi_id:
+            base = objetivos.setdefault(parent, {
+                "id": parent,
+                "descripcion": None,
+                "medio_directo": {"descripcion": None},
+                "fin_directo": {"descripcion": None},
+                "medios_indirectos": {}
+            })
+            base["medios_indirectos"].setdefault(mi_id, {
+                "id": mi_id, "descripcion": mi_desc, "fines_indirectos": []
+            })
+            if mi_desc:
+                base["medios_indirectos"][mi_id]["descripcion"] = mi_desc
+            mi_to_parent[mi_id] = parent
+
+            if "*" in objetivos:
+                pend = objetivos["*"]["medios_indirectos"].pop(mi_id, None)
+                if pend:
+                    base["medios_indirectos"][mi_id]["fines_indirectos"].extend(pend.get("fines_indirectos", []))
+                    if not base["medios_indirectos"][mi_id].get("descripcion"):
+                        base["medios_indirectos"][mi_id]["descripcion"] = pend.get("descripcion")
+                if not objetivos["*"]["medios_indirectos"]:
+                    objetivos.pop("*", None)
+
+        mi_ref  = str(J).strip() if J else None
+        fi_id   = str(K).strip() if K else None
+        fi_desc = str(L).strip() if L else None
+        if mi_ref and fi_id:
+            parent = mi_to_parent.get(mi_ref)
+            mi_node = None
+            if parent and parent in objetivos:
+                mi_node = objetivos[parent]["medios_indirectos"].setdefault(
+                    mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
+                )
+            else:
+                for o in objetivos.values():
+                    if mi_ref in o["medios_indirectos"]:
+                        mi_node = o["medios_indirectos"][mi_ref]; break
+                if mi_node is None:
+                    dummy = objetivos.setdefault("*", {
+                        "id":"*","descripcion":None,
+                        "medio_directo":{"descripcion":None},
+                        "fin_directo":{"descripcion":None},
+                        "medios_indirectos": {}
+                    })
+                    mi_node = dummy["medios_indirectos"].setdefault(
+                        mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
+                    )
+            mi_node["fines_indirectos"].append({"id": fi_id, "descripcion": fi_desc})
+
+    out: List[Dict[str, Any]] = []
+    for oid, o in list(objetivos.items()):
+        if oid == "*": continue
+        o["medios_indirectos"] = list(o["medios_indirectos"].values())
+        has_content = o.get("descripcion") or (o.get("medio_directo") or {}).get("descripcion") or (o.get("fin_directo") or {}).get("descripcion") or o["medios_indirectos"]
+        if not has_content: continue
+        out.append(o)
+
+    out.sort(key=lambda x: (_legacy_num_from_id(x.get("id", "")), x.get("id", "")))
+    return {"tipo": "objetivos", "items": out}
+
+
+def legacy_parse_mixed_sheet(filepath: str, sheet: str, start_row: int = 3) -> Dict[str, Any]:
+    """
+    Procesa una hoja que contiene causas y objetivos mezclados.
+    Divide la hoja por bloques y usa los parsers existentes.
+    """
+    df = pd.read_excel(filepath, sheet_name=sheet, header=None)
+
+    causas_df, obj_df = legacy_split_sheet_blocks(df)
+
+    # Guardar como excels temporales para usar tus parsers existentes
+    tmp_causas = os.path.join(_TMP_DIR, "causas_tmp.xlsx")
+    tmp_obj = os.path.join(_TMP_DIR, "objetivos_tmp.xlsx")
+
+    causas_df.to_excel(tmp_causas, index=False, header=False)
+    obj_df.to_excel(tmp_obj, index=False, header=False)
+
+    # Usamos tus parsers originales
+    causas_tree = legacy_parse_causas_xlsx(tmp_causas, sheet=None, start_row=start_row)
+    objetivos_tree = legacy_parse_objetivos_xlsx(tmp_obj, sheet=None, start_row=start_row)
+
+    return {
+        "causas": causas_tree,
+        "objetivos": objetivos_tree
+    }
+
+
+def legacy_parse(filepath: str):
+    """Ruta anterior (parse_excel_all_sheets): una carga del libro + legacy_parse_mixed_sheet por hoja."""
+    wb = load_workbook(filepath, data_only=True)
+    return {sheet: legacy_parse_mixed_sheet(filepath, sheet) for sheet in wb.sheetnames}
+
+
+def _best_of(fn, filepath: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(filepath)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    files = sorted(glob.glob(os.path.join(ROOT, "plantillas_excel", "*.xlsx")))
+    files += sorted(glob.glob(os.path.join(ROOT, "static", "formularios", "*.xlsx")))
+
+    for fp in files:
+        legacy = json.dumps(legacy_parse(fp), ensure_ascii=False, indent=2)
+        single = json.dumps(utils.parse_excel_all_sheets(fp), ensure_ascii=False, indent=2)
+        t_old = _best_of(legacy_parse, fp, args.repeat)
+        t_new = _best_of(utils.parse_excel_all_sheets, fp, args.repeat)
+        print(f"{os.path.relpath(fp, ROOT)}: legacy {t_old*1000:.1f} ms | "
+              f"una pasada {t_new*1000:.1f} ms | x{t_old/t_new:.1f} | "
+              f"JSON idéntico: {legacy == single}")
+
+
+if __name__ == "__main__":
+    main()
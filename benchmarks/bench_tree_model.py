@@ -0,0 +1,317 @@
+# benchmarks/bench_tree_model.py
+# ============================================================
+# Compara los parsers de árboles anteriores (dicts anidados + marcador "*" y búsqueda
+# lineal de la rama de cada hoja huérfana: O(n·m)) con tree_model (nodos con __slots__,
+# índice id -> nodo y conciliación de huérfanas en O(1) por fila).
+#
+# - Equivalencia: JSON idéntico en hojas sintéticas aleatorias (referencias adelantadas,
+#   ramas nunca declaradas, ramas redeclaradas, filas repetidas) y en las plantillas incluidas
+# - Escalado: tiempo y pico de memoria (tracemalloc) para 1k..N causas con sus efectos
+#
+# Uso: python benchmarks/bench_tree_model.py [--max-roots 10000] [--forward 0.3]
+# ============================================================
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from openpyxl import load_workbook  # noqa: E402
+import utils  # noqa: E402
+
+
+# ---------- Parsers anteriores (copia de utils antes del cambio) ----------
+def _num_from_id(id_str: str) -> int:
+    """Convierte ID tipo 'C1' o 'O3' a número para ordenar de forma estable."""
+    if not id_str:
+        return 999999
+    digits = ''.join(ch for ch in id_str if ch.isdigit())
+    return int(digits) if digits else 999999
+
+
+
+def legacy_parse_causas(rows) -> Dict[str, Any]:
+    """Arma el árbol de causas desde filas en memoria (tuplas de openpyxl o un DataFrame),
+    ya posicionadas en la primera fila de datos."""
+    causas: Dict[str, Any] = {}
+    ci_to_parent: Dict[str, str] = {}
+
+    for row in rows:
+        vals = list(row); vals += [None] * (11 - len(vals))
+        A,B,C,D,E,F,G,H,I,J,K = vals[:11]
+
+        if A:
+            id_causa = str(A).strip()
+            causas.setdefault(id_causa, {
+                "id": id_causa,
+                "descripcion": (str(B).strip() if B else None),
+                "efecto_directo": {"descripcion": (str(C).strip() if C else None)},
+                "causas_indirectas": {}
+            })
+
+        parent = str(E).strip() if E else None
+        ci_id  = str(F).strip() if F else None
+        ci_desc= str(G).strip() if G else None
+        if parent and ci_id:
+            base = causas.setdefault(parent, {
+                "id": parent, "descripcion": None,
+                "efecto_directo": {"descripcion": None},
+                "causas_indirectas": {}
+            })
+            base["causas_indirectas"].setdefault(ci_id, {
+                "id": ci_id, "descripcion": ci_desc, "efectos_indirectos": []
+            })
+            if ci_desc:
+                base["causas_indirectas"][ci_id]["descripcion"] = ci_desc
+            ci_to_parent[ci_id] = parent
+
+            if "*" in causas:
+                pend = causas["*"]["causas_indirectas"].pop(ci_id, None)
+                if pend:
+                    base["causas_indirectas"][ci_id]["efectos_indirectos"].extend(pend.get("efectos_indirectos", []))
+                    if not base["causas_indirectas"][ci_id].get("descripcion"):
+                        base["causas_indirectas"][ci_id]["descripcion"] = pend.get("descripcion")
+                if not causas["*"]["causas_indirectas"]:
+                    causas.pop("*", None)
+
+        ci_ref   = str(I).strip() if I else None
+        eff_id   = str(J).strip() if J else None
+        eff_desc = str(K).strip() if K else None
+        if ci_ref and eff_id:
+            parent = ci_to_parent.get(ci_ref)
+            ci_node = None
+            if parent and parent in causas:
+                ci_node = causas[parent]["causas_indirectas"].setdefault(
+                    ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
+                )
+            else:
+                for c in causas.values():
+                    if ci_ref in c["causas_indirectas"]:
+                        ci_node = c["causas_indirectas"][ci_ref]; break
+                if ci_node is None:
+                    dummy = causas.setdefault("*", {
+                        "id":"*","descripcion":None,
+                        "efecto_directo":{"descripcion":None},
+                        "causas_indirectas": {}
+                    })
+                    ci_node = dummy["causas_indirectas"].setdefault(
+                        ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
+                    )
+            ci_node["efectos_indirectos"].append({"id": eff_id, "descripcion": eff_desc})
+
+    out: List[Dict[str, Any]] = []
+    for cid, c in list(causas.items()):
+        if cid == "*": continue
+        c["causas_indirectas"] = list(c["causas_indirectas"].values())
+        has_content = c.get("descripcion") or (c.get("efecto_directo") or {}).get("descripcion") or c["causas_indirectas"]
+        if not has_content: continue
+        out.append(c)
+
+    out.sort(key=lambda x: (_num_from_id(x.get("id", "")), x.get("id", "")))
+    return {"tipo": "causas", "items": out}
+
+
+
+def legacy_parse_objetivos(rows) -> Dict[str, Any]:
+    """Arma el árbol de objetivos desde filas en memoria (tuplas de openpyxl o un DataFrame),
+    ya posicionadas en la primera fila de datos."""
+    objetivos: Dict[str, Any] = {}
+    mi_to_parent: Dict[str, str] = {}
+
+    for row in rows:
+        vals = list(row); vals += [None] * (12 - len(vals))
+        A,B,C,D,E,F,G,H,I,J,K,L = vals[:12]
+
+        if A:
+            id_obj = str(A).strip()
+            objetivos.setdefault(id_obj, {
+                "id": id_obj,
+                "descripcion": (str(B).strip() if B else None),
+                "medio_directo": {"descripcion": (str(C).strip() if C else None)},
+                "fin_directo": {"descripcion": (str(D).strip() if D else None)},
+                "medios_indirectos": {}
+            })
+
+        parent = str(F).strip() if F else None
+        mi_id  = str(G).strip() if G else None
+        mi_desc= str(H).strip() if H else None
+        if parent and mi_id:
+            base = objetivos.setdefault(parent, {
+                "id": parent,
+                "descripcion": None,
+                "medio_directo": {"descripcion": None},
+                "fin_directo": {"descripcion": None},
+                "medios_indirectos": {}
+            })
+            base["medios_indirectos"].setdefault(mi_id, {
+                "id": mi_id, "descripcion": mi_desc, "fines_indirectos": []
+            })
+            if mi_desc:
+                base["medios_indirectos"][mi_id]["descripcion"] = mi_desc
+            mi_to_parent[mi_id] = parent
+
+            if "*" in objetivos:
+                pend = objetivos["*"]["medios_indirectos"].pop(mi_id, None)
+                if pend:
+                    base["medios_indirectos"][mi_id]["fines_indirectos"].extend(pend.get("fines_indirectos", []))
+                    if not base["medios_indirectos"][mi_id].get("descripcion"):
+                        base["medios_indirectos"][mi_id]["descripcion"] = pend.get("descripcion")
+                if not objetivos["*"]["medios_indirectos"]:
+                    objetivos.pop("*", None)
+
+        mi_ref  = str(J).strip() if J else None
+        fi_id   = str(K).strip() if K else None
+        fi_desc = str(L).strip() if L else None
+        if mi_ref and fi_id:
+            parent = mi_to_parent.get(mi_ref)
+            mi_node = None
+            if parent and parent in objetivos:
+                mi_node = objetivos[parent]["medios_indirectos"].setdefault(
+                    mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
+                )
+            else:
+                for o in objetivos.values():
+                    if mi_ref in o["medios_indirectos"]:
+                        mi_node = o["medios_indirectos"][mi_ref]; break
+                if mi_node is None:
+                    dummy = objetivos.setdefault("*", {
+                        "id":"*","descripcion":None,
+                        "medio_directo":{"descripcion":None},
+                        "fin_directo":{"descripcion":None},
+                        "medios_indirectos": {}
+                    })
+                    mi_node = dummy["medios_indirectos"].setdefault(
+                        mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
+                    )
+            mi_node["fines_indirectos"].append({"id": fi_id, "descripcion": fi_desc})
+
+    out: List[Dict[str, Any]] = []
+    for oid, o in list(objetivos.items()):
+        if oid == "*": continue
+        o["medios_indirectos"] = list(o["medios_indirectos"].values())
+        has_content = o.get("descripcion") or (o.get("medio_directo") or {}).get("descripcion") or (o.get("fin_directo") or {}).get("descripcion") or o["medios_indirectos"]
+        if not has_content: continue
+        out.append(o)
+
+    out.sort(key=lambda x: (_num_from_id(x.get("id", "")), x.get("id", "")))
+    return {"tipo": "objetivos", "items": out}
+
+
+# ---------- Hojas sintéticas ----------
+def synthetic_rows(n_roots: int, *, width: int, directs: int, branches: int = 2, leaves: int = 2,
+                   forward: float = 0.3, missing: float = 0.02, seed: int = 0):
+    """Filas de un bloque: raíces, ramas y hojas en columnas independientes (como en la plantilla).
+    `forward` es la fracción de hojas movidas antes de la declaración de su rama."""
+    rng = random.Random(seed)
+    prefix = "C" if directs == 1 else "O"
+    roots = [(f"{prefix}{i}", f"Descripción {i}", *[f"Directo {i}.{d}" for d in range(directs)])
+             for i in range(1, n_roots + 1)]
+    branch_ev, leaf_ev = [], []
+    for i in range(1, n_roots + 1):
+        for j in range(1, branches + 1):
+            bid = f"{prefix}I{i}.{j}"
+            branch_ev.append((f"{prefix}{i}", bid, f"Rama {bid}"))
+            for k in range(1, leaves + 1):
+                leaf_ev.append((bid, f"E{i}.{j}.{k}", f"Hoja {i}.{j}.{k}"))
+    # Algunas ramas se redeclaran (misma rama en otra raíz) y algunas hojas apuntan a ramas inexistentes
+    for _ in range(max(1, n_roots // 100)):
+        bid = rng.choice(branch_ev)[1]
+        branch_ev.insert(rng.randrange(len(branch_ev)), (f"{prefix}{rng.randint(1, n_roots)}", bid, None))
+    for _ in range(int(len(leaf_ev) * missing)):
+        leaf_ev.insert(rng.randrange(len(leaf_ev)), (f"{prefix}X{rng.randint(1, 10 ** 6)}", "EX", "huérfana"))
+    moved = [leaf_ev.pop(rng.randrange(len(leaf_ev))) for _ in range(int(len(leaf_ev) * forward))]
+    for ev in moved:
+        leaf_ev.insert(rng.randrange(len(leaf_ev) // 4 + 1), ev)
+    roots += [roots[rng.randrange(len(roots))][:1] + (None,) * (directs + 1) for _ in range(n_roots // 50)]
+    rng.shuffle(roots)
+
+    gap = [None]
+    rows = []
+    for r in range(max(len(roots), len(branch_ev), len(leaf_ev))):
+        root = roots[r] if r < len(roots) else (None,) * (directs + 2)
+        br = branch_ev[r] if r < len(branch_ev) else (None,) * 3
+        lf = leaf_ev[r] if r < len(leaf_ev) else (None,) * 3
+        row = (*root, *gap, *br, *gap, *lf)
+        assert len(row) == width
+        rows.append(row)
+    return rows
+
+
+KINDS = {
+    "causas": (11, 1, legacy_parse_causas, utils.parse_causas_rows),
+    "objetivos": (12, 2, legacy_parse_objetivos, utils.parse_objetivos_rows),
+}
+
+
+def dumps(tree: Dict[str, Any]) -> str:
+    return json.dumps(tree, ensure_ascii=False)
+
+
+def measure(fn, rows):
+    """Tiempo (sin tracemalloc, que lo distorsiona) y pico de memoria en una segunda corrida."""
+    t0 = time.perf_counter()
+    out = fn(rows)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def check_equivalence(fuzz: int) -> int:
+    bad = 0
+    for seed in range(fuzz):
+        for kind, (width, directs, old, new) in KINDS.items():
+            rows = synthetic_rows(random.Random(seed).randint(1, 60), width=width, directs=directs,
+                                  branches=3, leaves=3, forward=0.5, missing=0.1, seed=seed)
+            if dumps(old(rows)) != dumps(new(rows)):
+                bad += 1
+                print(f"DIFERENTE: {kind} semilla {seed}")
+    for path in sorted(glob.glob(os.path.join(ROOT, "plantillas_excel", "*.xlsx"))):
+        wb = load_workbook(path, read_only=True, data_only=True)
+        for ws in wb.worksheets:
+            rows = list(ws.iter_rows(values_only=True))
+            blocks = {"causas": [], "objetivos": []}
+            for row in rows:
+                for kind, cols in (("causas", utils.CAUSAS_SLICE), ("objetivos", utils.OBJETIVOS_SLICE)):
+                    block = utils._row_block(row, cols)
+                    if block is not None:
+                        blocks[kind].append(block)
+            for kind, (_, _, old, new) in KINDS.items():
+                if dumps(old(blocks[kind][2:])) != dumps(new(blocks[kind][2:])):
+                    bad += 1
+                    print(f"DIFERENTE: {os.path.basename(path)}:{ws.title} {kind}")
+        wb.close()
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-roots", type=int, default=10000)
+    ap.add_argument("--forward", type=float, default=0.3, help="Fracción de hojas antes de su rama")
+    ap.add_argument("--fuzz", type=int, default=200, help="Hojas aleatorias pequeñas para la equivalencia")
+    args = ap.parse_args()
+
+    print(f"Equivalencia: {check_equivalence(args.fuzz)} diferencia(s)")
+    sizes = [n for n in (1000, 2500, 5000, 10000, 20000, 50000) if n <= args.max_roots]
+    for kind, (width, directs, old, new) in KINDS.items():
+        for n in sizes:
+            rows = synthetic_rows(n, width=width, directs=directs, forward=args.forward)
+            a, t_old, m_old = measure(old, rows)
+            b, t_new, m_new = measure(new, rows)
+            assert dumps(a) == dumps(b)
+            print(f"{kind} {n:>6} raíces ({len(rows)} filas): anterior {t_old * 1000:8.1f} ms "
+                  f"{m_old / 1024 / 1024:6.1f} MiB | nuevo {t_new * 1000:7.1f} ms {m_new / 1024 / 1024:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_tree_store.py
+# ============================================================
+# Compara el formato anterior de los árboles (JSON indentado, UTF-8 con BOM) con el
+# formato .tree de tree_store (JSON compacto con cabecera, sin comprimir / zlib / zstd
+# si está instalado): tamaño en disco, tiempo de carga y de guardado.
+#
+# Árboles: las plantillas incluidas (plantillas_excel/) y una hoja sintética grande.
+#
+# Uso: python benchmarks/bench_tree_store.py [--repeat 50] [--roots 2000]
+# ============================================================
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import tree_store  # noqa: E402
+import utils  # noqa: E402
+from bench_tree_model import synthetic_rows  # noqa: E402
+
+
+def legacy_save(tree, path):
+    with open(path, "w", encoding="utf-8-sig") as f:
+        json.dump(tree, f, ensure_ascii=False, indent=2)
+
+
+def legacy_load(path):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def tree_writer(codec):
+    def save(tree, path):
+        with open(path, "wb") as f:
+            f.write(tree_store.encode_tree(tree, codec=codec))
+    return save
+
+
+FORMATS = [("json indentado (anterior)", ".json", legacy_save, legacy_load),
+           (".tree sin comprimir", ".tree", tree_writer(tree_store.CODEC_NONE), tree_store.load_tree),
+           (".tree zlib", ".tree", tree_writer(tree_store.CODEC_ZLIB), tree_store.load_tree)]
+if tree_store.zstandard is not None:
+    FORMATS.append((".tree zstd", ".tree", tree_writer(tree_store.CODEC_ZSTD), tree_store.load_tree))
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def trees():
+    for path in sorted(glob.glob(os.path.join(ROOT, "plantillas_excel", "*.xlsx"))):
+        yield os.path.basename(path), utils.parse_excel_all_sheets(path, workers=0)
+
+
+def synthetic_tree(roots: int):
+    rows = [c + o for c, o in zip(synthetic_rows(roots, width=11, directs=1, forward=0.0, missing=0.0),
+                                  synthetic_rows(roots, width=12, directs=2, forward=0.0, missing=0.0))]
+    return {"Hoja sintética": utils.parse_sheet_rows(rows, start_row=1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--roots", type=int, default=2000)
+    args = ap.parse_args()
+
+    cases = list(trees()) + [(f"sintético {args.roots} raíces", synthetic_tree(args.roots))]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, tree in cases:
+            print(f"== {name}")
+            base = None
+            for label, ext, save, load in FORMATS:
+                path = os.path.join(tmp, "arbol" + ext)
+                t_save = _best_of(lambda: save(tree, path), max(1, args.repeat // 5))
+                t_load = _best_of(lambda: load(path), args.repeat)
+                assert load(path) == tree
+                size = os.path.getsize(path)
+                base = base or (size, t_load)
+                print(f"  {label:28} {size / 1024:8.1f} KiB ({size / base[0]:5.1%}) | "
+                      f"carga {t_load * 1000:7.2f} ms (x{base[1] / t_load:4.1f}) | guardado {t_save * 1000:7.2f} ms")
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
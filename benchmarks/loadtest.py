@@ -0,0 +1,668 @@
+# benchmarks/loadtest.py
+# ============================================================
+# Prueba de carga de extremo a extremo contra un Azure OpenAI simulado (stub_azure.py):
+# - Cada usuario virtual recorre el flujo completo: / -> compuertas -> elige_vertical ->
+#   idec_componentes -> datos del proyecto -> carga de PlantillaIDEC-IA.xlsx -> finalizado,
+#   y luego sondea el trabajo y descarga el .docx
+# - Dos modos: cliente de pruebas de Flask (en proceso) o gunicorn real por HTTP
+# - Latencia y tamaño de las respuestas del LLM por distribución (--llm-latency, --llm-words)
+# - Reporta p50/p95/p99 por endpoint, throughput con N usuarios concurrentes y CPU/memoria
+#   por fase (parse, espera del LLM, DOCX) medidos dentro del proceso que atiende
+# - Resultados en JSON (benchmarks/results/) para comparar entre commits con --compare
+#
+# Uso: python benchmarks/loadtest.py --users 1,4,16 --flows 2
+#      python benchmarks/loadtest.py --mode gunicorn --workers 2 --threads 8 --users 8
+#      python benchmarks/loadtest.py --users 4 --compare benchmarks/results/<anterior>.json
+# ============================================================
+
+from __future__ import annotations
+import argparse
+import functools
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_azure import start_stub  # noqa: E402
+
+TEMPLATE = os.path.join(ROOT, "plantillas_excel", "PlantillaIDEC-IA.xlsx")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PHASES = ("parse", "llm", "docx")
+
+
+# -------------------------- Estadística --------------------------
+def percentile(values: List[float], q: float) -> float:
+    """Percentil con interpolación lineal (q en 0..100)."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * q / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize_ms(values: List[float]) -> Dict[str, float]:
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def _rss_bytes(pid: Optional[int] = None) -> int:
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if pid is None:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+
+# -------------------------- Fases del servidor --------------------------
+class PhaseProbe:
+    """Mide tiempo, CPU del hilo y memoria de cada fase del proceso que atiende.
+
+    - parse: process_uploaded_excel
+    - llm:   client.chat.completions.create (espera de la respuesta del modelo)
+    - docx:  esqueleto, render del Markdown y guardado del .docx
+    Una llamada anidada cuenta para la fase exterior. La memoria es el RSS máximo del proceso
+    mientras la fase estaba activa; con `trace_memory` además el pico de heap de Python
+    (tracemalloc es global: solo es fiable con un usuario a la vez).
+    """
+
+    def __init__(self, *, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = {p: 0 for p in PHASES}
+        self._stop = threading.Event()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.data = {p: {"calls": 0, "wall_s": [], "cpu_s": 0.0, "rss_max": 0, "heap_peak": 0} for p in PHASES}
+
+    def wrap(self, phase: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, "phase", None):
+                return fn(*args, **kwargs)
+            self._local.phase = phase
+            with self._lock:
+                self._active[phase] += 1
+            heap0 = 0
+            if self.trace_memory:
+                tracemalloc.reset_peak()
+                heap0 = tracemalloc.get_traced_memory()[0]
+            t0, c0 = time.perf_counter(), time.thread_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                wall, cpu = time.perf_counter() - t0, time.thread_time() - c0
+                heap = tracemalloc.get_traced_memory()[1] - heap0 if self.trace_memory else 0
+                rss = _rss_bytes()
+                self._local.phase = None
+                with self._lock:
+                    self._active[phase] -= 1
+                    d = self.data[phase]
+                    d["calls"] += 1
+                    d["wall_s"].append(wall)
+                    d["cpu_s"] += cpu
+                    d["rss_max"] = max(d["rss_max"], rss)
+                    d["heap_peak"] = max(d["heap_peak"], heap)
+        return wrapper
+
+    def install(self, appmod) -> None:
+        import docx.document
+        import utils
+        appmod.process_uploaded_excel = self.wrap("parse", appmod.process_uploaded_excel)
+        # Cliente de Azure sin la capa de admisión: la fase llm no incluye la espera en cola
+        completions = appmod.azure_client.chat.completions
+        completions.create = self.wrap("llm", completions.create)
+        utils.render_markdown = self.wrap("docx", utils.render_markdown)
+        utils._document_from_skeleton = self.wrap("docx", utils._document_from_skeleton)
+        docx.document.Document.save = self.wrap("docx", docx.document.Document.save)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        threading.Thread(target=self._sample, name="loadtest-rss", daemon=True).start()
+
+    def _sample(self, interval: float = 0.02) -> None:
+        while not self._stop.wait(interval):
+            rss = _rss_bytes()
+            with self._lock:
+                for phase, n in self._active.items():
+                    if n:
+                        self.data[phase]["rss_max"] = max(self.data[phase]["rss_max"], rss)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {p: dict(d, wall_s=list(d["wall_s"])) for p, d in self.data.items()}
+
+
+def merge_phase_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out = {p: {"calls": 0, "wall_s": [], "cpu_s": 0.0, "rss_max": 0, "heap_peak": 0} for p in PHASES}
+    for snap in snapshots:
+        for p, d in snap.items():
+            o = out[p]
+            o["calls"] += d["calls"]
+            o["wall_s"] += d["wall_s"]
+            o["cpu_s"] += d["cpu_s"]
+            o["rss_max"] = max(o["rss_max"], d["rss_max"])
+            o["heap_peak"] = max(o["heap_peak"], d["heap_peak"])
+    return out
+
+
+def summarize_phases(data: Dict[str, Any], *, traced: bool) -> Dict[str, Any]:
+    out = {}
+    for p, d in data.items():
+        calls = d["calls"]
+        row = dict(summarize_ms(d["wall_s"]), calls=calls,
+                   cpu_s_total=round(d["cpu_s"], 3),
+                   cpu_ms_per_call=round(1000 * d["cpu_s"] / calls, 2) if calls else 0.0,
+                   rss_max_mib=round(d["rss_max"] / 2 ** 20, 1))
+        row.pop("count")
+        if traced:
+            row["heap_peak_kib"] = round(d["heap_peak"] / 1024, 1)
+        out[p] = row
+    return out
+
+
+def redirect_output_dirs(appmod, base: str) -> None:
+    """Documentos y cargas de la prueba en una carpeta temporal, no en static/."""
+    for name, sub in (("DOCUMENTS_DIR", "documents"), ("FORMULARIOS_DIR", "formularios"),
+                      ("FORMULARIOS_JSON_DIR", "formularios_json")):
+        path = os.path.join(base, sub)
+        os.makedirs(path, exist_ok=True)
+        setattr(appmod, name, path)
+
+
+# -------------------------- Transportes --------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, label: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+class FlaskClientTransport:
+    """Cliente de pruebas de Flask: un usuario = un cliente con su propia cookie de sesión."""
+
+    def __init__(self, app, recorder: Recorder):
+        self.client = app.test_client()
+        self.recorder = recorder
+
+    def request(self, method: str, path: str, label: str, *, json_body=None, upload=None) -> Tuple[int, Any]:
+        kwargs: Dict[str, Any] = {}
+        if json_body is not None:
+            kwargs["json"] = json_body
+        if upload is not None:
+            form, filename, data = upload
+            kwargs["data"] = dict(form, file=(io.BytesIO(data), filename))
+            kwargs["content_type"] = "multipart/form-data"
+        t0 = time.perf_counter()
+        resp = self.client.open(path, method=method, **kwargs)
+        body = resp.get_json(silent=True) if resp.is_json else resp.get_data()
+        self.recorder.add(label, time.perf_counter() - t0, resp.status_code < 400)
+        return resp.status_code, body
+
+
+class HttpTransport:
+    """HTTP real contra gunicorn (httpx, con cookies por usuario)."""
+
+    def __init__(self, base_url: str, recorder: Recorder):
+        import httpx
+        self.client = httpx.Client(base_url=base_url, timeout=120.0)
+        self.recorder = recorder
+
+    def request(self, method: str, path: str, label: str, *, json_body=None, upload=None) -> Tuple[int, Any]:
+        kwargs: Dict[str, Any] = {}
+        if json_body is not None:
+            kwargs["json"] = json_body
+        if upload is not None:
+            form, filename, data = upload
+            kwargs["data"] = form
+            kwargs["files"] = {"file": (filename, data, XLSX_MIMETYPE)}
+        t0 = time.perf_counter()
+        resp = self.client.request(method, path, **kwargs)
+        is_json = resp.headers.get("content-type", "").startswith("application/json")
+        body = resp.json() if is_json else resp.content
+        self.recorder.add(label, time.perf_counter() - t0, resp.status_code < 400)
+        return resp.status_code, body
+
+
+# -------------------------- Usuario virtual --------------------------
+def unique_workbook(data: bytes, tag: str) -> bytes:
+    """Misma plantilla con un miembro extra en el ZIP: otro hash, así cada carga se parsea."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            dst.writestr(item, src.read(item.filename))
+        dst.writestr("customXml/loadtest.txt", tag)
+    return buf.getvalue()
+
+
+class FlowError(RuntimeError):
+    pass
+
+
+def run_flow(t, flow: Dict[str, Dict[str, Any]], *, user: str, workbook: bytes, vertical: str,
+             components: str, poll_s: float, job_timeout_s: float) -> Dict[str, float]:
+    """Un recorrido completo; devuelve los tiempos del recorrido y del trabajo del documento."""
+    t_start = time.perf_counter()
+
+    def chat(message: str) -> Dict[str, Any]:
+        status, body = t.request("POST", "/api/chat", "POST /api/chat", json_body={"message": message})
+        if status >= 400 or not isinstance(body, dict):
+            raise FlowError(f"/api/chat -> {status}")
+        return body
+
+    t.request("GET", "/", "GET /")
+    resp = chat("iniciar")
+    for _ in range(4 * len(flow)):
+        if resp.get("job"):
+            break
+        step = resp.get("current_step")
+        conf = flow.get(step, {})
+        if step == "intro_bienvenida":
+            # Por las compuertas: "Tengo dudas..." abre gate_1_ciclo
+            resp = chat(conf["options"][1])
+        elif "alt_topic" in conf:
+            resp = chat(conf["options"][0])
+        elif step == "elige_vertical":
+            resp = chat(f"__msel__:{vertical}")
+        elif step == "idec_componentes":
+            resp = chat(f"__msel__:{components}")
+        elif "upload" in conf:
+            status, body = t.request("POST", "/api/upload_formulario", "POST /api/upload_formulario",
+                                     upload=({"tipo": conf["upload"]}, os.path.basename(TEMPLATE), workbook))
+            if status >= 400 or not body.get("ok"):
+                raise FlowError(f"carga -> {status}")
+            resp = chat("Continuar")
+        elif step in flow:
+            resp = chat(f"Respuesta de carga para {step} ({user})")
+        else:
+            raise FlowError(f"paso inesperado: {step!r}")
+    job = resp.get("job")
+    if not job:
+        raise FlowError("el flujo no lanzó el trabajo del documento")
+
+    t_job = time.perf_counter()
+    deadline = t_job + job_timeout_s
+    while True:
+        status, body = t.request("GET", job["status_url"], "GET /api/jobs/<id>")
+        if status >= 400:
+            raise FlowError(f"estado del trabajo -> {status}")
+        if body.get("status") == "done":
+            break
+        if body.get("status") == "error" or time.perf_counter() > deadline:
+            raise FlowError(f"trabajo: {body.get('status')}")
+        time.sleep(poll_s)
+    job_s = time.perf_counter() - t_job
+    status, _ = t.request("GET", body["download_url"], "GET /download/<archivo>")
+    if status >= 400:
+        raise FlowError(f"descarga -> {status}")
+    return {"flow_s": time.perf_counter() - t_start, "job_s": job_s}
+
+
+def run_level(make_transport, flow, *, users: int, flows: int, workbook: bytes, unique: bool,
+              args) -> Dict[str, Any]:
+    recorder = Recorder()
+    flow_times, job_times, failures = [], [], []
+    lock = threading.Lock()
+
+    def user_loop(u: int):
+        t = make_transport(recorder)
+        for i in range(flows):
+            tag = f"u{u}-f{i}-{random.random()}"
+            data = unique_workbook(workbook, tag) if unique else workbook
+            try:
+                r = run_flow(t, flow, user=tag, workbook=data, vertical=args.vertical,
+                             components=args.components, poll_s=args.poll, job_timeout_s=args.job_timeout)
+                with lock:
+                    flow_times.append(r["flow_s"])
+                    job_times.append(r["job_s"])
+            except Exception as e:
+                with lock:
+                    failures.append(str(e))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="vuser") as pool:
+        list(pool.map(user_loop, range(users)))
+    wall = time.perf_counter() - t0
+    requests = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "users": users,
+        "flows": users * flows,
+        "failed_flows": len(failures),
+        "failures": sorted(set(failures))[:10],
+        "wall_s": round(wall, 3),
+        "throughput_flows_s": round(len(flow_times) / wall, 3),
+        "throughput_rps": round(requests / wall, 2),
+        "endpoints": {label: dict(summarize_ms(v), errors=recorder.errors.get(label, 0))
+                      for label, v in sorted(recorder.latencies.items())},
+        "flow": summarize_ms(flow_times),
+        "job": summarize_ms(job_times),
+    }
+
+
+# -------------------------- Modos --------------------------
+def base_env(endpoint: str, data_dir: str, args) -> Dict[str, str]:
+    return {
+        "AZURE_OPENAI_API_KEY": "loadtest",
+        "AZURE_OPENAI_ENDPOINT": endpoint,
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "loadtest",
+        "APP_DATA_DIR": data_dir,
+        "RETENTION_ENABLED": "0",
+        "LLM_CACHE_DISK": "0",
+        "LLM_CACHE_PREWARM": "0",
+        "DOC_JOBS_WORKERS": str(args.jobs_workers),
+    }
+
+
+def _proc_times(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _children(pid: int) -> List[int]:
+    out = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        out.append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    return out
+
+
+class ProcessSampler:
+    """CPU y RSS de un conjunto de procesos (el actual, o gunicorn y sus workers) durante una corrida."""
+
+    def __init__(self, root_pid: Optional[int] = None):
+        self.root_pid = root_pid
+        self.rss_max = 0
+        self._stop = threading.Event()
+        self._cpu0 = self._cpu()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="loadtest-proc", daemon=True)
+        self._thread.start()
+
+    def _pids(self) -> List[int]:
+        return [self.root_pid] + _children(self.root_pid) if self.root_pid else []
+
+    def _cpu(self) -> float:
+        if self.root_pid is None:
+            t = os.times()
+            return t.user + t.system
+        return sum(_proc_times(p) for p in self._pids())
+
+    def _run(self) -> None:
+        while not self._stop.wait(0.1):
+            rss = _rss_bytes() if self.root_pid is None else sum(_rss_bytes(p) for p in self._pids())
+            self.rss_max = max(self.rss_max, rss)
+
+    def stop(self) -> Dict[str, float]:
+        self._stop.set()
+        self._thread.join()
+        wall = time.perf_counter() - self._t0
+        cpu = self._cpu() - self._cpu0
+        return {"cpu_s": round(cpu, 3), "cpu_util": round(cpu / wall, 3) if wall else 0.0,
+                "rss_max_mib": round(self.rss_max / 2 ** 20, 1)}
+
+
+def run_client_mode(args, levels: List[int], workbook: bytes, endpoint: str, work_dir: str) -> List[Dict[str, Any]]:
+    os.environ.update(base_env(endpoint, os.path.join(work_dir, "data"), args))
+    import app as appmod
+    from utils import conversation_flow
+    redirect_output_dirs(appmod, os.path.join(work_dir, "static"))
+    probe = PhaseProbe(trace_memory=args.trace_memory)
+    probe.install(appmod)
+
+    runs = []
+    for users in levels:
+        probe.reset()
+        sampler = ProcessSampler()
+        run = run_level(lambda rec: FlaskClientTransport(appmod.app, rec), conversation_flow, users=users,
+                        flows=args.flows, workbook=workbook, unique=args.upload_mode == "unique", args=args)
+        run["process"] = sampler.stop()
+        run["phases"] = summarize_phases(probe.snapshot(), traced=args.trace_memory)
+        run["app_stats"] = {
+            "llm_transport": appmod.llm_transport.stats(),
+            "completion_cache": appmod.completion_cache.stats(),
+            "tree_cache": appmod.tree_cache.stats(),
+        }
+        runs.append(run)
+        _print_run(run)
+    return runs
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, proc: subprocess.Popen, timeout_s: float = 60.0) -> None:
+    import httpx
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó al arrancar (código {proc.returncode})")
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+def run_gunicorn_mode(args, levels: List[int], workbook: bytes, endpoint: str, work_dir: str) -> List[Dict[str, Any]]:
+    import importlib.util
+    if importlib.util.find_spec("gunicorn") is None:
+        raise SystemExit("El modo gunicorn requiere 'gunicorn' (pip install -r requirements.txt)")
+    from utils import conversation_flow
+
+    runs = []
+    for users in levels:
+        level_dir = tempfile.mkdtemp(prefix=f"u{users}-", dir=work_dir)
+        phases_dir = os.path.join(level_dir, "phases")
+        os.makedirs(phases_dir)
+        port = _free_port()
+        env = dict(os.environ, **base_env(endpoint, os.path.join(level_dir, "data"), args),
+                   LOADTEST_STATIC_DIR=os.path.join(level_dir, "static"), LOADTEST_PHASES_DIR=phases_dir,
+                   LOADTEST_TRACE_MEMORY="1" if args.trace_memory else "0")
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(args.workers), "--threads", str(args.threads), "--worker-class", "gthread",
+               "--timeout", "300", "--log-level", "warning",
+               "-c", os.path.join(BENCH_DIR, "loadtest_gunicorn.py")]
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_http(base_url + "/download_manual", proc)
+            sampler = ProcessSampler(proc.pid)
+            run = run_level(lambda rec: HttpTransport(base_url, rec), conversation_flow, users=users,
+                            flows=args.flows, workbook=workbook, unique=args.upload_mode == "unique", args=args)
+            run["process"] = sampler.stop()
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        snaps = []
+        for name in os.listdir(phases_dir):
+            with open(os.path.join(phases_dir, name)) as f:
+                snaps.append(json.load(f))
+        run["phases"] = summarize_phases(merge_phase_snapshots(snaps), traced=args.trace_memory)
+        run["server"] = {"workers": args.workers, "threads": args.threads}
+        runs.append(run)
+        _print_run(run)
+    return runs
+
+
+# -------------------------- Reporte --------------------------
+def _print_run(run: Dict[str, Any]) -> None:
+    print(f"\n== {run['users']} usuario(s): {run['flows'] - run['failed_flows']}/{run['flows']} recorridos en "
+          f"{run['wall_s']:.1f}s -> {run['throughput_flows_s']:.2f} recorridos/s, {run['throughput_rps']:.1f} req/s")
+    for f in run["failures"]:
+        print(f"   fallo: {f}")
+    print(f"   {'endpoint':32} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for label, s in list(run["endpoints"].items()) + [("recorrido completo", run["flow"]), ("trabajo del documento", run["job"])]:
+        print(f"   {label:32} {s['count']:>5} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+    print(f"   {'fase':8} {'llamadas':>8} {'p50 ms':>9} {'p95 ms':>9} {'CPU ms/llamada':>15} {'RSS máx MiB':>12}")
+    for phase, s in run["phases"].items():
+        print(f"   {phase:8} {s['calls']:>8} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['cpu_ms_per_call']:>15.1f} {s['rss_max_mib']:>12.1f}")
+    p = run["process"]
+    print(f"   proceso: CPU {p['cpu_s']:.2f}s (utilización {p['cpu_util']:.2f}), RSS máx {p['rss_max_mib']:.1f} MiB")
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def compare(current: Dict[str, Any], baseline_path: str, threshold: float) -> bool:
+    """Imprime las diferencias con una corrida anterior; True si hay regresiones por encima del umbral."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base_runs = {r["users"]: r for r in baseline["runs"]}
+    print(f"\n== Comparación con {baseline['meta'].get('commit') or '?'} ({os.path.basename(baseline_path)})")
+    old_args, new_args = baseline["meta"].get("args", {}), current["meta"]["args"]
+    differing = [k for k in ("mode", "llm_latency", "llm_words", "upload_mode", "workers", "threads", "trace_memory")
+                 if old_args.get(k) != new_args.get(k)]
+    if differing:
+        print(f"   Aviso: configuración distinta ({', '.join(differing)}); las cifras no son comparables")
+    regressed = False
+
+    def line(name: str, old: float, new: float, higher_is_worse: bool) -> None:
+        nonlocal regressed
+        delta = (new - old) / old if old else 0.0
+        worse = delta > threshold if higher_is_worse else delta < -threshold
+        regressed |= worse
+        print(f"   {name:44} {old:>10.2f} -> {new:>10.2f}  {delta:+7.1%}{'  REGRESIÓN' if worse else ''}")
+
+    for run in current["runs"]:
+        old = base_runs.get(run["users"])
+        if old is None:
+            continue
+        print(f"   -- {run['users']} usuario(s)")
+        line("throughput (recorridos/s)", old["throughput_flows_s"], run["throughput_flows_s"], False)
+        for label, s in run["endpoints"].items():
+            if label in old["endpoints"]:
+                line(f"p95 {label} (ms)", old["endpoints"][label]["p95_ms"], s["p95_ms"], True)
+        for phase, s in run["phases"].items():
+            if phase in old.get("phases", {}):
+                line(f"CPU {phase} (ms/llamada)", old["phases"][phase]["cpu_ms_per_call"], s["cpu_ms_per_call"], True)
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga de extremo a extremo con Azure OpenAI simulado.")
+    ap.add_argument("--mode", choices=("client", "gunicorn"), default="client")
+    ap.add_argument("--users", default="1,4", help="Usuarios concurrentes; varios niveles separados por comas")
+    ap.add_argument("--flows", type=int, default=2, help="Recorridos por usuario en cada nivel")
+    ap.add_argument("--llm-latency", default="lognormal:0.3,0.5",
+                    help="Distribución de latencia del LLM simulado (fixed:s | uniform:a,b | lognormal:mediana,sigma)")
+    ap.add_argument("--llm-words", default="150,600", help="Palabras por respuesta del LLM simulado 'min,max'")
+    ap.add_argument("--upload-mode", choices=("unique", "same"), default="unique",
+                    help="unique: cada carga es un archivo distinto (se parsea); same: la misma plantilla (caché)")
+    ap.add_argument("--vertical", default="IDEC|IA")
+    ap.add_argument("--components", default="Gobernanza de datos|Datos")
+    ap.add_argument("--jobs-workers", type=int, default=2, help="DOC_JOBS_WORKERS de la app")
+    ap.add_argument("--workers", type=int, default=2, help="Workers de gunicorn")
+    ap.add_argument("--threads", type=int, default=8, help="Hilos por worker de gunicorn")
+    ap.add_argument("--poll", type=float, default=0.25, help="Intervalo de sondeo del trabajo (s)")
+    ap.add_argument("--job-timeout", type=float, default=300.0)
+    ap.add_argument("--trace-memory", action="store_true", help="Pico de heap por fase (tracemalloc; fiable con 1 usuario)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="Archivo JSON de resultados (por defecto en benchmarks/results/)")
+    ap.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--threshold", type=float, default=0.10, help="Cambio relativo que cuenta como regresión")
+    args = ap.parse_args()
+
+    levels = [int(v) for v in args.users.split(",") if v.strip()]
+    random.seed(args.seed)
+    words = tuple(int(v) for v in args.llm_words.split(","))
+    stub, endpoint = start_stub(latency=args.llm_latency, words=words, seed=args.seed)
+    with open(TEMPLATE, "rb") as f:
+        workbook = f.read()
+
+    work_dir = tempfile.mkdtemp(prefix="loadtest_")
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    try:
+        runner = run_client_mode if args.mode == "client" else run_gunicorn_mode
+        runs = runner(args, levels, workbook, endpoint, work_dir)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    result = {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "started_at": started,
+            "mode": args.mode,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "llm_requests": stub.requests,
+        },
+        "runs": runs,
+    }
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"loadtest-{args.mode}-{commit or 'sin-git'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados: {out}")
+
+    if args.compare and compare(result, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# benchmarks/loadtest_gunicorn.py
+# ============================================================
+# Configuración de gunicorn para benchmarks/loadtest.py --mode gunicorn:
+# - Cada worker redirige documentos y cargas a la carpeta temporal de la prueba
+# - Instala las sondas de fase (parse, llm, docx) y al salir vuelca sus datos en
+#   LOADTEST_PHASES_DIR/phases-<pid>.json para que la prueba los agregue
+# ============================================================
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_probe = None
+
+
+def post_worker_init(worker):
+    global _probe
+    import app as appmod
+    from loadtest import PhaseProbe, redirect_output_dirs
+    redirect_output_dirs(appmod, os.environ["LOADTEST_STATIC_DIR"])
+    _probe = PhaseProbe(trace_memory=os.getenv("LOADTEST_TRACE_MEMORY") == "1")
+    _probe.install(appmod)
+
+
+def worker_exit(server, worker):
+    if _probe is None:
+        return
+    path = os.path.join(os.environ["LOADTEST_PHASES_DIR"], f"phases-{os.getpid()}.json")
+    with open(path, "w") as f:
+        json.dump(_probe.snapshot(), f)
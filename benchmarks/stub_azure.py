@@ -0,0 +1,173 @@
+
+# benchmarks/stub_azure.py
+# ============================================================
+# Servidor local que imita el endpoint de chat completions de Azure OpenAI:
+# - Latencia configurable (fija + variación aleatoria) o por distribución
+#   (fixed:0.5 | uniform:0.2,1.0 | lognormal:0.8,0.4 -> mediana y sigma)
+# - Tamaño de la respuesta fijo o por distribución de palabras (--words 150,600)
+# - Respuesta normal o en streaming (SSE, con el primer evento sin choices como Azure)
+# - HTTP/1.1 con keep-alive para ejercitar el pool de conexiones
+#
+# Uso: python benchmarks/stub_azure.py --port 8089 --delay 0.5
+#      AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8089 python app.py
+# ============================================================
+
+from __future__ import annotations
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+DEFAULT_TEXT = "## Sección\n\nTexto **de prueba** generado por el servidor simulado.\n\n- uno\n- dos"
+_VOCAB = ("proyecto", "datos", "entidad", "municipio", "gobernanza", "interoperabilidad", "servicio",
+          "ciudadanos", "capacidad", "calidad", "inversión", "territorio", "plataforma", "información")
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """'fixed:0.5', 'uniform:0.2,1.0' o 'lognormal:0.8,0.4' (mediana, sigma) -> muestreador."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Distribución no válida: {spec!r}")
+
+
+def synthetic_markdown(rng: random.Random, words: int) -> str:
+    """Texto Markdown de unas `words` palabras: párrafos y viñetas."""
+    out, left = [], words
+    while left > 0:
+        n = min(left, rng.randint(20, 60))
+        text = " ".join(rng.choice(_VOCAB) for _ in range(n))
+        out.append(f"- {text}" if rng.random() < 0.3 else text.capitalize() + ".")
+        left -= n
+    return "\n\n".join(out)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # silencioso
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        cfg = self.server.cfg
+        self.server.count_request()
+        time.sleep(self.server.sample_latency())
+        text = self.server.sample_text()
+        usage = {"prompt_tokens": sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4,
+                 "completion_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model") or "stub"}
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [dict(base, object="chat.completion.chunk", choices=[])]
+            words = text.split(" ")
+            for i, w in enumerate(words):
+                delta = {"content": w + (" " if i < len(words) - 1 else "")}
+                events.append(dict(base, object="chat.completion.chunk",
+                                   choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+            events.append(dict(base, object="chat.completion.chunk",
+                               choices=[{"index": 0, "delta": {}, "finish_reason": cfg["finish"]}]))
+            for ev in events:
+                self._chunk(f"data: {json.dumps(ev, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if cfg["chunk_delay"]:
+                    time.sleep(cfg["chunk_delay"])
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+            return
+
+        payload = dict(base, choices=[{"index": 0, "finish_reason": cfg["finish"],
+                                       "message": {"role": "assistant", "content": text}}], usage=usage)
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, *, delay=0.0, jitter=0.0, chunk_delay=0.0, text=DEFAULT_TEXT, finish="stop",
+                 latency: Optional[str] = None, words: Optional[Tuple[int, int]] = None, seed: Optional[int] = None):
+        super().__init__(addr, StubHandler)
+        self.cfg = {"delay": delay, "jitter": jitter, "chunk_delay": chunk_delay, "text": text, "finish": finish,
+                    "latency": latency, "words": words}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._latency = parse_distribution(latency) if latency else None
+
+    def sample_latency(self) -> float:
+        cfg = self.cfg
+        with self._lock:
+            if self._latency is not None:
+                return max(0.0, self._latency(self._rng))
+            return max(0.0, cfg["delay"] + self._rng.uniform(-cfg["jitter"], cfg["jitter"]))
+
+    def sample_text(self) -> str:
+        words = self.cfg["words"]
+        if not words:
+            return self.cfg["text"]
+        with self._lock:
+            n = self._rng.randint(words[0], words[1])
+            seed = self._rng.random()
+        return synthetic_markdown(random.Random(seed), n)
+
+    def handle_error(self, request, client_address):
+        # El cliente cortó la conexión (timeout o plazo vencido): es lo que se quiere probar
+        pass
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+
+def start_stub(port: int = 0, **cfg) -> Tuple[StubServer, str]:
+    """Arranca el servidor en un hilo y devuelve (servidor, endpoint base)."""
+    server = StubServer(("127.0.0.1", port), **cfg)
+    threading.Thread(target=server.serve_forever, name="stub-azure", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor simulado de Azure OpenAI (chat completions).")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--delay", type=float, default=0.5, help="Latencia por petición en segundos")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Variación aleatoria ± de la latencia")
+    ap.add_argument("--chunk-delay", type=float, default=0.0, help="Pausa entre fragmentos en streaming")
+    ap.add_argument("--finish", default="stop", help="finish_reason devuelto (stop, length, ...)")
+    ap.add_argument("--latency", help="Distribución de latencia (sustituye --delay/--jitter), p. ej. lognormal:0.8,0.4")
+    ap.add_argument("--words", help="Palabras por respuesta 'min,max' (por defecto, texto fijo)")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+    words = tuple(int(v) for v in args.words.split(",")) if args.words else None
+    server = StubServer(("127.0.0.1", args.port), delay=args.delay, jitter=args.jitter,
+                        chunk_delay=args.chunk_delay, finish=args.finish,
+                        latency=args.latency, words=words, seed=args.seed)
+    print(f"Servidor simulado en http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+
+# chat_flow.py
+# ============================================================
+# Flujo guiado (/api/chat) compilado como tabla de transiciones:
+# - conversation_flow se compila una vez al arrancar: por paso, su handler, sus comandos
+#   exactos y sus respuestas fijas ya serializadas (mismos bytes que jsonify)
+# - Despacho O(1): un dict por paso en lugar de la cadena de "if current_step == ..."
+# - Por petición solo se arma lo dinámico (id del trabajo, explicaciones de las compuertas)
+#
+# Claves de conversation_flow que usa la compilación:
+#   "options"      -> botones de respuesta
+#   "alt_topic"    -> compuerta Sí/No (con "No" se abre la explicación en el chat libre)
+#   "multiselect"  -> {"items": [...], "hint": "..."}: selección múltiple con __msel__:a|b
+#   "upload"       -> tipo de archivo que se espera subir antes de continuar
+# ============================================================
+
+from __future__ import annotations
+import re
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from flask import current_app, jsonify, request, session, url_for
+
+from tracing import span
+from utils import _is_no, _is_yes
+
+logger = logging.getLogger(__name__)
+
+MSEL_PREFIX = "__msel__:"
+FINAL_STEP = "finalizado"
+CONTINUE_RE = re.compile(r'\b(continuar|siguiente)\b')
+RESUME_COMMANDS = frozenset(('continuar flujo', 'volver al flujo'))
+UPLOAD_MISSING_MD = "\n\n> ⚠️ Aún no has subido el archivo. Por favor súbelo y luego escribe **Continuar**."
+ONLY_IDEC_IA_MD = ("❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. "
+                   "Usa *Reiniciar* para empezar de nuevo.")
+
+# Variantes de respuesta fija por paso
+SHOW = "show"        # el paso tal como se presenta (con multiselección o recuadro de carga)
+PLAIN = "plain"      # avance genérico: prompt + opciones (+ carga), sin multiselección
+MISSING = "missing"  # paso de carga: se pidió continuar sin haber subido el archivo
+
+
+def _msel_values(user_message: str) -> List[str]:
+    raw = user_message.split(':', 1)[1]
+    return [v.strip() for v in raw.split('|') if v.strip()]
+
+
+class ChatFlow:
+    """Tabla de transiciones del flujo guiado con respuestas precalculadas por paso."""
+
+    def __init__(
+        self,
+        flow: Dict[str, Dict[str, Any]],
+        *,
+        start_job: Callable[[Dict[str, Any]], Any],
+        gate_explanation: Callable[[str, Dict[str, Any]], Any],
+        initial_step: str = "intro_bienvenida",
+    ):
+        self.flow = flow
+        self.start_job = start_job
+        self.gate_explanation = gate_explanation
+        self.initial_step = initial_step
+        # Comandos exactos por paso (texto en minúsculas -> acción), se prueban antes de reanudar
+        self.commands: Dict[str, Dict[str, Callable]] = {}
+        self.handlers: Dict[str, Callable] = {}
+        self._compile()
+        # Bytes serializados por (raíz de la app, modo debug): url_for y jsonify dependen de ambos
+        self._views: Dict[Tuple[str, bool], Dict[Tuple[str, str], bytes]] = {}
+
+    # ---------- Compilación ----------
+    def _compile(self) -> None:
+        intro = self.initial_step
+        if intro in self.flow:
+            self.commands[intro] = {
+                'iniciar': self._show_current,
+                'start': self._show_current,
+                'tengo dudas respecto al proceso, me gustaría resolverlas antes de empezar': self._goto("gate_1_ciclo"),
+                'sí, entiendo el proceso y deseo continuar': self._goto(self.flow[intro].get("next_step")),
+            }
+        for key, conf in self.flow.items():
+            if "alt_topic" in conf:
+                self.handlers[key] = self._handle_gate
+            elif key == "elige_vertical":
+                self.handlers[key] = self._handle_vertical
+            elif key == "idec_componentes":
+                self.handlers[key] = self._handle_componentes
+            elif "multiselect" in conf:
+                self.handlers[key] = self._show_current
+            elif "upload" in conf:
+                self.handlers[key] = self._handle_upload
+
+    def _payloads(self, download_url: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        out = {}
+        for key in self.flow:
+            out[(key, SHOW)] = self._step_payload(key, download_url)
+            out[(key, PLAIN)] = self._step_payload(key, download_url, plain=True)
+            if "upload" in self.flow[key]:
+                missing = self._step_payload(key, download_url)
+                missing["response"] += UPLOAD_MISSING_MD
+                out[(key, MISSING)] = missing
+        out[(FINAL_STEP, "only_idec_ia")] = {"response": ONLY_IDEC_IA_MD, "current_step": FINAL_STEP, "format": "markdown"}
+        return out
+
+    def _step_payload(self, key: str, download_url: str, *, plain: bool = False) -> Dict[str, Any]:
+        conf = self.flow.get(key, {})
+        payload = {"response": conf.get("prompt", "…"), "current_step": key, "format": "markdown"}
+        if "multiselect" in conf and not plain:
+            ms = conf["multiselect"]
+            payload["response"] += ms["hint"]
+            payload["multiselect"] = {"items": list(ms["items"]), "submit_text": ms.get("submit_text", "Confirmar")}
+            return payload
+        if "options" in conf:
+            payload["options"] = conf["options"]
+        if "upload" in conf:
+            payload["upload"] = {"expect_upload": True, "tipo": conf["upload"], "download_url": download_url}
+        return payload
+
+    def _view_table(self) -> Dict[Tuple[str, str], bytes]:
+        env = (request.script_root, current_app.debug)
+        table = self._views.get(env)
+        if table is None:
+            payloads = self._payloads(url_for('download_templates'))
+            table = {k: jsonify(p).get_data() for k, p in payloads.items()}
+            self._views[env] = table
+        return table
+
+    def view(self, key: str, variant: str = SHOW):
+        """Respuesta fija ya serializada; pasos desconocidos se arman al vuelo como antes."""
+        data = self._view_table().get((key, variant))
+        if data is None:
+            return jsonify(self._step_payload(key, url_for('download_templates'), plain=variant == PLAIN))
+        return current_app.response_class(data, mimetype=current_app.json.mimetype)
+
+    # ---------- Despacho ----------
+    def dispatch(self, data: Dict[str, Any]):
+        user_message = (data.get('message') or '').strip()
+        user_lower = user_message.lower()
+        current_step = session.get('current_step', self.initial_step)
+        ctx = (current_step, user_message, user_lower, data)
+
+        with span("paso", step=current_step):
+            command = self.commands.get(current_step, {}).get(user_lower)
+            if command is not None:
+                return command(*ctx)
+
+            # Reanudar tras el chat libre: se vuelve a mostrar el paso actual
+            if session.pop('resume_from_alt', False) or user_lower in RESUME_COMMANDS:
+                return self.view(current_step)
+
+            return self.handlers.get(current_step, self._handle_answer)(*ctx)
+
+    def _advance(self, key: str, variant: str = SHOW):
+        session['current_step'] = key
+        return self.view(key, variant)
+
+    def _goto(self, key: str) -> Callable:
+        return lambda *ctx: self._advance(key)
+
+    def _show_current(self, step, *_):
+        return self.view(step)
+
+    # ---------- Handlers por paso ----------
+    def _handle_gate(self, step, user_message, user_lower, data):
+        next_step = self.flow[step]['next_step']
+        if _is_yes(user_lower):
+            return self._advance(next_step)
+        if _is_no(user_lower):
+            # Después de obtener la explicación: si el LLM la rechaza (429) el usuario sigue en este paso
+            response = self.gate_explanation(step, data)
+            session['after_alt_next_step'] = next_step
+            return response
+        return self.view(step)
+
+    def _handle_vertical(self, step, user_message, user_lower, data):
+        if not user_message.startswith(MSEL_PREFIX):
+            return self.view(step)
+        selected = _msel_values(user_message)
+        if not selected:
+            session['current_step'] = FINAL_STEP
+            return self.view(FINAL_STEP, "only_idec_ia")
+
+        has_idec = any('idec' in s.lower() for s in selected)
+        has_ia = any('ia' in s.lower() or 'inteligencia artificial' in s.lower() for s in selected)
+        verticales = (['IDEC'] if has_idec else []) + (['IA'] if has_ia else [])
+        responses = session.get('responses', {})
+        responses['vertical'] = ' y '.join(verticales) or 'Ninguna'
+        session['responses'] = responses
+        if not verticales:
+            session['current_step'] = FINAL_STEP
+            return self.view(FINAL_STEP, "only_idec_ia")
+        # Con IDEC se eligen primero los componentes; solo IA va directo al siguiente paso
+        return self._advance('idec_componentes' if has_idec else self.flow[step]['next_step'])
+
+    def _handle_componentes(self, step, user_message, user_lower, data):
+        if user_message.startswith(MSEL_PREFIX):
+            comps = _msel_values(user_message)
+            if comps:
+                responses = session.get('responses', {})
+                responses[step] = comps
+                session['responses'] = responses
+                return self._advance(self.flow[step]['next_step'])
+        return self.view(step)
+
+    def _handle_upload(self, step, user_message, user_lower, data):
+        if user_message and CONTINUE_RE.search(user_lower):
+            responses = session.get('responses', {})
+            if f"upload_{self.flow[step]['upload']}" not in responses:
+                return self.view(step, MISSING)
+            next_step = self.flow[step]['next_step']
+            if next_step == FINAL_STEP:
+                return self.start_job(responses)
+            return self._advance(next_step, PLAIN)
+        return self.view(step)
+
+    def _handle_answer(self, step, user_message, user_lower, data):
+        """Paso de texto libre: guarda la respuesta y avanza."""
+        responses = session.get('responses', {})
+        responses[step] = user_message
+        session['responses'] = responses
+        next_step = self.flow.get(step, {}).get("next_step")
+        if not next_step or next_step == FINAL_STEP:
+            return self.start_job(responses)
+        return self._advance(next_step, PLAIN)
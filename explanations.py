@@ -0,0 +1,160 @@
+
+# explanations.py
+# ============================================================
+# Explicaciones fijas del Chat Libre (compuertas del flujo):
+# - Los temas se declaran en conversation_flow con la clave "alt_topic"
+# - Paso de build offline: se generan una vez y se guardan como artefacto versionado
+# - La app las sirve desde memoria; solo se regeneran si cambia el tema o SYSTEM_PRIMER
+# - Si falta el artefacto o una explicación, la app la genera en vivo: el build no depende de esto
+#
+# Uso: python explanations.py [--force]
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import logging
+import argparse
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from llm_cache import completion_key
+from utils import ask_markdown_azure, conversation_flow, SYSTEM_PRIMER
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPLANATIONS_PATH = os.path.join(BASE_DIR, "precomputed", "explicaciones.json")
+ARTIFACT_VERSION = 1
+
+# Parámetros de generación (forman parte de la huella del artefacto)
+EXPLANATION_MAX_TOKENS = 1000
+EXPLANATION_TEMPERATURE = 0.4
+
+
+def explanation_messages(topic_md: str) -> List[Dict[str, str]]:
+    system_msg = {"role": "system", "content": SYSTEM_PRIMER + "\nResponde SIEMPRE en Markdown claro, con viñetas y ejemplo."}
+    user_msg   = {"role": "user", "content": f"{topic_md}\n\nTermina con: 'Cuando estés listo, escribe **Finalizar** para volver al flujo.'"}  # noqa: E501
+    return [system_msg, user_msg]
+
+
+def static_topics(flow: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Pasos del flujo que declaran un tema fijo para el Chat Libre."""
+    flow = conversation_flow if flow is None else flow
+    return {step: conf["alt_topic"] for step, conf in flow.items() if conf.get("alt_topic")}
+
+
+@lru_cache(maxsize=64)
+def topic_fingerprint(topic_md: str) -> str:
+    """Cambia si cambia el tema, SYSTEM_PRIMER o los parámetros de generación."""
+    return completion_key(
+        model="", messages=explanation_messages(topic_md),
+        temperature=EXPLANATION_TEMPERATURE, max_tokens=EXPLANATION_MAX_TOKENS, primer=SYSTEM_PRIMER,
+    )
+
+
+def generate_explanation(topic_md: str, *, client, cache=None, deadline: Optional[float] = None) -> str:
+    return ask_markdown_azure(
+        explanation_messages(topic_md), client=client,
+        max_tokens=EXPLANATION_MAX_TOKENS, temperature=EXPLANATION_TEMPERATURE, cache=cache, deadline=deadline,
+        site="explicacion",
+    )
+
+
+def _read_artifact(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"version": ARTIFACT_VERSION, "items": {}}
+    if data.get("version") != ARTIFACT_VERSION:
+        return {"version": ARTIFACT_VERSION, "items": {}}
+    return data
+
+
+class PrecomputedExplanations:
+    """Explicaciones cargadas en memoria; solo se entregan si su huella sigue vigente."""
+
+    def __init__(self, path: str = EXPLANATIONS_PATH):
+        self.path = path
+        self._items: Dict[str, Dict[str, Any]] = _read_artifact(path).get("items", {})
+
+    def get(self, step_key: str, topic_md: str) -> Optional[str]:
+        item = self._items.get(step_key)
+        if not item or item.get("fingerprint") != topic_fingerprint(topic_md):
+            return None
+        return item.get("markdown")
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def build_explanations(*, client, path: str = EXPLANATIONS_PATH, force: bool = False) -> Dict[str, str]:
+    """Genera las explicaciones desactualizadas y reescribe el artefacto. Devuelve el estado por paso."""
+    data = _read_artifact(path)
+    items = data["items"]
+    topics = static_topics()
+    report: Dict[str, str] = {}
+    model = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+
+    for step, topic_md in topics.items():
+        fp = topic_fingerprint(topic_md)
+        if not force and (items.get(step) or {}).get("fingerprint") == fp:
+            report[step] = "vigente"
+            continue
+        try:
+            markdown = generate_explanation(topic_md, client=client)
+        except Exception as e:
+            # Se conserva lo demás; la app genera esta en vivo hasta la próxima corrida
+            logger.exception("No se pudo generar la explicación de %s", step)
+            report[step] = f"error: {e}"
+            continue
+        items[step] = {
+            "topic": topic_md,
+            "fingerprint": fp,
+            "model": model,
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "markdown": markdown,
+        }
+        report[step] = "generada"
+
+    for step in [s for s in items if s not in topics]:
+        del items[step]
+        report[step] = "eliminada"
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return report
+
+
+def main():
+    from dotenv import load_dotenv
+    from openai import AzureOpenAI
+    from llm_transport import make_http_client
+
+    ap = argparse.ArgumentParser(description="Precalcula las explicaciones fijas del Chat Libre.")
+    ap.add_argument("--force", action="store_true", help="Regenera aunque la huella no haya cambiado")
+    ap.add_argument("--path", default=EXPLANATIONS_PATH)
+    args = ap.parse_args()
+
+    load_dotenv()
+    http_client, _ = make_http_client()
+    client = AzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-05-01-preview"),
+        http_client=http_client,
+        timeout=http_client.timeout
+    )
+    report = build_explanations(client=client, path=args.path, force=args.force)
+    for step, status in report.items():
+        print(f"{step}: {status}")
+    return 1 if any(status.startswith("error") for status in report.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
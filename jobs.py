@@ -0,0 +1,180 @@
+
+# jobs.py
+# ============================================================
+# Cola de trabajos en segundo plano (generación de documentos):
+# - Persistencia en SQLite (sobrevive a reinicios del worker)
+# - Pool de hilos acotado (concurrencia configurable)
+# - Reclamo atómico: varios procesos gunicorn comparten la misma cola
+# - Cada trabajo guarda la sesión que lo pidió (solo ella consulta su estado)
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from tracing import bind, span
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    result      TEXT,
+    error       TEXT,
+    owner       TEXT,
+    session_id  TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+"""
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Un trabajo 'running' de un proceso muerto en este host se puede reencolar."""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True  # No podemos comprobar otro host; se asume vivo
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Cola de trabajos respaldada en SQLite con un pool de hilos acotado."""
+
+    def __init__(self, db_path: str, *, max_workers: int = 2, retention_s: float = 24 * 3600):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.retention_s = retention_s
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="jobs")
+        self._local = threading.local()
+        with self._conn() as db:
+            db.executescript(_SCHEMA)
+            # Bases creadas antes de guardar la sesión dueña del trabajo
+            if "session_id" not in {r["name"] for r in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN session_id TEXT")
+
+    # ---------- SQLite ----------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- API ----------
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Any]) -> None:
+        """El handler recibe el payload y devuelve un resultado serializable a JSON."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict[str, Any], *, session_id: Optional[str] = None) -> str:
+        """Encola el trabajo; `session_id` es la sesión dueña (ver get)."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, session_id, created_at, updated_at) VALUES (?,?,?,?,?,?,?)",
+            (job_id, kind, STATUS_QUEUED, json.dumps(payload, ensure_ascii=False), session_id, now, now),
+        )
+        # Si la petición se está trazando, el trabajo continúa la misma traza
+        self._executor.submit(bind(self._run), job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT id, kind, status, result, error, session_id, created_at, updated_at FROM jobs WHERE id=?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def pending_payloads(self) -> List[Dict[str, Any]]:
+        """Payloads de los trabajos en cola o en curso (p. ej. para no borrar archivos que van a usar)."""
+        rows = self._conn().execute(
+            "SELECT payload FROM jobs WHERE status IN (?,?)", (STATUS_QUEUED, STATUS_RUNNING)
+        ).fetchall()
+        return [json.loads(r["payload"]) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Trabajos por estado (para /metrics)."""
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def recover(self) -> int:
+        """Reencola trabajos huérfanos (worker caído) y relanza los pendientes. Purga los antiguos."""
+        db = self._conn()
+        now = time.time()
+        db.execute(
+            "DELETE FROM jobs WHERE status IN (?,?) AND updated_at < ?",
+            (STATUS_DONE, STATUS_ERROR, now - self.retention_s),
+        )
+        for row in db.execute("SELECT id, owner FROM jobs WHERE status=?", (STATUS_RUNNING,)).fetchall():
+            if not _owner_alive(row["owner"]):
+                db.execute(
+                    "UPDATE jobs SET status=?, owner=NULL, updated_at=? WHERE id=? AND status=? AND owner IS ?",
+                    (STATUS_QUEUED, now, row["id"], STATUS_RUNNING, row["owner"]),
+                )
+        pending = [r["id"] for r in db.execute("SELECT id FROM jobs WHERE status=? ORDER BY created_at", (STATUS_QUEUED,))]
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+        if pending:
+            logger.info(f"Cola de trabajos: {len(pending)} trabajo(s) pendiente(s) relanzado(s)")
+        return len(pending)
+
+    # ---------- Ejecución ----------
+    def _run(self, job_id: str) -> None:
+        db = self._conn()
+        # Reclamo atómico: solo un hilo/proceso pasa de queued a running
+        cur = db.execute(
+            "UPDATE jobs SET status=?, owner=?, updated_at=? WHERE id=? AND status=?",
+            (STATUS_RUNNING, _owner_id(), time.time(), job_id, STATUS_QUEUED),
+        )
+        if cur.rowcount != 1:
+            return
+        row = db.execute("SELECT kind, payload FROM jobs WHERE id=?", (job_id,)).fetchone()
+        try:
+            handler = self._handlers[row["kind"]]
+            with span(f"trabajo.{row['kind']}", job_id=job_id):
+                result = handler(json.loads(row["payload"]))
+            db.execute(
+                "UPDATE jobs SET status=?, result=?, updated_at=? WHERE id=?",
+                (STATUS_DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id),
+            )
+        except Exception as e:
+            logger.exception(f"Error en el trabajo {job_id}")
+            db.execute(
+                "UPDATE jobs SET status=?, error=?, updated_at=? WHERE id=?",
+                (STATUS_ERROR, str(e), time.time(), job_id),
+            )
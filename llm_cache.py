@@ -0,0 +1,139 @@
+
+# llm_cache.py
+# ============================================================
+# Caché de respuestas del LLM (direccionada por contenido):
+# - Llave = SHA-256 de (modelo, mensajes, temperatura, max_tokens, primer)
+# - Nivel 1: LRU en memoria del proceso (acotado, con TTL)
+# - Nivel 2 (opcional): SQLite en disco compartido entre workers gunicorn
+# - Contadores de aciertos/fallos para observar su efecto
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def completion_key(*, model: Optional[str], messages: List[Dict[str, str]], temperature: float,
+                   max_tokens: int, primer: str = "") -> str:
+    """Llave estable: el mismo prompt produce la misma llave en cualquier worker."""
+    raw = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, "primer": primer},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Caché en dos niveles para textos completos devueltos por el LLM."""
+
+    def __init__(self, *, max_entries: int = 256, ttl_s: float = 24 * 3600,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 5000):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    # ---------- SQLite ----------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    # ---------- API ----------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                value, created = item
+                if now - created <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                    self._stats["hits_memory"] += 1
+                    return value
+                del self._mem[key]
+
+        if self.disk_path:
+            try:
+                db = self._conn()
+                row = db.execute("SELECT value, created_at FROM completions WHERE key=?", (key,)).fetchone()
+                if row and now - row[1] <= self.ttl_s:
+                    db.execute("UPDATE completions SET accessed_at=? WHERE key=?", (now, key))
+                    self._remember(key, row[0], row[1])
+                    self._count("hits_disk")
+                    return row[0]
+                if row:
+                    db.execute("DELETE FROM completions WHERE key=?", (key,))
+            except sqlite3.Error:
+                logger.exception("Caché LLM: error leyendo el nivel en disco")
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        if not value:
+            return
+        now = time.time()
+        self._remember(key, value, now)
+        self._count("stores")
+        if self.disk_path:
+            try:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at) VALUES (?,?,?,?)",
+                    (key, value, now, now),
+                )
+                # Expirados primero; luego los menos usados si se supera el tope
+                cur = db.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_s,))
+                evicted = max(cur.rowcount, 0)
+                cur = db.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    " SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+                evicted += max(cur.rowcount, 0)
+                if evicted:
+                    self._count("evictions", evicted)
+            except sqlite3.Error:
+                logger.exception("Caché LLM: error escribiendo el nivel en disco")
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        with self._lock:
+            self._mem[key] = (value, created)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries_memory"] = len(self._mem)
+        lookups = out["hits_memory"] + out["hits_disk"] + out["misses"]
+        out["hit_rate"] = round((out["hits_memory"] + out["hits_disk"]) / lookups, 4) if lookups else 0.0
+        return out
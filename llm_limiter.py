@@ -0,0 +1,389 @@
+
+# llm_limiter.py
+# ============================================================
+# Control de admisión de las llamadas a Azure OpenAI, compartido entre workers:
+# - Concurrencia máxima y cuota de tokens/peticiones por minuto (TPM/RPM) en SQLite
+#   (data/llm_limiter.sqlite3), para que todos los procesos respeten la misma cuota
+# - Cola con orden de llegada; si está llena (o la espera excede el máximo) se rechaza
+#   enseguida con LLMBusy y un mensaje amable, en lugar de acumular peticiones
+# - Ante un 429 se respeta Retry-After para todos los workers (enfriamiento global) y se
+#   reintenta con backoff exponencial y jitter
+# - Los tokens se reservan con una estimación (prompt + max_tokens) y se ajustan con resp.usage
+# ============================================================
+
+from __future__ import annotations
+import os
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import openai
+
+from metrics import LLM_QUEUE_SECONDS, LLM_REJECTED, LLM_THROTTLED
+from prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGE = ("⏳ El asistente está atendiendo muchas solicitudes en este momento. "
+                "Por favor intenta de nuevo en unos segundos.")
+
+WINDOW_S = 60.0  # Ventana de la cuota de Azure (tokens y peticiones por minuto)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (id TEXT PRIMARY KEY, pid INTEGER NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS usage (id TEXT PRIMARY KEY, ts REAL NOT NULL, tokens INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage(ts);
+CREATE TABLE IF NOT EXISTS waiters (id TEXT PRIMARY KEY, pid INTEGER NOT NULL, since REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+
+class LLMBusy(RuntimeError):
+    """El servicio está saturado: cola llena, espera excedida o cuota de Azure agotada."""
+
+    def __init__(self, reason: str, retry_after: float = 5.0, message: str = BUSY_MESSAGE):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class Ticket:
+    """Turno concedido: ocupa un slot de concurrencia y una reserva de tokens en la ventana."""
+
+    def __init__(self, limiter: "AdmissionLimiter", ticket_id: str, tokens: int):
+        self.limiter = limiter
+        self.id = ticket_id
+        self.tokens = tokens
+        self._released = False
+
+    def settle(self, tokens: Optional[int]) -> None:
+        """Reemplaza la estimación por los tokens reales (resp.usage.total_tokens)."""
+        if tokens:
+            self.limiter._settle(self.id, tokens)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.limiter._release(self.id)
+
+
+class AdmissionLimiter:
+    """Semáforo + ventana TPM/RPM + enfriamiento global en SQLite, con cola de espera FIFO."""
+
+    def __init__(self, db_path: str, *, max_concurrency: int = 8, tpm: int = 0, rpm: int = 0,
+                 max_queue: int = 32, lease_s: float = 300.0, poll_s: float = 0.05):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.max_concurrency = max_concurrency
+        self.tpm = tpm
+        self.rpm = rpm
+        self.max_queue = max_queue
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self._local = threading.local()
+        with self._conn() as db:
+            db.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- Admisión ----------
+    def acquire(self, tokens: int, *, max_wait: Optional[float] = None, reject_when_full: bool = True) -> Ticket:
+        """Espera turno (FIFO entre todos los workers) hasta `max_wait` segundos.
+
+        Lanza LLMBusy si la cola ya está llena (`reject_when_full`) o si la espera se agota.
+        """
+        t0 = time.monotonic()
+        waiter_id = uuid.uuid4().hex
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self._purge(db, now)
+            waiting = db.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+            if reject_when_full and self.max_queue > 0 and waiting >= self.max_queue:
+                db.execute("COMMIT")
+                self._reject("cola_llena", t0)
+            db.execute("INSERT INTO waiters (id, pid, since) VALUES (?,?,?)", (waiter_id, os.getpid(), now))
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        try:
+            while True:
+                granted, wait = self._try_grant(waiter_id, tokens)
+                if granted:
+                    LLM_QUEUE_SECONDS.observe(time.monotonic() - t0, outcome="admitida")
+                    return Ticket(self, waiter_id, tokens)
+                left = None if max_wait is None else max_wait - (time.monotonic() - t0)
+                if left is not None and left <= 0:
+                    self._reject("espera_agotada", t0, retry_after=max(wait, 1.0))
+                # Jitter: los workers que esperan no consultan todos a la vez
+                time.sleep(min(wait, left if left is not None else wait) * random.uniform(0.8, 1.2))
+        finally:
+            self._conn().execute("DELETE FROM waiters WHERE id=?", (waiter_id,))
+
+    def _reject(self, reason: str, t0: float, *, retry_after: float = 5.0) -> None:
+        LLM_QUEUE_SECONDS.observe(time.monotonic() - t0, outcome="rechazada")
+        LLM_REJECTED.inc(reason=reason)
+        logger.warning("Llamada al LLM rechazada (%s) tras %.2fs en cola", reason, time.monotonic() - t0)
+        raise LLMBusy(reason, retry_after)
+
+    def _try_grant(self, waiter_id: str, tokens: int):
+        """(True, 0) si se concedió el turno; si no, (False, segundos sugeridos hasta reintentar)."""
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self._purge(db, now)
+            cooldown = (db.execute("SELECT value FROM state WHERE key='cooldown_until'").fetchone() or (0.0,))[0]
+            if now < cooldown:
+                return False, cooldown - now
+            since = db.execute("SELECT since FROM waiters WHERE id=?", (waiter_id,)).fetchone()[0]
+            ahead = db.execute("SELECT COUNT(*) FROM waiters WHERE since < ? OR (since = ? AND id < ?)",
+                               (since, since, waiter_id)).fetchone()[0]
+            in_flight = db.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            if self.max_concurrency > 0 and ahead >= self.max_concurrency - in_flight:
+                return False, self.poll_s
+            if self.tpm > 0 or self.rpm > 0:
+                if ahead > 0:
+                    return False, self.poll_s
+                used_tokens, used_requests, oldest = db.execute(
+                    "SELECT COALESCE(SUM(tokens), 0), COUNT(*), MIN(ts) FROM usage").fetchone()
+                # Una petición más grande que la cuota entera pasa sola cuando la ventana está vacía
+                over_tpm = self.tpm > 0 and used_tokens and used_tokens + tokens > self.tpm
+                over_rpm = self.rpm > 0 and used_requests >= self.rpm
+                if over_tpm or over_rpm:
+                    return False, max(self.poll_s, oldest + WINDOW_S - now)
+            db.execute("INSERT INTO slots (id, pid, expires_at) VALUES (?,?,?)", (waiter_id, os.getpid(), now + self.lease_s))
+            db.execute("INSERT INTO usage (id, ts, tokens) VALUES (?,?,?)", (waiter_id, now, tokens))
+            return True, 0.0
+        finally:
+            db.execute("COMMIT")
+
+    def _purge(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM usage WHERE ts < ?", (now - WINDOW_S,))
+        db.execute("DELETE FROM slots WHERE expires_at < ?", (now,))
+        # Slots y esperas de workers caídos en este host (una espera viva puede durar todo el plazo del documento)
+        pids = {pid for (pid,) in db.execute("SELECT pid FROM slots UNION SELECT pid FROM waiters")}
+        for pid in pids:
+            if pid != os.getpid() and not _pid_alive(pid):
+                db.execute("DELETE FROM slots WHERE pid=?", (pid,))
+                db.execute("DELETE FROM waiters WHERE pid=?", (pid,))
+
+    def _settle(self, ticket_id: str, tokens: int) -> None:
+        self._conn().execute("UPDATE usage SET tokens=? WHERE id=?", (tokens, ticket_id))
+
+    def _release(self, ticket_id: str) -> None:
+        self._conn().execute("DELETE FROM slots WHERE id=?", (ticket_id,))
+
+    def cooldown(self, seconds: float) -> None:
+        """Ningún worker llama a Azure durante `seconds` (Retry-After de un 429)."""
+        until = time.time() + seconds
+        self._conn().execute(
+            "INSERT INTO state (key, value) VALUES ('cooldown_until', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=MAX(value, excluded.value)", (until,))
+
+    # ---------- Estado ----------
+    def queue_full(self) -> bool:
+        if self.max_queue <= 0:
+            return False
+        return self._conn().execute("SELECT COUNT(*) FROM waiters").fetchone()[0] >= self.max_queue
+
+    def snapshot(self) -> Dict[str, float]:
+        """Estado global (todos los workers): para /metrics, calculado al consultar."""
+        db = self._conn()
+        now = time.time()
+        tokens, requests = db.execute(
+            "SELECT COALESCE(SUM(tokens), 0), COUNT(*) FROM usage WHERE ts >= ?", (now - WINDOW_S,)).fetchone()
+        cooldown = (db.execute("SELECT value FROM state WHERE key='cooldown_until'").fetchone() or (0.0,))[0]
+        return {
+            "in_flight": db.execute("SELECT COUNT(*) FROM slots WHERE expires_at >= ?", (now,)).fetchone()[0],
+            "waiting": db.execute("SELECT COUNT(*) FROM waiters").fetchone()[0],
+            "tokens_last_minute": tokens,
+            "requests_last_minute": requests,
+            "cooldown_s": max(0.0, cooldown - now),
+            "max_concurrency": self.max_concurrency, "tpm": self.tpm, "rpm": self.rpm, "max_queue": self.max_queue,
+        }
+
+
+# -------------------------- Cliente con admisión --------------------------
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After (o retry-after-ms) de la respuesta 429, si viene."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Reserva: tokens del prompt (conteo local) más el máximo de la respuesta."""
+    prompt = sum(count_tokens(m.get("content") or "") for m in kwargs.get("messages") or [])
+    return prompt + int(kwargs.get("max_tokens") or 0)
+
+
+class _AdmittedStream:
+    """Stream de la respuesta que conserva el turno hasta consumirse o cerrarse."""
+
+    def __init__(self, stream, ticket: Ticket):
+        self._stream = stream
+        self._ticket = ticket
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            for event in self._stream:
+                usage = getattr(event, "usage", None)
+                if usage is not None:
+                    self._ticket.settle(getattr(usage, "total_tokens", None))
+                yield event
+        finally:
+            self._ticket.release()
+
+    def close(self) -> None:
+        try:
+            getattr(self._stream, "close", lambda: None)()
+        finally:
+            self._ticket.release()
+
+
+class _Completions:
+    def __init__(self, owner: "AdmittedClient"):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._create(kwargs)
+
+
+class _Chat:
+    def __init__(self, owner: "AdmittedClient"):
+        self.completions = _Completions(owner)
+
+
+class AdmittedClient:
+    """Envoltura del cliente AzureOpenAI: cada chat.completions.create pasa por el limitador.
+
+    `max_wait` acota la espera en cola (además del `timeout` de la llamada, que se descuenta);
+    con `reject_when_full=False` (trabajos en segundo plano) se espera aunque la cola esté llena.
+    Los reintentos del SDK se desactivan: reintentaría el 429 con el turno tomado y sin respetar
+    el enfriamiento global; el único backoff ante un 429 es el de esta clase.
+    """
+
+    def __init__(self, client, limiter: AdmissionLimiter, *, max_wait: Optional[float] = None,
+                 reject_when_full: bool = True, max_retries: int = 3, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0):
+        if getattr(client, "max_retries", 0):
+            client = client.with_options(max_retries=0)
+        self._client = client
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self.reject_when_full = reject_when_full
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.chat = _Chat(self)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def with_options(self, **options) -> "AdmittedClient":
+        """Copia con otras opciones del SDK que sigue pasando por el limitador.
+        `max_retries` se ignora: el cliente interno ya no reintenta (ver la clase)."""
+        options.pop("max_retries", None)
+        if not options:
+            return self
+        return AdmittedClient(self._client.with_options(**options), self.limiter, max_wait=self.max_wait,
+                              reject_when_full=self.reject_when_full, max_retries=self.max_retries,
+                              backoff_base=self.backoff_base, backoff_max=self.backoff_max)
+
+    def _create(self, kwargs: Dict[str, Any]):
+        tokens = estimate_tokens(kwargs)
+        timeout = kwargs.get("timeout")
+        budget_end = None if not isinstance(timeout, (int, float)) else time.monotonic() + timeout
+        attempt = 0
+        while True:
+            left = None if budget_end is None else budget_end - time.monotonic()
+            waits = [w for w in (self.max_wait, left) if w is not None]
+            ticket = self.limiter.acquire(tokens, max_wait=min(waits) if waits else None,
+                                          reject_when_full=self.reject_when_full)
+            call_kwargs = dict(kwargs)
+            if budget_end is not None:
+                # El tiempo en cola se descuenta del plazo de la llamada
+                call_kwargs["timeout"] = max(0.1, budget_end - time.monotonic())
+            try:
+                resp = self._client.chat.completions.create(**call_kwargs)
+            except openai.RateLimitError as e:
+                ticket.release()
+                attempt += 1
+                retry_after = retry_after_seconds(e)
+                # Backoff exponencial con jitter completo; nunca antes de lo que pide Retry-After
+                delay = max(retry_after or 0.0, random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                self.limiter.cooldown(delay)
+                left = None if budget_end is None else budget_end - time.monotonic()
+                if attempt > self.max_retries or (left is not None and left <= delay):
+                    LLM_THROTTLED.inc(outcome="agotado")
+                    logger.warning("Azure OpenAI sigue limitando (429) tras %d intento(s)", attempt)
+                    raise LLMBusy("limite_azure", delay) from e
+                LLM_THROTTLED.inc(outcome="reintento")
+                logger.info("Azure OpenAI respondió 429; reintento %d en %.1fs (Retry-After: %s)",
+                            attempt, delay, retry_after)
+                continue
+            except BaseException:
+                ticket.release()
+                raise
+            if kwargs.get("stream"):
+                return _AdmittedStream(resp, ticket)
+            usage = getattr(resp, "usage", None)
+            ticket.settle(getattr(usage, "total_tokens", None))
+            ticket.release()
+            return resp
+
+
+def limiter_from_env(data_dir: str) -> AdmissionLimiter:
+    return AdmissionLimiter(
+        os.path.join(data_dir, "llm_limiter.sqlite3"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        tpm=int(os.getenv("LLM_TPM_LIMIT", "0")),
+        rpm=int(os.getenv("LLM_RPM_LIMIT", "0")),
+        max_queue=int(os.getenv("LLM_QUEUE_MAX", "32")),
+    )
+
+
+def admitted_clients(client, limiter: AdmissionLimiter) -> Tuple[AdmittedClient, AdmittedClient]:
+    """(cliente interactivo, cliente de documentos): el primero rechaza rápido, el segundo espera su plazo."""
+    retry = dict(max_retries=int(os.getenv("LLM_RATE_RETRIES", "3")),
+                 backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "1")),
+                 backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30")))
+    return (
+        AdmittedClient(client, limiter, max_wait=float(os.getenv("LLM_QUEUE_MAX_WAIT", "20")), **retry),
+        AdmittedClient(client, limiter, reject_when_full=False, **retry),
+    )
@@ -0,0 +1,233 @@
+
+# llm_transport.py
+# ============================================================
+# Transporte HTTP para el cliente AzureOpenAI:
+# - Pool de conexiones acotado con keep-alive configurable
+# - Timeouts por fase (conexión, lectura, escritura, espera del pool)
+# - HTTP/2 opcional (requiere `pip install httpx[http2]`)
+# - Estadísticas del pool: conexiones en uso/inactivas y tiempo de espera
+# - Plazo total por llamada (call_deadline): un único hilo vigía corta el socket al vencer
+# ============================================================
+
+from __future__ import annotations
+import os
+import time
+import heapq
+import socket
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def timeout_from_env() -> httpx.Timeout:
+    """Timeouts por fase; la lectura cuenta entre bytes recibidos, no la respuesta completa."""
+    return httpx.Timeout(
+        connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+        read=_env_float("LLM_READ_TIMEOUT", 120.0),
+        write=_env_float("LLM_WRITE_TIMEOUT", 30.0),
+        pool=_env_float("LLM_POOL_TIMEOUT", 10.0),
+    )
+
+
+# ------------------------------------------------------------
+# Plazo total por llamada
+# ------------------------------------------------------------
+# El timeout de httpx acota cada fase (conexión, cada lectura), no la respuesta completa: un
+# servidor que gotea bytes nunca lo dispara. Las respuestas pedidas dentro de call_deadline()
+# quedan vigiladas por un único hilo por proceso que, al vencer el plazo, cierra el socket; la
+# lectura bloqueada falla en el hilo que llama y este libera todo lo que tenga (p. ej. su cupo).
+
+_scope = threading.local()
+
+
+class _DeadlineWatchdog:
+    """Montículo de (plazo, id) con un hilo que se arranca con la primera respuesta vigilada."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._socks: Dict[int, socket.socket] = {}
+        self._ids = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self.fired = 0
+
+    def watch(self, deadline: float, sock: socket.socket) -> int:
+        with self._cond:
+            watch_id = next(self._ids)
+            self._socks[watch_id] = sock
+            heapq.heappush(self._heap, (deadline, watch_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-plazo", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return watch_id
+
+    def cancel(self, watch_id: int) -> None:
+        with self._cond:
+            self._socks.pop(watch_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._heap and self._heap[0][1] not in self._socks:
+                    heapq.heappop(self._heap)  # cancelada: la respuesta ya se cerró
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                deadline, watch_id = self._heap[0]
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                sock = self._socks.pop(watch_id)
+                self.fired += 1
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+_watchdog = _DeadlineWatchdog()
+
+
+@contextmanager
+def call_deadline(deadline: Optional[float]) -> Iterator[None]:
+    """Las respuestas recibidas en este hilo dentro del bloque se cortan al vencer `deadline` (time.monotonic)."""
+    previous = getattr(_scope, "deadline", None)
+    _scope.deadline = deadline
+    try:
+        yield
+    finally:
+        _scope.deadline = previous
+
+
+class _WatchedStream(httpx.SyncByteStream):
+    """Cuerpo de una respuesta vigilada: al cerrarse deja de vigilarla, antes de volver al pool."""
+
+    def __init__(self, inner: httpx.SyncByteStream, watch_id: int):
+        self._inner = inner
+        self._watch_id = watch_id
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._inner
+
+    def close(self) -> None:
+        _watchdog.cancel(self._watch_id)
+        self._inner.close()
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """HTTPTransport con límites explícitos y contadores del pool.
+
+    La espera por el pool se mide desde que llega la petición hasta el primer evento de
+    traza de httpcore (abrir conexión o enviar cabeceras), es decir, el tiempo en cola.
+    """
+
+    def __init__(self, *, max_connections: int = 20, max_keepalive: int = 10,
+                 keepalive_expiry: float = 30.0, http2: bool = False, verify: bool = False):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("LLM_HTTP2=1 pero falta el paquete 'h2' (httpx[http2]); se usa HTTP/1.1")
+                http2 = False
+        super().__init__(
+            verify=verify,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        self.http2 = http2
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "timeouts": 0, "in_flight": 0,
+                       "pool_wait_total_s": 0.0, "pool_wait_max_s": 0.0}
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        waited = []
+        user_trace = request.extensions.get("trace")
+
+        def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if not waited:
+                waited.append(time.perf_counter() - start)
+            if user_trace is not None:
+                user_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+        try:
+            response = super().handle_request(request)
+        except httpx.TimeoutException:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        finally:
+            wait = waited[0] if waited else time.perf_counter() - start
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._stats["pool_wait_total_s"] += wait
+                self._stats["pool_wait_max_s"] = max(self._stats["pool_wait_max_s"], wait)
+        deadline = getattr(_scope, "deadline", None)
+        return response if deadline is None else self._watch(response, deadline)
+
+    def _watch(self, response: httpx.Response, deadline: float) -> httpx.Response:
+        # Con HTTP/2 el socket lo comparten varias peticiones: ahí solo rige el timeout por fase.
+        stream = response.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None and not self.http2 else None
+        if sock is None:
+            return response
+        watch_id = _watchdog.watch(deadline, sock)
+        return httpx.Response(status_code=response.status_code, headers=response.headers,
+                              stream=_WatchedStream(response.stream, watch_id),
+                              extensions=response.extensions)
+
+    def stats(self) -> Dict[str, Any]:
+        in_use = idle = 0
+        for conn in list(getattr(self._pool, "connections", [])):
+            if conn.is_idle():
+                idle += 1
+            elif not conn.is_closed():
+                in_use += 1
+        with self._lock:
+            out = dict(self._stats)
+        requests = out["requests"]
+        out["pool_wait_avg_ms"] = round(1000 * out.pop("pool_wait_total_s") / requests, 3) if requests else 0.0
+        out["pool_wait_max_ms"] = round(1000 * out.pop("pool_wait_max_s"), 3)
+        out.update({"connections_in_use": in_use, "connections_idle": idle,
+                    "max_connections": self.max_connections, "http2": self.http2})
+        return out
+
+
+def make_http_client(*, verify: Optional[bool] = None) -> Tuple[httpx.Client, PooledTransport]:
+    """Cliente httpx configurado desde variables de entorno (LLM_POOL_*, LLM_*_TIMEOUT, LLM_HTTP2)."""
+    if verify is None:
+        verify = os.getenv("LLM_VERIFY_SSL", "0") == "1"
+    transport = PooledTransport(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 30.0),
+        http2=os.getenv("LLM_HTTP2", "0") == "1",
+        verify=verify,
+    )
+    return httpx.Client(transport=transport, timeout=timeout_from_env()), transport
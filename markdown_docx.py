@@ -0,0 +1,383 @@
+
+# markdown_docx.py
+# ============================================================
+# Markdown -> DOCX para los documentos generados:
+# - Tokenizador de bloques con patrones precompilados -> AST -> render en python-docx
+# - Títulos (#..######), párrafos, separadores, listas anidadas (numeradas o con viñetas),
+#   tablas estilo GFM y bloques <center> / <div align="..."> de varias líneas
+# - En línea: **negrita**, *itálica*, `monoespaciado` y [enlaces](url) como hipervínculos reales
+# - Estilos e ids de estilo resueltos una vez por documento
+# ============================================================
+
+from __future__ import annotations
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+# -------------------------- Patrones --------------------------
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+RULE_RE = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+LIST_ITEM_RE = re.compile(r"^( *)(?:([-*+])|(\d+)\.)\s+(.*)$")
+TABLE_SEP_RE = re.compile(r"^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$")
+ALIGN_OPEN_RE = re.compile(
+    r"""^<(?:center|(?:div|p)\s+align=["']?(left|center|right|justify)["']?)\s*>""", re.IGNORECASE)
+ALIGN_CLOSE_RE = re.compile(r"</(?:center|div|p)>\s*$", re.IGNORECASE)
+TOKEN_RE = re.compile(r"(\*\*.+?\*\*|\*.+?\*|`.+?`)")
+LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+LINK_SLOT_RE = re.compile(r"\x00(\d+)\x00")
+
+ALIGNMENTS = {
+    "left": WD_ALIGN_PARAGRAPH.LEFT,
+    "center": WD_ALIGN_PARAGRAPH.CENTER,
+    "right": WD_ALIGN_PARAGRAPH.RIGHT,
+    "justify": WD_ALIGN_PARAGRAPH.JUSTIFY,
+}
+MAX_LIST_LEVEL = 3  # La plantilla por defecto trae 'List Bullet', 'List Bullet 2' y 'List Bullet 3'
+LINK_COLOR = "0563C1"
+
+
+# -------------------------- AST --------------------------
+class Heading(NamedTuple):
+    level: int
+    text: str
+    align: Optional[str] = None
+
+
+class Para(NamedTuple):
+    text: str
+    align: Optional[str] = None
+
+
+class Rule(NamedTuple):
+    pass
+
+
+class ListItem(NamedTuple):
+    text: str
+    children: List["ListBlock"]
+
+
+class ListBlock(NamedTuple):
+    ordered: bool
+    start: int
+    items: List[ListItem]
+
+
+class Table(NamedTuple):
+    header: List[str]
+    aligns: List[Optional[str]]
+    rows: List[List[str]]
+
+
+# -------------------------- Tokenizador --------------------------
+def _split_row(line: str) -> List[str]:
+    s = line.strip()
+    if s.startswith("|"):
+        s = s[1:]
+    if s.endswith("|") and not s.endswith("\\|"):
+        s = s[:-1]
+    return [c.strip().replace("\\|", "|") for c in re.split(r"(?<!\\)\|", s)]
+
+
+def _column_align(spec: str) -> Optional[str]:
+    spec = spec.strip()
+    if spec.startswith(":") and spec.endswith(":"):
+        return "center"
+    if spec.endswith(":"):
+        return "right"
+    if spec.startswith(":"):
+        return "left"
+    return None
+
+
+def parse_markdown(text: str) -> List[tuple]:
+    """Convierte Markdown en una lista de nodos de bloque (Heading, Para, Rule, ListBlock, Table)."""
+    lines = text.expandtabs(4).splitlines()
+    nodes: List[tuple] = []
+    stack: List[Tuple[int, ListBlock]] = []  # listas abiertas: (sangría, bloque)
+    align: Optional[str] = None
+    i, n = 0, len(lines)
+
+    while i < n:
+        raw = lines[i]
+        i += 1
+        s = raw.strip()
+        close_after = False
+        m = ALIGN_OPEN_RE.match(s)
+        if m:
+            align = (m.group(1) or "center").lower()
+            s = s[m.end():].strip()
+        m = ALIGN_CLOSE_RE.search(s) if align else None
+        if m:
+            s = s[:m.start()].strip()
+            close_after = True
+        if not s:
+            # Una línea en blanco no cierra la lista: las listas "sueltas" siguen numerándose
+            if close_after:
+                align = None
+            continue
+
+        item = LIST_ITEM_RE.match(raw.rstrip()) if align is None else None
+        if item and not RULE_RE.match(s):
+            indent, bullet, number, body = len(item.group(1)), item.group(2), item.group(3), item.group(4).strip()
+            ordered = bullet is None
+            while stack and indent < stack[-1][0] - 1:
+                stack.pop()
+            if stack and indent <= stack[-1][0] + 1:
+                # Mismo nivel; si cambia el tipo de lista empieza otra en ese nivel
+                top_indent, block = stack[-1]
+                if block.ordered != ordered:
+                    block = ListBlock(ordered, int(number or 1), [])
+                    (stack[-2][1].items[-1].children if len(stack) > 1 else nodes).append(block)
+                    stack[-1] = (top_indent, block)
+            elif stack and len(stack) >= MAX_LIST_LEVEL:
+                # Más niveles de los que admite la plantilla: se quedan en el último
+                block = stack[-1][1]
+            else:
+                block = ListBlock(ordered, int(number or 1), [])
+                (stack[-1][1].items[-1].children if stack else nodes).append(block)
+                stack.append((indent, block))
+            block.items.append(ListItem(body, []))
+            continue
+
+        stack.clear()
+        if RULE_RE.match(s):
+            nodes.append(Rule())
+        elif HEADING_RE.match(s):
+            m = HEADING_RE.match(s)
+            nodes.append(Heading(len(m.group(1)), m.group(2).strip(), align))
+        elif s.startswith("|") and i < n and TABLE_SEP_RE.match(lines[i].strip()) and "-" in lines[i]:
+            header = _split_row(s)
+            aligns = [_column_align(c) for c in _split_row(lines[i])]
+            i += 1
+            rows = []
+            while i < n and lines[i].strip().startswith("|"):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            nodes.append(Table(header, aligns, rows))
+        else:
+            nodes.append(Para(s, align))
+        if close_after:
+            align = None
+    return nodes
+
+
+# -------------------------- Render --------------------------
+def _classify(part: str) -> Tuple[str, bool, bool, bool]:
+    """(texto, negrita, itálica, monoespaciado) de un token en línea."""
+    if part.startswith("**") and part.endswith("**"):
+        return part[2:-2], True, False, False
+    if part.startswith("*") and part.endswith("*"):
+        return part[1:-1], False, True, False
+    if part.startswith("`") and part.endswith("`"):
+        return part[1:-1], False, False, True
+    return part, False, False, False
+
+
+_W_VAL = qn("w:val")
+_XML_SPACE = qn("xml:space")
+_R_ID = qn("r:id")
+_JC = {"left": "left", "center": "center", "right": "right", "justify": "both"}
+
+
+def _el(tag: str, val: Optional[str] = None):
+    return OxmlElement(tag, {_W_VAL: val}) if val is not None else OxmlElement(tag)
+
+
+class DocxRenderer:
+    """Vuelca nodos del AST en un Document.
+
+    Los elementos w:p / w:r se arman directamente en el orden del esquema (lo mismo que
+    produce python-docx) y se insertan en su lugar (antes de w:sectPr), sin las búsquedas por hijo que
+    hace python-docx en cada párrafo. Estilos, numeraciones y enlaces se resuelven una vez.
+    """
+
+    def __init__(self, doc, *, justify: bool = False, before=None):
+        self.doc = doc
+        self.justify = justify
+        self._body = doc.element.body
+        # Los bloques se insertan antes de `before` (un elemento del cuerpo) o, por defecto, al final
+        self._anchor = before if before is not None else self._body.sectPr
+        self._style_ids: Dict[str, Optional[str]] = {}
+        self._abstract_nums: Dict[str, Optional[str]] = {}
+        self._numbering = None
+        self._next_num_id = 1
+        self._links: Dict[str, str] = {}
+        self._rels = doc.part.rels
+        self._next_rid = 1 + max([int(k[3:]) for k in self._rels if k.startswith("rId") and k[3:].isdigit()] or [0])
+
+    # ---------- estilos ----------
+    def _style_id(self, name: str) -> Optional[str]:
+        if name not in self._style_ids:
+            try:
+                self._style_ids[name] = self.doc.styles[name].style_id
+            except KeyError:
+                self._style_ids[name] = None
+        return self._style_ids[name]
+
+    def _restart_numbering(self, style_name: str, start: int) -> Optional[int]:
+        """Nueva instancia de numeración del estilo para que cada lista empiece en `start`."""
+        if style_name not in self._abstract_nums:
+            abstract_id = None
+            try:
+                style = self.doc.styles[style_name].element
+                num_id = style.pPr.numPr.numId.val
+                if self._numbering is None:
+                    self._numbering = self.doc.part.numbering_part.numbering_definitions._numbering
+                    self._next_num_id = 1 + max([n.numId for n in self._numbering.num_lst] or [0])
+                abstract_id = self._numbering.num_having_numId(num_id).abstractNumId.val
+            except (AttributeError, KeyError, NotImplementedError):
+                pass
+            self._abstract_nums[style_name] = abstract_id
+        abstract_id = self._abstract_nums[style_name]
+        if abstract_id is None:
+            return None
+        # Equivale a CT_Numbering.add_num, sin recorrer todos los numId en cada lista
+        num_id, self._next_num_id = self._next_num_id, self._next_num_id + 1
+        num = OxmlElement("w:num", {qn("w:numId"): str(num_id)})
+        num.append(_el("w:abstractNumId", str(abstract_id)))
+        override = OxmlElement("w:lvlOverride", {qn("w:ilvl"): "0"})
+        override.append(_el("w:startOverride", str(start)))
+        num.append(override)
+        self._numbering._insert_num(num)
+        return num_id
+
+    # ---------- párrafos y runs ----------
+    def _paragraph(self, style: Optional[str] = None, align: Optional[str] = None, num_id: Optional[int] = None):
+        p = OxmlElement("w:p")
+        style_id = self._style_id(style) if style else None
+        if style_id or align or num_id is not None:
+            ppr = OxmlElement("w:pPr")
+            if style_id:
+                ppr.append(_el("w:pStyle", style_id))
+            if num_id is not None:
+                num_pr = OxmlElement("w:numPr")
+                num_pr.append(_el("w:ilvl", "0"))
+                num_pr.append(_el("w:numId", str(num_id)))
+                ppr.append(num_pr)
+            if align:
+                ppr.append(_el("w:jc", _JC[align]))
+            p.append(ppr)
+        if self._anchor is not None:
+            self._anchor.addprevious(p)
+        else:
+            self._body.append(p)
+        return p
+
+    @staticmethod
+    def _run(parent, text: str, bold: bool, italic: bool, mono: bool, link: bool = False) -> None:
+        r = OxmlElement("w:r")
+        if bold or italic or mono or link:
+            rpr = OxmlElement("w:rPr")
+            if mono:
+                rpr.append(OxmlElement("w:rFonts", {qn("w:ascii"): "Courier New", qn("w:hAnsi"): "Courier New"}))
+            if bold:
+                rpr.append(OxmlElement("w:b"))
+            if italic:
+                rpr.append(OxmlElement("w:i"))
+            if link:
+                rpr.append(_el("w:color", LINK_COLOR))
+            if mono:
+                rpr.append(_el("w:sz", "20"))
+            if link:
+                rpr.append(_el("w:u", "single"))
+            r.append(rpr)
+        if text:
+            t = OxmlElement("w:t")
+            t.text = text
+            if len(text.strip()) < len(text):
+                t.set(_XML_SPACE, "preserve")
+            r.append(t)
+        parent.append(r)
+
+    def _hyperlink(self, p, url: str):
+        r_id = self._links.get(url)
+        if r_id is None:
+            r_id = f"rId{self._next_rid}"
+            self._next_rid += 1
+            self._rels.add_relationship(RT.HYPERLINK, url, r_id, is_external=True)
+            self._links[url] = r_id
+        link = OxmlElement("w:hyperlink", {_R_ID: r_id})
+        p.append(link)
+        return link
+
+    def inline(self, p, text: str, *, bold: bool = False) -> None:
+        """Aplica **negrita**, *itálica*, `monoespaciado` y [enlaces](url) dentro del párrafo `p` (w:p)."""
+        links: List[Tuple[str, str]] = []
+        if "[" in text:
+            def _slot(m):
+                links.append((m.group(1), m.group(2)))
+                return f"\x00{len(links) - 1}\x00"
+            text = LINK_RE.sub(_slot, text)
+        for part in TOKEN_RE.split(text):
+            if not part:
+                continue
+            body, b, i, m = _classify(part)
+            if not links:
+                self._run(p, body, bold or b, i, m)
+                continue
+            for k, piece in enumerate(LINK_SLOT_RE.split(body)):
+                if k % 2:
+                    label, url = links[int(piece)]
+                    link = self._hyperlink(p, url)
+                    for sub in TOKEN_RE.split(label):
+                        if sub:
+                            lt, lb, li, lm = _classify(sub)
+                            self._run(link, lt, bold or b or lb, i or li, m or lm, link=True)
+                elif piece:
+                    self._run(p, piece, bold or b, i, m)
+
+    # ---------- bloques ----------
+    def render(self, nodes: List[tuple]) -> None:
+        for node in nodes:
+            kind = type(node)
+            if kind is Para:
+                self.inline(self._paragraph(align=node.align or ("justify" if self.justify else None)), node.text)
+            elif kind is Heading:
+                self.inline(self._paragraph(f"Heading {node.level}", node.align), node.text)
+            elif kind is ListBlock:
+                self._render_list(node, 1)
+            elif kind is Table:
+                self._render_table(node)
+            elif kind is Rule:
+                r = OxmlElement("w:r")
+                r.append(OxmlElement("w:br"))
+                self._paragraph().append(r)
+
+    def _render_list(self, block: ListBlock, level: int) -> None:
+        base = "List Number" if block.ordered else "List Bullet"
+        style = base if level == 1 else f"{base} {level}"
+        num_id = self._restart_numbering(style, block.start) if block.ordered else None
+        align = "justify" if self.justify else None
+        for item in block.items:
+            self.inline(self._paragraph(style, align, num_id), item.text)
+            for child in item.children:
+                self._render_list(child, min(level + 1, MAX_LIST_LEVEL))
+
+    def _render_table(self, table: Table) -> None:
+        ncols = max([len(table.header)] + [len(r) for r in table.rows])
+        t = self.doc.add_table(rows=1 + len(table.rows), cols=ncols)
+        if self._anchor is not None:
+            self._anchor.addprevious(t._tbl)
+        if self._style_id("Table Grid"):
+            t.style = self.doc.styles["Table Grid"]
+        for r, cells in enumerate([table.header] + table.rows):
+            row_cells = t.rows[r].cells
+            for c in range(ncols):
+                p = row_cells[c].paragraphs[0]
+                align = table.aligns[c] if c < len(table.aligns) else None
+                if align:
+                    p.alignment = ALIGNMENTS[align]
+                if c < len(cells) and cells[c]:
+                    self.inline(p._p, cells[c], bold=(r == 0))
+
+
+def render_markdown(doc, text: str, *, justify: bool = False, before=None) -> None:
+    """Agrega `text` (Markdown) al final de `doc`, o antes del elemento `before` si se indica.
+    `justify=True` justifica párrafos y listas.
+    """
+    DocxRenderer(doc, justify=justify, before=before).render(parse_markdown(text))
@@ -0,0 +1,425 @@
+
+# metrics.py
+# ============================================================
+# Métricas en formato de exposición de Prometheus (GET /metrics):
+# - Contadores, histogramas y gauges en memoria por proceso (registro sin dependencias)
+# - Agregación entre workers de gunicorn: cada proceso vuelca sus acumulados a un SQLite
+#   compartido (una fila por proceso y serie) y /metrics suma todas las filas
+# - Los contadores e histogramas de workers ya terminados siguen sumando (son monotónicos);
+#   los gauges solo cuentan de procesos que volcaron hace poco
+# - Un worker muerto se funde en la fila agregada "retired" (sin sus gauges) y se borran sus
+#   filas: las tablas no crecen con cada reinicio de gunicorn
+# - Los valores que solo se conocen al consultar (sesiones por paso, trabajos en cola) se
+#   calculan en el momento del scrape
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KiB .. 256 MiB
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        self.registry._add(self.name, self._key(labels), "value", amount)
+
+
+class Gauge(_Family):
+    """Gauge por proceso; al agregar se suman los procesos vivos."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.registry._set(self.name, self._key(labels), "value", value)
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels, buckets: Sequence[float]):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # Se guarda el bucket exacto (no acumulado); el acumulado se arma al exponer
+        i = bisect_left(self.buckets, value)
+        le = _fmt(self.buckets[i]) if i < len(self.buckets) else "+Inf"
+        self.registry._observe(self.name, key, le, value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+
+class Registry:
+    """Series de este proceso y volcado al almacén compartido."""
+
+    def __init__(self):
+        self.families: Dict[str, _Family] = {}
+        self._values: Dict[Tuple[str, LabelValues, str], float] = {}
+        self._dirty: set = set()
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.proc = uuid.uuid4().hex
+
+    # ---------- Declaración ----------
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._declare(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._declare(Gauge(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._declare(Histogram(self, name, help, labels, buckets))
+
+    def _declare(self, family):
+        self.families[family.name] = family
+        return family
+
+    def add_collector(self, fn: Callable[[], None]) -> None:
+        """Función que actualiza gauges justo antes de cada volcado (p. ej. stats() de una caché)."""
+        self._collectors.append(fn)
+
+    # ---------- Escritura en memoria ----------
+    def _check_fork(self) -> None:
+        # Tras un fork (gunicorn --preload) el hijo empieza de cero con su propia identidad
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self.proc = uuid.uuid4().hex
+            self._values.clear()
+            self._dirty.clear()
+
+    def _add(self, name: str, key: LabelValues, field: str, amount: float) -> None:
+        with self._lock:
+            self._check_fork()
+            k = (name, key, field)
+            self._values[k] = self._values.get(k, 0.0) + amount
+            self._dirty.add(k)
+
+    def _set(self, name: str, key: LabelValues, field: str, value: float) -> None:
+        with self._lock:
+            self._check_fork()
+            k = (name, key, field)
+            self._values[k] = float(value)
+            self._dirty.add(k)
+
+    def _observe(self, name: str, key: LabelValues, le: str, value: float) -> None:
+        with self._lock:
+            self._check_fork()
+            for field, amount in ((f"le={le}", 1.0), ("sum", value), ("count", 1.0)):
+                k = (name, key, field)
+                self._values[k] = self._values.get(k, 0.0) + amount
+                self._dirty.add(k)
+
+    # ---------- Volcado ----------
+    def flush(self, store: "MetricsStore") -> None:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("Métricas: falló un colector")
+        with self._lock:
+            self._check_fork()
+            rows = [(name, json.dumps(key), field, self._values[(name, key, field)])
+                    for name, key, field in self._dirty]
+            self._dirty.clear()
+            proc = self.proc
+        try:
+            store.write(proc, rows)
+        except sqlite3.Error:
+            # Se reintenta en el siguiente volcado
+            logger.exception("Métricas: no se pudo volcar al almacén compartido")
+            with self._lock:
+                self._dirty.update((name, tuple(json.loads(key)), field) for name, key, field, _ in rows)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    proc    TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    labels  TEXT NOT NULL,
+    field   TEXT NOT NULL,
+    value   REAL NOT NULL,
+    PRIMARY KEY (proc, name, labels, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS procs (
+    proc        TEXT PRIMARY KEY,
+    pid         INTEGER NOT NULL,
+    updated_at  REAL NOT NULL
+);
+"""
+
+
+RETIRED_PROC = "retired"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class MetricsStore:
+    """SQLite compartido por todos los workers: acumulados por proceso."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write(self, proc: str, rows: List[Tuple[str, str, str, float]]) -> None:
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO samples (proc, name, labels, field, value) VALUES (?,?,?,?,?) "
+                "ON CONFLICT (proc, name, labels, field) DO UPDATE SET value=excluded.value",
+                [(proc, *row) for row in rows],
+            )
+            db.execute("INSERT INTO procs (proc, pid, updated_at) VALUES (?,?,?) "
+                       "ON CONFLICT (proc) DO UPDATE SET updated_at=excluded.updated_at",
+                       (proc, os.getpid(), time.time()))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def retire_dead(self, gauges: Iterable[str], *, stale_before: float) -> int:
+        """Funde en RETIRED_PROC los procesos sin volcar desde `stale_before` cuyo pid ya no existe.
+        Contadores e histogramas se suman a la fila agregada; los gauges se descartan."""
+        sql = "SELECT proc, pid FROM procs WHERE updated_at < ? AND proc != ?"
+        db = self._conn()
+        if not any(not _pid_alive(pid) for _, pid in db.execute(sql, (stale_before, RETIRED_PROC))):
+            return 0
+        gauges = list(gauges)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # De nuevo con el bloqueo tomado: otro worker pudo retirarlos primero
+            dead = [proc for proc, pid in db.execute(sql, (stale_before, RETIRED_PROC)).fetchall()
+                    if pid != os.getpid() and not _pid_alive(pid)]
+            if dead:
+                procs = ",".join("?" * len(dead))
+                skip = f" AND name NOT IN ({','.join('?' * len(gauges))})" if gauges else ""
+                db.execute("INSERT OR IGNORE INTO procs (proc, pid, updated_at) VALUES (?, 0, 0)", (RETIRED_PROC,))
+                db.execute(
+                    f"INSERT INTO samples (proc, name, labels, field, value) "
+                    f"SELECT ?, name, labels, field, SUM(value) FROM samples WHERE proc IN ({procs}){skip} "
+                    f"GROUP BY name, labels, field "
+                    f"ON CONFLICT (proc, name, labels, field) DO UPDATE SET value=samples.value + excluded.value",
+                    (RETIRED_PROC, *dead, *gauges),
+                )
+                db.execute(f"DELETE FROM samples WHERE proc IN ({procs})", dead)
+                db.execute(f"DELETE FROM procs WHERE proc IN ({procs})", dead)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        if dead:
+            logger.info("Métricas: %d proceso(s) terminados fundidos en '%s'", len(dead), RETIRED_PROC)
+        return len(dead)
+
+    def totals(self, names: Iterable[str], *, live_since: Optional[float] = None) -> Dict[Tuple[str, str, str], float]:
+        """Suma por (métrica, etiquetas, campo) de todos los procesos (o solo los vivos)."""
+        names = list(names)
+        if not names:
+            return {}
+        sql = (f"SELECT s.name, s.labels, s.field, SUM(s.value) FROM samples s JOIN procs p ON p.proc = s.proc "
+               f"WHERE s.name IN ({','.join('?' * len(names))})")
+        params: List[Any] = list(names)
+        if live_since is not None:
+            sql += " AND p.updated_at >= ?"
+            params.append(live_since)
+        sql += " GROUP BY s.name, s.labels, s.field"
+        return {(n, l, f): v for n, l, f, v in self._conn().execute(sql, params)}
+
+
+class Metrics:
+    """Registro + almacén + hilo de volcado periódico, y el texto de /metrics."""
+
+    def __init__(self, registry: "Registry", store: MetricsStore, *, flush_interval_s: float = 5.0,
+                 retire_after_s: float = 60.0):
+        self.registry = registry
+        self.store = store
+        self.flush_interval_s = flush_interval_s
+        self.retire_after_s = max(retire_after_s, 3 * flush_interval_s)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="metrics-flush", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.flush_interval_s):
+            self.registry.flush(self.store)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.registry.flush(self.store)
+
+    def render(self, extra: Iterable[Tuple[str, str, str, Dict[str, Any], float]] = ()) -> str:
+        """Exposición agregada. `extra`: (nombre, tipo, ayuda, etiquetas, valor) calculados ahora."""
+        self.registry.flush(self.store)
+        families = self.registry.families
+        gauges = [n for n, f in families.items() if f.kind == "gauge"]
+        self.store.retire_dead(gauges, stale_before=time.time() - self.retire_after_s)
+        totals = self.store.totals([n for n in families if n not in gauges])
+        totals.update(self.store.totals(gauges, live_since=time.time() - 3 * self.flush_interval_s))
+
+        by_family: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (name, labels, field), value in totals.items():
+            by_family.setdefault(name, {}).setdefault(labels, {})[field] = value
+
+        out: List[str] = []
+        for name, family in sorted(families.items()):
+            series = by_family.get(name)
+            if not series:
+                continue
+            out.append(f"# HELP {name} {family.help}")
+            out.append(f"# TYPE {name} {family.kind}")
+            for labels_json, fields in sorted(series.items()):
+                pairs = list(zip(family.labels, json.loads(labels_json)))
+                if family.kind == "histogram":
+                    cumulative = 0.0
+                    for le in [_fmt(b) for b in family.buckets] + ["+Inf"]:
+                        cumulative += fields.get(f"le={le}", 0.0)
+                        out.append(f"{name}_bucket{_labels(pairs + [('le', le)])} {_fmt(cumulative)}")
+                    out.append(f"{name}_sum{_labels(pairs)} {_fmt(fields.get('sum', 0.0))}")
+                    out.append(f"{name}_count{_labels(pairs)} {_fmt(fields.get('count', 0.0))}")
+                else:
+                    out.append(f"{name}{_labels(pairs)} {_fmt(fields.get('value', 0.0))}")
+
+        seen = set()
+        for name, kind, help, labels, value in extra:
+            if name not in seen:
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                seen.add(name)
+            out.append(f"{name}{_labels(list(labels.items()))} {_fmt(value)}")
+        return "\n".join(out) + "\n"
+
+
+def _labels(pairs: List[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+# -------------------------- Catálogo de métricas --------------------------
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "idec_http_request_duration_seconds", "Duración de las peticiones HTTP por endpoint.",
+    ("endpoint", "method", "status"))
+PARSE_SECONDS = REGISTRY.histogram(
+    "idec_parse_duration_seconds", "Duración de parse_excel_all_sheets (todas las hojas de un libro).")
+DOCX_SECONDS = REGISTRY.histogram(
+    "idec_docx_render_duration_seconds", "Duración del armado y guardado del .docx (sin las llamadas al LLM).")
+LLM_SECONDS = REGISTRY.histogram(
+    "idec_llm_request_duration_seconds", "Duración de cada petición a Azure OpenAI (una por ronda).",
+    ("site",))
+LLM_TOKENS = REGISTRY.counter(
+    "idec_llm_tokens_total", "Tokens informados por Azure OpenAI (resp.usage) por punto de llamada.",
+    ("site", "kind"))
+LLM_FINISH = REGISTRY.counter(
+    "idec_llm_finish_reason_total", "finish_reason de cada ronda por punto de llamada.", ("site", "reason"))
+LLM_CONTINUATIONS = REGISTRY.counter(
+    "idec_llm_continuation_rounds_total", "Rondas de continuación pedidas tras un corte por longitud.", ("site",))
+LLM_ERRORS = REGISTRY.counter(
+    "idec_llm_errors_total", "Errores en llamadas a Azure OpenAI por tipo.", ("site", "error"))
+LLM_CACHE_HITS = REGISTRY.counter(
+    "idec_llm_cache_hits_total", "Respuestas servidas desde la caché sin llamar al modelo.", ("site",))
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "idec_llm_queue_wait_seconds", "Espera en la cola de admisión antes de llamar a Azure OpenAI.", ("outcome",))
+LLM_REJECTED = REGISTRY.counter(
+    "idec_llm_rejected_total", "Llamadas rechazadas por el control de admisión.", ("reason",))
+LLM_THROTTLED = REGISTRY.counter(
+    "idec_llm_throttled_total", "Respuestas 429 de Azure OpenAI (reintentadas o agotadas).", ("outcome",))
+UPLOAD_BYTES = REGISTRY.histogram(
+    "idec_upload_size_bytes", "Tamaño de las plantillas subidas.", buckets=BYTES_BUCKETS)
+WORKBOOK_SHEETS = REGISTRY.histogram(
+    "idec_workbook_sheets", "Hojas por libro parseado.", buckets=COUNT_BUCKETS)
+COMPONENT_STAT = REGISTRY.gauge(
+    "idec_component_stat", "Estadísticas internas por componente (cachés, pool HTTP, presupuesto de prompts).",
+    ("component", "stat"))
+
+
+def register_stats(component: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """Publica los valores numéricos de un stats() como idec_component_stat{component, stat}.
+
+    Los gauges se suman entre workers, así que se omiten las razones y promedios
+    (hit_rate, *_avg_*): se derivan en la consulta a partir de los contadores.
+    """
+    def collect() -> None:
+        for stat, value in stats().items():
+            if isinstance(value, (int, float)) and "rate" not in stat and "avg" not in stat:
+                COMPONENT_STAT.set(float(value), component=component, stat=stat)
+    REGISTRY.add_collector(collect)
+
+
+def metrics_from_env(data_dir: str) -> Metrics:
+    return Metrics(REGISTRY, MetricsStore(os.path.join(data_dir, "metrics.sqlite3")),
+                   flush_interval_s=float(os.getenv("METRICS_FLUSH_INTERVAL", "5")))
@@ -0,0 +1,165 @@
+
+# prompt_budget.py
+# ============================================================
+# Presupuesto de tokens para los prompts del documento:
+# - Conteo local de tokens: tiktoken si está instalado (pip install tiktoken), si no una
+#   estimación por palabras y signos calibrada para español
+# - El prompt se arma por partes con prioridad; cada parte ofrece variantes de más
+#   completa a más compacta (p. ej. outline completo -> sin hojas -> solo raíces)
+# - Si el total supera el presupuesto se compacta primero la parte de menor prioridad
+#   (y, a igual prioridad, la más grande); como último recurso se recortan líneas
+# - Cada prompt deja en el log su desglose de tokens por parte y lo que se compactó
+# ============================================================
+
+from __future__ import annotations
+import os
+import re
+import math
+import logging
+import threading
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # opcional: pip install tiktoken
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TRUNCATED_MARK = "(… {n} líneas omitidas por longitud)"
+
+# Palabras (un token por cada ~4 letras) o signos sueltos (un token cada uno)
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def _load_encoding():
+    if tiktoken is None:
+        return None
+    name = os.getenv("PROMPT_TOKENIZER", "o200k_base")
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # Sin red tiktoken no puede descargar la tabla de la codificación la primera vez
+        logger.warning("Tokenizador '%s' no disponible (%s); se estiman los tokens", name, e)
+        return None
+
+
+_encoding = _load_encoding()
+TOKENIZER = _encoding.name if _encoding is not None else "estimado"
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(m) / 4) if m[0].isalnum() or m[0] == "_" else 1 for m in _TOKEN_RE.findall(text))
+
+
+def truncate_lines(text: str, max_tokens: int) -> str:
+    """Conserva líneas completas desde el inicio hasta `max_tokens` y deja constancia de lo omitido."""
+    lines = text.split("\n")
+    kept, used = [], count_tokens(TRUNCATED_MARK)
+    for line in lines:
+        n = count_tokens(line)
+        if used + n > max_tokens:
+            break
+        kept.append(line)
+        used += n
+    omitted = len(lines) - len(kept)
+    if omitted:
+        kept.append(TRUNCATED_MARK.format(n=omitted))
+    return "\n".join(kept)
+
+
+class PromptPart(NamedTuple):
+    """Parte del prompt: variantes (etiqueta, render) de más completa a más compacta.
+
+    Las partes con `truncatable=False` (instrucciones) nunca se recortan.
+    """
+    name: str
+    priority: int
+    variants: Sequence[Tuple[str, Callable[[], str]]]
+    truncatable: bool = True
+
+
+class FittedPrompt(NamedTuple):
+    texts: Dict[str, str]
+    tokens: Dict[str, int]
+    total: int
+    budget: int
+    steps: List[str]  # compactaciones aplicadas, en orden: "causas: sin hojas", "datos: recortado"
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{name}={n}" for name, n in self.tokens.items())
+
+
+class PromptBudget:
+    """Ajusta un conjunto de partes a un presupuesto de tokens y lleva estadísticas."""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._stats = {"prompts": 0, "compacted": 0, "truncated": 0, "tokens_total": 0, "tokens_max": 0}
+
+    def fit(self, parts: Sequence[PromptPart], *, label: str = "prompt") -> FittedPrompt:
+        level = {p.name: 0 for p in parts}
+        texts = {p.name: p.variants[0][1]() for p in parts}
+        tokens = {name: count_tokens(text) for name, text in texts.items()}
+        steps: List[str] = []
+
+        # 1) Variantes más compactas, empezando por la menor prioridad y la más grande
+        while sum(tokens.values()) > self.budget:
+            candidates = [p for p in parts if level[p.name] + 1 < len(p.variants)]
+            if not candidates:
+                break
+            part = min(candidates, key=lambda p: (p.priority, -tokens[p.name]))
+            level[part.name] += 1
+            variant_label, render = part.variants[level[part.name]]
+            texts[part.name] = render()
+            tokens[part.name] = count_tokens(texts[part.name])
+            steps.append(f"{part.name}: {variant_label}")
+
+        # 2) Último recurso: recortar líneas, de menor a mayor prioridad; a igual prioridad el
+        #    espacio que queda se reparte en partes iguales (lo que una no usa pasa a las demás)
+        truncated = False
+        for priority in sorted({p.priority for p in parts if p.truncatable}):
+            excess = sum(tokens.values()) - self.budget
+            if excess <= 0:
+                break
+            group = sorted((p for p in parts if p.truncatable and p.priority == priority), key=lambda p: tokens[p.name])
+            remaining = max(0, sum(tokens[p.name] for p in group) - excess)
+            for i, part in enumerate(group):
+                keep = min(tokens[part.name], remaining // (len(group) - i))
+                remaining -= keep
+                if keep < tokens[part.name]:
+                    texts[part.name] = truncate_lines(texts[part.name], keep)
+                    tokens[part.name] = count_tokens(texts[part.name])
+                    steps.append(f"{part.name}: recortado")
+                    truncated = True
+
+        fitted = FittedPrompt(texts, tokens, sum(tokens.values()), self.budget, steps)
+        self._record(fitted, truncated)
+        logger.info("Tokens de %s: %d/%d [%s] (%s)%s", label, fitted.total, self.budget, fitted.breakdown(),
+                    TOKENIZER, f"; compactado: {'; '.join(steps)}" if steps else "")
+        if fitted.total > self.budget:
+            logger.warning("El %s sigue excediendo el presupuesto (%d > %d tokens)", label, fitted.total, self.budget)
+        return fitted
+
+    def _record(self, fitted: FittedPrompt, truncated: bool) -> None:
+        with self._lock:
+            self._stats["prompts"] += 1
+            self._stats["compacted"] += bool(fitted.steps)
+            self._stats["truncated"] += truncated
+            self._stats["tokens_total"] += fitted.total
+            self._stats["tokens_max"] = max(self._stats["tokens_max"], fitted.total)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            out = dict(self._stats)
+        out.update(budget=self.budget, tokenizer=TOKENIZER)
+        return out
+
+
+def budget_from_env(default: int = 12000) -> PromptBudget:
+    return PromptBudget(int(os.getenv("DOC_PROMPT_BUDGET", str(default))))
@@ -0,0 +1,385 @@
+
+# retention.py
+# ============================================================
+# Retención de archivos generados (documentos, plantillas subidas y sus JSON):
+# - Cuota por antigüedad: se borra lo que no se usa hace más de max_age_s
+# - Cuota por tamaño: si el total supera max_bytes se desaloja por LRU
+#   (última descarga/uso registrada en SQLite; si no hay, la fecha de modificación)
+# - Nunca se borra un archivo referenciado por una sesión viva ni uno recién creado
+# - Seguro entre workers: un archivo de bloqueo garantiza una sola pasada a la vez y
+#   cada borrado es un renombrado atómico a *.trash antes del unlink (si el archivo se
+#   reutilizó entre la decisión y el borrado, se restaura)
+# - Modo simulación (dry-run): informe de qué se borraría sin tocar nada
+#
+# Uso: python retention.py [--dry-run] [--max-age 604800] [--max-bytes 1073741824]
+# ============================================================
+
+from __future__ import annotations
+import os
+import time
+import random
+import sqlite3
+import fnmatch
+import logging
+import threading
+from typing import Callable, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRASH_SUFFIX = ".trash"
+
+
+class Artifact(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    last_used: float
+
+
+class Removal(NamedTuple):
+    path: str
+    size: int
+    last_used: float
+    reason: str  # 'edad' | 'cuota' | 'temporal'
+
+
+class RetentionReport(NamedTuple):
+    dry_run: bool
+    scanned: int
+    total_bytes: int
+    removals: List[Removal]
+    protected: int
+    references_known: bool
+    over_quota_bytes: int
+
+    @property
+    def freed_bytes(self) -> int:
+        return sum(r.size for r in self.removals)
+
+    def summary(self) -> str:
+        verb = "se borrarían" if self.dry_run else "borrados"
+        return (f"Retención: {self.scanned} archivo(s), {self.total_bytes / 1024 / 1024:.1f} MiB; "
+                f"{verb} {len(self.removals)} ({self.freed_bytes / 1024 / 1024:.1f} MiB); "
+                f"protegidos {self.protected}"
+                + ("" if self.references_known else " (sin referencias de sesión: gracia ampliada)")
+                + (f"; sobre la cuota {self.over_quota_bytes / 1024 / 1024:.1f} MiB" if self.over_quota_bytes else ""))
+
+
+class _FileLock:
+    """Bloqueo entre procesos con O_CREAT|O_EXCL; un bloqueo más viejo que stale_s se considera abandonado."""
+
+    def __init__(self, path: str, stale_s: float):
+        self.path = path
+        self.stale_s = stale_s
+
+    def acquire(self) -> bool:
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) < self.stale_s:
+                        return False
+                    os.remove(self.path)
+                    logger.warning("Retención: bloqueo abandonado eliminado (%s)", self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{os.getpid()} {time.time():.0f}\n")
+            return True
+        return False
+
+    def release(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ArtifactRetention:
+    """Política de retención sobre varias carpetas, cada una con sus patrones de archivos gestionados."""
+
+    def __init__(
+        self,
+        folders: Sequence[Tuple[str, Sequence[str]]],
+        *,
+        state_dir: str,
+        max_age_s: float = 7 * 24 * 3600,
+        max_bytes: int = 1024 * 1024 * 1024,
+        min_age_s: float = 3600,
+        referenced: Optional[Callable[[], Optional[Set[str]]]] = None,
+        unknown_refs_grace_s: float = 2 * 3600,
+        lock_stale_s: float = 30 * 60,
+    ):
+        os.makedirs(state_dir, exist_ok=True)
+        self.folders = [(folder, tuple(patterns)) for folder, patterns in folders]
+        self.db_path = os.path.join(state_dir, "retention.sqlite3")
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.min_age_s = min_age_s
+        self.referenced = referenced
+        self.unknown_refs_grace_s = unknown_refs_grace_s
+        self._lock = _FileLock(os.path.join(state_dir, "retention.lock"), lock_stale_s)
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS last_used (path TEXT PRIMARY KEY, used_at REAL NOT NULL)"
+        )
+
+    # ---------- SQLite ----------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- API ----------
+    def record_use(self, path: str) -> None:
+        """Marca una descarga/uso: el archivo pasa al final de la cola LRU."""
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO last_used (path, used_at) VALUES (?,?)", (os.path.abspath(path), time.time())
+            )
+        except sqlite3.Error:
+            logger.exception("Retención: no se pudo registrar el uso de %s", path)
+
+    def run(self, *, dry_run: bool = False) -> Optional[RetentionReport]:
+        """Una pasada completa; None si otro worker tiene el bloqueo."""
+        if not self._lock.acquire():
+            return None
+        try:
+            report = self._plan(dry_run)
+            if not dry_run:
+                done = [r for r in report.removals if self._remove(r)]
+                self._forget([r.path for r in done])
+                report = report._replace(removals=done)
+            return report
+        finally:
+            self._lock.release()
+
+    def start(self, interval_s: float, *, first_delay_s: float = 60) -> None:
+        """Hilo de fondo: una pasada cada interval_s (±10 %) en cada worker; el bloqueo evita solaparse."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            delay = first_delay_s
+            while not self._stop.wait(delay):
+                try:
+                    report = self.run()
+                    if report is not None and (report.removals or report.over_quota_bytes):
+                        logger.info(report.summary())
+                except Exception:
+                    logger.exception("Retención: error en la pasada")
+                delay = interval_s * random.uniform(0.9, 1.1)
+
+        self._thread = threading.Thread(target=loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ---------- Plan ----------
+    def _scan(self, dry_run: bool) -> Tuple[List[Artifact], List[Artifact]]:
+        """(gestionados, temporales huérfanos); los *.trash de pasadas interrumpidas se borran aquí."""
+        used = dict(self._conn().execute("SELECT path, used_at FROM last_used").fetchall())
+        managed, temps = [], []
+        for folder, patterns in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                name = entry.name
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if name.endswith(TRASH_SUFFIX):
+                        if not dry_run:
+                            os.remove(entry.path)  # Con el bloqueo tomado, ningún otro worker está borrando
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                path = os.path.abspath(entry.path)
+                art = Artifact(path, st.st_size, st.st_mtime, max(st.st_mtime, used.get(path, 0.0)))
+                if name.endswith(".tmp"):
+                    temps.append(art)
+                elif any(fnmatch.fnmatch(name, p) for p in patterns):
+                    managed.append(art)
+        return managed, temps
+
+    def _references(self) -> Optional[Set[str]]:
+        if self.referenced is None:
+            return None
+        try:
+            return self.referenced()
+        except Exception:
+            logger.exception("Retención: no se pudieron leer las referencias de sesión")
+            return None
+
+    def _plan(self, dry_run: bool) -> RetentionReport:
+        now = time.time()
+        managed, temps = self._scan(dry_run)
+        refs = self._references()
+        grace = self.min_age_s if refs is not None else max(self.min_age_s, self.unknown_refs_grace_s)
+
+        removals = [Removal(a.path, a.size, a.last_used, "temporal")
+                    for a in temps if now - a.mtime > self.min_age_s]
+
+        protected, candidates = 0, []
+        for art in managed:
+            if now - art.last_used < grace or (refs is not None and os.path.basename(art.path) in refs):
+                protected += 1
+            else:
+                candidates.append(art)
+
+        # LRU: el menos usado primero; primero la cuota por antigüedad, luego la de tamaño
+        candidates.sort(key=lambda a: a.last_used)
+        total = sum(a.size for a in managed)
+        remaining = total
+        for art in candidates:
+            if now - art.last_used > self.max_age_s:
+                reason = "edad"
+            elif remaining > self.max_bytes:
+                reason = "cuota"
+            else:
+                continue
+            removals.append(Removal(art.path, art.size, art.last_used, reason))
+            remaining -= art.size
+
+        return RetentionReport(
+            dry_run=dry_run,
+            scanned=len(managed) + len(temps),
+            total_bytes=total,
+            removals=removals,
+            protected=protected,
+            references_known=refs is not None,
+            over_quota_bytes=max(0, remaining - self.max_bytes),
+        )
+
+    # ---------- Borrado ----------
+    def _remove(self, removal: Removal) -> bool:
+        """Renombrado atómico y luego unlink; si el archivo se volvió a usar entre medias, se restaura."""
+        trash = f"{removal.path}.{os.getpid()}{TRASH_SUFFIX}"
+        try:
+            os.rename(removal.path, trash)
+        except FileNotFoundError:
+            return False
+        try:
+            # Una subida que reutiliza el archivo le hace utime() antes de usarlo: si ocurrió
+            # antes del renombrado, aquí se ve; si ocurre después, la subida lo reescribe.
+            if os.path.getmtime(trash) > removal.last_used:
+                os.replace(trash, removal.path)
+                return False
+            os.remove(trash)
+            return True
+        except OSError:
+            logger.exception("Retención: no se pudo borrar %s", removal.path)
+            return False
+
+    def _forget(self, paths: Iterable[str]) -> None:
+        self._conn().executemany("DELETE FROM last_used WHERE path=?", [(p,) for p in paths])
+
+
+def referenced_artifacts(session_interface, job_queue) -> Optional[Set[str]]:
+    """Nombres de archivo que alguna sesión viva (o trabajo pendiente) todavía usa.
+
+    None si las sesiones viven en la cookie y no se pueden enumerar.
+    """
+    if session_interface is None:
+        return None
+    names: Set[str] = set()
+
+    def add_responses(responses) -> None:
+        if not isinstance(responses, dict):
+            return
+        for key in ("upload_plantilla", "upload_causa", "upload_objetivo"):
+            if responses.get(key):
+                base = os.path.splitext(os.path.basename(responses[key]))[0]
+                names.update((f"{base}.xlsx", f"{base}.tree", f"{base}.json"))
+
+    for key, value in session_interface.live_values(
+        ("responses", "document_job_id", "plantilla_json_path", "causas_json_path", "objetivos_json_path")
+    ):
+        if key == "responses":
+            add_responses(value)
+        elif key == "document_job_id":
+            job = job_queue.get(value) if value else None
+            if job and job.get("result"):
+                names.add(os.path.basename(job["result"].get("filename") or ""))
+        elif value:
+            stem = os.path.splitext(os.path.basename(value))[0]
+            names.update((f"{stem}.tree", f"{stem}.json"))
+    for payload in job_queue.pending_payloads():
+        add_responses(payload.get("responses"))
+    names.discard("")
+    return names
+
+
+def retention_from_env(
+    documents_dir: str, formularios_dir: str, formularios_json_dir: str, data_dir: str,
+    *, referenced=None, session_ttl_s: float = 2 * 3600,
+) -> ArtifactRetention:
+    """Solo se gestionan los archivos generados; el manual u otros archivos de esas carpetas no se tocan."""
+    return ArtifactRetention(
+        [
+            (documents_dir, ("proyecto_inversion_*.docx",)),
+            (formularios_dir, ("plantilla-*.xlsx",)),
+            (formularios_json_dir, ("plantilla-*.tree", "plantilla-*.json")),
+        ],
+        state_dir=data_dir,
+        max_age_s=float(os.getenv("RETENTION_MAX_AGE", str(7 * 24 * 3600))),
+        max_bytes=int(os.getenv("RETENTION_MAX_BYTES", str(1024 * 1024 * 1024))),
+        min_age_s=float(os.getenv("RETENTION_MIN_AGE", "3600")),
+        referenced=referenced,
+        unknown_refs_grace_s=session_ttl_s,
+    )
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+    from jobs import JobQueue
+    from session_store import make_session_interface
+
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Pasada de retención de documentos y plantillas subidas.")
+    ap.add_argument("--dry-run", action="store_true", help="Solo informar qué se borraría")
+    ap.add_argument("--max-age", type=float, help="Segundos sin uso tras los que se borra (RETENTION_MAX_AGE)")
+    ap.add_argument("--max-bytes", type=int, help="Tope total en bytes (RETENTION_MAX_BYTES)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.getenv("APP_DATA_DIR", os.path.join(base_dir, "data"))
+    session_ttl = float(os.getenv("SESSION_IDLE_TTL", str(2 * 3600)))
+    sessions = make_session_interface(os.getenv("SESSION_BACKEND", "sqlite"), data_dir, idle_ttl=session_ttl)
+    jobs = JobQueue(os.path.join(data_dir, "jobs.sqlite3"), max_workers=1)
+    static = os.path.join(base_dir, "static")
+    retention = retention_from_env(
+        os.path.join(static, "documents"), os.path.join(static, "formularios"),
+        os.path.join(static, "formularios_json"), data_dir,
+        referenced=lambda: referenced_artifacts(sessions, jobs), session_ttl_s=session_ttl,
+    )
+    if args.max_age is not None:
+        retention.max_age_s = args.max_age
+    if args.max_bytes is not None:
+        retention.max_bytes = args.max_bytes
+
+    report = retention.run(dry_run=args.dry_run)
+    if report is None:
+        print("Otra pasada de retención está en curso; inténtalo más tarde.")
+        return
+    for r in report.removals:
+        age_h = (time.time() - r.last_used) / 3600
+        print(f"{r.reason:8} {r.size:>10} B  sin uso {age_h:7.1f} h  {os.path.relpath(r.path, base_dir)}")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
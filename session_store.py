@@ -0,0 +1,325 @@
+
+# session_store.py
+# ============================================================
+# Sesiones del lado del servidor:
+# - La cookie solo lleva un id opaco firmado; los datos viven en el servidor
+# - Backends intercambiables: SQLite (escritura incremental por clave) o archivos JSON
+# - Expiración automática de sesiones inactivas
+# - Sin sesión para /static y última actividad registrada como mucho cada fracción del TTL
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import time
+import random
+import secrets
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSideSession(dict, SessionMixin):
+    """dict que recuerda qué claves cambiaron para escribir solo esas."""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, *, sid: str, new: bool = False,
+                 accessed_at: float = 0.0):
+        super().__init__(data or {})
+        self.sid = sid
+        self.new = new
+        self.accessed_at = accessed_at
+        self.modified = False
+        self.cleared = False
+        self.dirty: Set[str] = set()
+        self.deleted: Set[str] = set()
+
+    def _touch(self, key: str) -> None:
+        self.modified = True
+        self.dirty.add(key)
+        self.deleted.discard(key)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._touch(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.modified = True
+        self.dirty.discard(key)
+        self.deleted.add(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return super().__getitem__(key)
+
+    def pop(self, key, *args):
+        present = key in self
+        value = super().pop(key, *args)
+        if present:
+            self.modified = True
+            self.dirty.discard(key)
+            self.deleted.add(key)
+        return value
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self.modified = True
+        self.cleared = True
+        self.dirty.clear()
+        self.deleted.clear()
+
+
+# -------------------------- Backends --------------------------
+class SQLiteSessionStore:
+    """Una fila por (sesión, clave): cada request reescribe solo las claves que cambió."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript(
+            "CREATE TABLE IF NOT EXISTS session_meta (sid TEXT PRIMARY KEY, accessed_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS session_meta_accessed ON session_meta(accessed_at);"
+            "CREATE TABLE IF NOT EXISTS session_data ("
+            " sid TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (sid, key));"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid: str, idle_ttl: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(datos, última actividad) o None si no existe o expiró."""
+        db = self._conn()
+        row = db.execute("SELECT accessed_at FROM session_meta WHERE sid=?", (sid,)).fetchone()
+        if row is None or time.time() - row[0] > idle_ttl:
+            return None
+        data = {k: json.loads(v) for k, v in db.execute("SELECT key, value FROM session_data WHERE sid=?", (sid,))}
+        return data, row[0]
+
+    def save(self, sid: str, items: Dict[str, Any], deleted: Iterable[str], *, cleared: bool) -> None:
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if cleared:
+                db.execute("DELETE FROM session_data WHERE sid=?", (sid,))
+            else:
+                db.executemany("DELETE FROM session_data WHERE sid=? AND key=?", [(sid, k) for k in deleted])
+            db.executemany(
+                "INSERT OR REPLACE INTO session_data (sid, key, value) VALUES (?,?,?)",
+                [(sid, k, json.dumps(v, ensure_ascii=False)) for k, v in items.items()],
+            )
+            db.execute("INSERT OR REPLACE INTO session_meta (sid, accessed_at) VALUES (?,?)", (sid, time.time()))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def touch(self, sid: str) -> None:
+        self._conn().execute("UPDATE session_meta SET accessed_at=? WHERE sid=?", (time.time(), sid))
+
+    def delete(self, sid: str) -> None:
+        db = self._conn()
+        db.execute("DELETE FROM session_data WHERE sid=?", (sid,))
+        db.execute("DELETE FROM session_meta WHERE sid=?", (sid,))
+
+    def live_values(self, keys: Iterable[str], idle_ttl: float) -> Iterator[Tuple[str, Any]]:
+        """(clave, valor) de las claves pedidas en todas las sesiones no expiradas."""
+        keys = list(keys)
+        if not keys:
+            return
+        rows = self._conn().execute(
+            "SELECT d.key, d.value FROM session_data d JOIN session_meta m ON m.sid = d.sid"
+            f" WHERE m.accessed_at >= ? AND d.key IN ({','.join('?' * len(keys))})",
+            (time.time() - idle_ttl, *keys),
+        ).fetchall()
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def purge(self, idle_ttl: float) -> int:
+        db = self._conn()
+        cutoff = time.time() - idle_ttl
+        db.execute("DELETE FROM session_data WHERE sid IN (SELECT sid FROM session_meta WHERE accessed_at < ?)", (cutoff,))
+        return db.execute("DELETE FROM session_meta WHERE accessed_at < ?", (cutoff,)).rowcount
+
+
+class FileSessionStore:
+    """Un archivo JSON por sesión; la fecha de modificación marca la última actividad."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _path(self, sid: str) -> str:
+        return os.path.join(self.directory, f"{sid}.json")
+
+    def load(self, sid: str, idle_ttl: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        path = self._path(sid)
+        try:
+            accessed_at = os.path.getmtime(path)
+            if time.time() - accessed_at > idle_ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f), accessed_at
+        except (OSError, ValueError):
+            return None
+
+    def save(self, sid: str, items: Dict[str, Any], deleted: Iterable[str], *, cleared: bool) -> None:
+        loaded = None if cleared else self.load(sid, float("inf"))
+        data = loaded[0] if loaded else {}
+        for k in deleted:
+            data.pop(k, None)
+        data.update(items)
+        path = self._path(sid)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def touch(self, sid: str) -> None:
+        try:
+            os.utime(self._path(sid))
+        except OSError:
+            pass
+
+    def delete(self, sid: str) -> None:
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def live_values(self, keys: Iterable[str], idle_ttl: float) -> Iterator[Tuple[str, Any]]:
+        keys = set(keys)
+        cutoff = time.time() - idle_ttl
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key in keys & data.keys():
+                yield key, data[key]
+
+    def purge(self, idle_ttl: float) -> int:
+        cutoff, n = time.time() - idle_ttl, 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+                    os.remove(path); n += 1
+            except OSError:
+                pass
+        return n
+
+
+# -------------------------- Interfaz Flask --------------------------
+class ServerSideSessionInterface(SessionInterface):
+    """Reemplaza la cookie firmada de Flask: la cookie guarda solo un id opaco.
+
+    Una sesión sin cambios solo renueva su última actividad si la registrada tiene más de
+    `touch_fraction * idle_ttl` (una sesión puede expirar hasta esa fracción antes). Las
+    peticiones a /static no abren sesión: ni lectura ni escritura en el almacén.
+    """
+
+    def __init__(self, store, *, idle_ttl: float = 2 * 3600, purge_probability: float = 0.01,
+                 touch_fraction: float = 0.1):
+        self.store = store
+        self.idle_ttl = idle_ttl
+        self.purge_probability = purge_probability
+        self.touch_interval = idle_ttl * touch_fraction
+
+    def live_values(self, keys: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+        return self.store.live_values(keys, self.idle_ttl)
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt="server-side-session")
+
+    def open_session(self, app, request):
+        if app.static_url_path and request.path.startswith(app.static_url_path + "/"):
+            return None  # Flask usa una sesión nula y no llama a save_session
+        raw = request.cookies.get(self.get_cookie_name(app))
+        if raw:
+            try:
+                sid = self._signer(app).unsign(raw).decode("ascii")
+                loaded = self.store.load(sid, self.idle_ttl)
+                if loaded is not None:
+                    data, accessed_at = loaded
+                    return ServerSideSession(data, sid=sid, accessed_at=accessed_at)
+            except BadSignature:
+                pass
+            except Exception:
+                logger.exception("No se pudo cargar la sesión")
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if random.random() < self.purge_probability:
+            try:
+                self.store.purge(self.idle_ttl)
+            except Exception:
+                logger.exception("No se pudieron purgar las sesiones expiradas")
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            self.store.save(
+                session.sid,
+                {k: session[k] for k in session.dirty},
+                session.deleted,
+                cleared=session.cleared or session.new,
+            )
+        elif time.time() - session.accessed_at >= self.touch_interval:
+            self.store.touch(session.sid)
+
+        if session.new or session.modified:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("ascii"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def make_session_interface(backend: str, data_dir: str, *, idle_ttl: float) -> Optional[ServerSideSessionInterface]:
+    """'sqlite' (por defecto), 'file' o 'cookie' (sesión firmada estándar de Flask)."""
+    backend = (backend or "sqlite").lower()
+    if backend == "cookie":
+        return None
+    if backend == "file":
+        store = FileSessionStore(os.path.join(data_dir, "sessions"))
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(os.path.join(data_dir, "sessions.sqlite3"))
+    else:
+        raise ValueError(f"SESSION_BACKEND desconocido: {backend}")
+    return ServerSideSessionInterface(store, idle_ttl=idle_ttl)
@@ -0,0 +1,37 @@
+# tests/conftest.py
+# ============================================================
+# Entorno común de las pruebas:
+# - La raíz del repo en sys.path (los módulos viven en la raíz)
+# - Credenciales de Azure ficticias y APP_DATA_DIR temporal antes de importar app
+# - Fixture `appmod`: la app con documentos y cargas redirigidos a tmp_path
+# ============================================================
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT_NAME", "test")
+os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="appdata-tests-"))
+os.environ.setdefault("RETENTION_ENABLED", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+
+@pytest.fixture
+def appmod(tmp_path, monkeypatch):
+    """Módulo app con las carpetas de salida en tmp_path (static/ queda intacto)."""
+    import app
+
+    for name, sub in (("DOCUMENTS_DIR", "documents"), ("FORMULARIOS_DIR", "formularios"),
+                      ("FORMULARIOS_JSON_DIR", "formularios_json")):
+        path = tmp_path / sub
+        path.mkdir()
+        monkeypatch.setattr(app, name, str(path))
+    app.app.config.update(TESTING=True)
+    return app
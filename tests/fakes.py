@@ -0,0 +1,79 @@
+# tests/fakes.py
+# ============================================================
+# Dobles del cliente de Azure OpenAI para las pruebas:
+# - FakeClient: chat.completions.create con latencia inyectada por llamada
+# - Con stream=True entrega los fragmentos de a uno, con pausa entre ellos
+#   (un fragmento que sea una excepción se lanza en ese punto del stream)
+# - `fail` hace que las llamadas que cumplan la condición lancen un error
+# - Respeta `timeout=` por llamada como httpx: si la latencia lo supera, espera eso y falla
+# ============================================================
+
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _usage(prompt_tokens: int = 10, completion_tokens: int = 20):
+    return types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                 total_tokens=prompt_tokens + completion_tokens)
+
+
+def _chunk(content: Optional[str], finish: Optional[str] = None):
+    choice = types.SimpleNamespace(delta=types.SimpleNamespace(content=content), finish_reason=finish)
+    return types.SimpleNamespace(choices=[choice], usage=None)
+
+
+class FakeCompletions:
+    def __init__(self, *, reply: Callable[[Dict[str, Any]], str], latency: Callable[[Dict[str, Any]], float],
+                 chunks: Optional[List[Any]], chunk_delay: float, fail: Callable[[Dict[str, Any]], bool]):
+        self.reply = reply
+        self.latency = latency
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+        self.fail = fail
+        self.calls: List[Dict[str, Any]] = []
+        self.yielded: List[float] = []  # instante (perf_counter) de cada fragmento entregado
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+        latency, timeout = self.latency(kwargs), kwargs.get("timeout")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("timeout simulado de la petición")
+        time.sleep(latency)
+        if self.fail(kwargs):
+            raise RuntimeError("fallo simulado del modelo")
+        if kwargs.get("stream"):
+            return self._stream(kwargs)
+        message = types.SimpleNamespace(content=self.reply(kwargs))
+        choice = types.SimpleNamespace(message=message, finish_reason="stop")
+        return types.SimpleNamespace(choices=[choice], usage=_usage())
+
+    def _stream(self, kwargs):
+        chunks = self.chunks if self.chunks is not None else [self.reply(kwargs)]
+        for i, text in enumerate(chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            if isinstance(text, BaseException):  # error a mitad del stream
+                raise text
+            self.yielded.append(time.perf_counter())
+            yield _chunk(text)
+        yield _chunk(None, "stop")
+
+
+class FakeClient:
+    """Sustituto de AzureOpenAI con el mismo acceso: client.chat.completions.create(...)."""
+
+    def __init__(self, *, reply: Callable[[Dict[str, Any]], str] = lambda kw: "Texto de prueba.",
+                 latency: Callable[[Dict[str, Any]], float] = lambda kw: 0.0,
+                 chunks: Optional[List[Any]] = None, chunk_delay: float = 0.0,
+                 fail: Callable[[Dict[str, Any]], bool] = lambda kw: False):
+        self.chat = types.SimpleNamespace(completions=FakeCompletions(
+            reply=reply, latency=latency, chunks=chunks, chunk_delay=chunk_delay, fail=fail))
+
+    @property
+    def completions(self) -> FakeCompletions:
+        return self.chat.completions
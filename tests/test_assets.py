@@ -0,0 +1,142 @@
+# tests/test_assets.py
+# ============================================================
+# Manifiesto de descargas (assets.AssetManifest) con tmp_path como carpetas:
+# - Caché: sin cambios en disco no se vuelve a leer nada
+# - Reconstrucción al cambiar el mtime de un archivo o aparecer uno nuevo
+# - ZIP determinista: mismos archivos -> mismos bytes y ETag en cada worker
+# - /download_templates y /download_manual: ETag, 304 y 206
+# ============================================================
+
+import io
+import os
+import zipfile
+
+import pytest
+
+import assets
+from assets import AssetManifest
+
+MTIME = 1_700_000_000
+
+
+def _write(path, data: bytes, mtime: float = MTIME) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def _manifest(tmp_path, templates="plantillas") -> AssetManifest:
+    return AssetManifest(templates_dir=str(tmp_path / templates), manual_dirs=[str(tmp_path / "docs"), str(tmp_path)],
+                         manual_names=["manual_de_uso.pdf", "manual_de_uso.docx"])
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Rutas leídas del disco por el manifiesto."""
+    seen = []
+    original = assets._read
+
+    def counting(path):
+        seen.append(os.path.basename(path))
+        return original(path)
+    monkeypatch.setattr(assets, "_read", counting)
+    return seen
+
+
+def test_single_template_is_cached_until_mtime_changes(tmp_path, reads):
+    path = _write(tmp_path / "plantillas" / "PlantillaCausa.xlsx", b"uno")
+    manifest = _manifest(tmp_path)
+
+    first = manifest.templates()
+    assert (first.data, first.download_name, first.mimetype) == (b"uno", "PlantillaCausa.xlsx", assets.XLSX_MIMETYPE)
+    assert first.last_modified == MTIME
+    assert manifest.templates() is first
+    assert reads == ["PlantillaCausa.xlsx"]
+
+    # Mismo tamaño: solo el mtime delata el cambio
+    _write(path, b"dos", mtime=MTIME + 60)
+    second = manifest.templates()
+    assert second.data == b"dos" and second.etag != first.etag
+    assert second.last_modified == MTIME + 60
+    assert reads == ["PlantillaCausa.xlsx"] * 2
+
+
+def test_new_file_in_subfolder_switches_to_zip(tmp_path):
+    _write(tmp_path / "plantillas" / "PlantillaCausa.xlsx", b"causa")
+    manifest = _manifest(tmp_path)
+    assert manifest.templates().download_name == "PlantillaCausa.xlsx"
+
+    _write(tmp_path / "plantillas" / "otras" / "PlantillaObjetivo.xlsx", b"objetivo")
+    asset = manifest.templates()
+    assert (asset.download_name, asset.mimetype) == ("plantillas_excel.zip", "application/zip")
+    with zipfile.ZipFile(io.BytesIO(asset.data)) as zf:
+        assert zf.namelist() == ["PlantillaCausa.xlsx", "PlantillaObjetivo.xlsx"]
+        assert zf.read("PlantillaObjetivo.xlsx") == b"objetivo"
+
+
+def test_zip_is_deterministic_across_workers(tmp_path):
+    files = {"PlantillaCausa.xlsx": b"causa" * 100, "PlantillaObjetivo.xlsx": b"objetivo" * 100,
+             "PlantillaIDEC-IA.xlsx": b"idec" * 100}
+    # Dos copias creadas en distinto orden (el orden de os.walk no debe influir)
+    for folder, names in (("a", sorted(files)), ("b", sorted(files, reverse=True))):
+        for name in names:
+            _write(tmp_path / folder / name, files[name])
+
+    worker_1 = _manifest(tmp_path, "a").templates()
+    worker_2 = _manifest(tmp_path, "a").templates()
+    copy = _manifest(tmp_path, "b").templates()
+
+    assert worker_1.data == worker_2.data == copy.data
+    assert worker_1.etag == worker_2.etag == copy.etag == assets._etag(worker_1.data)
+    with zipfile.ZipFile(io.BytesIO(worker_1.data)) as zf:
+        assert zf.namelist() == sorted(files)
+        assert all(info.date_time == zf.infolist()[0].date_time for info in zf.infolist())
+
+
+def test_no_templates(tmp_path):
+    assert _manifest(tmp_path, "no-existe").templates() is None
+    (tmp_path / "vacia").mkdir()
+    (tmp_path / "vacia" / "notas.txt").write_text("x")
+    manifest = _manifest(tmp_path, "vacia")
+    assert manifest.templates() is None
+    _write(tmp_path / "vacia" / "PlantillaCausa.xlsx", b"causa")
+    assert manifest.templates().data == b"causa"
+
+
+def test_manual_priority_and_new_file(tmp_path):
+    manifest = _manifest(tmp_path)
+    assert manifest.manual() is None
+
+    _write(tmp_path / "manual_de_uso.docx", b"docx")
+    asset = manifest.manual()
+    assert (asset.data, asset.download_name, asset.mimetype) == (b"docx", "manual_de_uso.docx", assets.DOCX_MIMETYPE)
+
+    # Un manual en una carpeta de mayor prioridad cambia el mtime de esa carpeta
+    _write(tmp_path / "docs" / "manual_de_uso.pdf", b"pdf")
+    asset = manifest.manual()
+    assert (asset.data, asset.download_name, asset.mimetype) == (b"pdf", "manual_de_uso.pdf", "application/pdf")
+
+
+def test_download_endpoints_are_conditional(appmod, tmp_path, monkeypatch):
+    _write(tmp_path / "plantillas" / "PlantillaCausa.xlsx", b"causa")
+    _write(tmp_path / "plantillas" / "PlantillaObjetivo.xlsx", b"objetivo")
+    manifest = _manifest(tmp_path)
+    monkeypatch.setattr(appmod, "asset_manifest", manifest)
+    client = appmod.app.test_client()
+
+    resp = client.get("/download_templates")
+    assert resp.status_code == 200
+    assert resp.data == manifest.templates().data
+    assert resp.headers["ETag"] == f'"{manifest.templates().etag}"'
+    assert "plantillas_excel.zip" in resp.headers["Content-Disposition"]
+
+    assert client.get("/download_templates", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+    partial = client.get("/download_templates", headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206 and partial.data == resp.data[:10]
+
+    assert client.get("/download_manual").status_code == 404
+    _write(tmp_path / "manual_de_uso.pdf", b"%PDF manual")
+    manual = client.get("/download_manual")
+    assert manual.status_code == 200 and manual.data == b"%PDF manual"
@@ -0,0 +1,148 @@
+# tests/test_chat_flow.py
+# ============================================================
+# Flujo guiado (/api/chat) a través del cliente de pruebas de Flask:
+# para cada camino (paso x mensaje, compuertas, multiselección, carga y
+# reanudación del chat libre) se verifica el paso siguiente, la respuesta
+# completa y la sesión resultante.
+# ============================================================
+
+import pytest
+
+from utils import conversation_flow as FLOW
+
+UPLOAD = {"expect_upload": True, "tipo": "plantilla", "download_url": "/download_templates"}
+MISSING_UPLOAD_MD = "\n\n> ⚠️ Aún no has subido el archivo. Por favor súbelo y luego escribe **Continuar**."
+ONLY_IDEC_IA_MD = ("❌ Este asistente solo atiende proyectos **IDEC/IA**. Se cierra la conversación. "
+                   "Usa *Reiniciar* para empezar de nuevo.")
+ALT_INTRO_MD = "💬 Has activado el **Chat Libre** para resolver esta duda.\n\n"
+UPLOADED = {"upload_plantilla": "plantilla-x.xlsx", "upload_plantilla_sha256": "x"}
+JOB = {
+    "response": "⏳ Estamos generando tu documento. Esto puede tardar un par de minutos…",
+    "current_step": "finalizado", "format": "markdown",
+    "job": {"id": "job-test", "status_url": "/api/jobs/job-test"},
+}
+
+
+def shown(step, *, multiselect=True):
+    """El paso tal como se presenta; multiselect=False es el avance genérico (sin tarjetas)."""
+    conf = FLOW[step]
+    payload = {"response": conf["prompt"], "current_step": step, "format": "markdown"}
+    if "options" in conf:
+        payload["options"] = conf["options"]
+    if "multiselect" in conf and multiselect:
+        payload["response"] += conf["multiselect"]["hint"]
+        payload["multiselect"] = {"items": conf["multiselect"]["items"], "submit_text": "Confirmar"}
+    if "upload" in conf:
+        payload["upload"] = UPLOAD
+    return payload
+
+
+def explanation(step):
+    return {"response": ALT_INTRO_MD + f"Explicación de {step}", "format": "markdown"}
+
+
+# (estado inicial de la sesión, mensaje, respuesta esperada, sesión esperada)
+CASES = [
+    # Bienvenida
+    ({"current_step": "intro_bienvenida"}, "iniciar", shown("intro_bienvenida"), {"current_step": "intro_bienvenida"}),
+    ({"current_step": "intro_bienvenida"}, "Start", shown("intro_bienvenida"), {"current_step": "intro_bienvenida"}),
+    ({"current_step": "intro_bienvenida"}, "Tengo dudas respecto al proceso, me gustaría resolverlas antes de empezar",
+     shown("gate_1_ciclo"), {"current_step": "gate_1_ciclo"}),
+    ({"current_step": "intro_bienvenida"}, "Sí, entiendo el proceso y deseo continuar",
+     shown("elige_vertical"), {"current_step": "elige_vertical"}),
+    ({"current_step": "intro_bienvenida"}, "hola", shown("elige_vertical", multiselect=False),
+     {"current_step": "elige_vertical", "responses": {"intro_bienvenida": "hola"}}),
+    ({"current_step": "intro_bienvenida"}, "", shown("elige_vertical", multiselect=False),
+     {"current_step": "elige_vertical", "responses": {"intro_bienvenida": ""}}),
+    ({}, "hola", shown("elige_vertical", multiselect=False),
+     {"current_step": "elige_vertical", "responses": {"intro_bienvenida": "hola"}}),
+    # Compuertas
+    ({"current_step": "gate_1_ciclo"}, "Sí, lo conozco", shown("gate_2_herramienta"), {"current_step": "gate_2_herramienta"}),
+    ({"current_step": "gate_1_ciclo"}, "No, no lo conozco", explanation("gate_1_ciclo"),
+     {"current_step": "gate_1_ciclo", "mode": "alt", "after_alt_next_step": "gate_2_herramienta"}),
+    ({"current_step": "gate_1_ciclo"}, "tal vez", shown("gate_1_ciclo"), {"current_step": "gate_1_ciclo"}),
+    ({"current_step": "gate_2_herramienta"}, "Sí, lo comprendo", shown("elige_vertical"), {"current_step": "elige_vertical"}),
+    ({"current_step": "gate_2_herramienta"}, "No, no lo tengo claro", explanation("gate_2_herramienta"),
+     {"current_step": "gate_2_herramienta", "mode": "alt", "after_alt_next_step": "elige_vertical"}),
+    ({"current_step": "gate_2_herramienta"}, "tal vez", shown("gate_2_herramienta"), {"current_step": "gate_2_herramienta"}),
+    # Vertical (multiselección)
+    ({"current_step": "elige_vertical", "responses": {}}, "hola", shown("elige_vertical"),
+     {"current_step": "elige_vertical", "responses": {}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:",
+     {"response": ONLY_IDEC_IA_MD, "current_step": "finalizado", "format": "markdown"},
+     {"current_step": "finalizado", "responses": {}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:IDEC", shown("idec_componentes"),
+     {"current_step": "idec_componentes", "responses": {"vertical": "IDEC"}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:IA", shown("nombre_proyecto"),
+     {"current_step": "nombre_proyecto", "responses": {"vertical": "IA"}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:IDEC|IA", shown("idec_componentes"),
+     {"current_step": "idec_componentes", "responses": {"vertical": "IDEC y IA"}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:Otro",
+     {"response": ONLY_IDEC_IA_MD, "current_step": "finalizado", "format": "markdown"},
+     {"current_step": "finalizado", "responses": {"vertical": "Ninguna"}}),
+    ({"current_step": "elige_vertical", "responses": {}}, "__msel__:Inteligencia Artificial", shown("nombre_proyecto"),
+     {"current_step": "nombre_proyecto", "responses": {"vertical": "IA"}}),
+    # Componentes IDEC
+    ({"current_step": "idec_componentes", "responses": {"vertical": "IDEC"}}, "__msel__:Datos|Interoperabilidad",
+     shown("nombre_proyecto"),
+     {"current_step": "nombre_proyecto", "responses": {"vertical": "IDEC", "idec_componentes": ["Datos", "Interoperabilidad"]}}),
+    *[({"current_step": "idec_componentes", "responses": {"vertical": "IDEC"}}, msg, shown("idec_componentes"),
+       {"current_step": "idec_componentes", "responses": {"vertical": "IDEC"}})
+      for msg in ("__msel__:", "__msel__: | ", "hola")],
+    # Preguntas abiertas
+    ({"current_step": "nombre_proyecto", "responses": {}}, "Respuesta libre", shown("localizacion"),
+     {"current_step": "localizacion", "responses": {"nombre_proyecto": "Respuesta libre"}}),
+    ({"current_step": "localizacion", "responses": {}}, "Respuesta libre", shown("problema_oportunidad"),
+     {"current_step": "problema_oportunidad", "responses": {"localizacion": "Respuesta libre"}}),
+    ({"current_step": "problema_oportunidad", "responses": {}}, "Respuesta libre", shown("upload_plantilla"),
+     {"current_step": "upload_plantilla", "responses": {"problema_oportunidad": "Respuesta libre"}}),
+    # Carga de la plantilla
+    *[({"current_step": "upload_plantilla", "responses": {}}, msg, shown("upload_plantilla"),
+       {"current_step": "upload_plantilla", "responses": {}}) for msg in ("hola", "")],
+    *[({"current_step": "upload_plantilla", "responses": {}}, msg,
+       {**shown("upload_plantilla"), "response": FLOW["upload_plantilla"]["prompt"] + MISSING_UPLOAD_MD},
+       {"current_step": "upload_plantilla", "responses": {}}) for msg in ("Continuar", "siguiente paso")],
+    *[({"current_step": "upload_plantilla", "responses": dict(UPLOADED)}, msg, shown("upload_plantilla"),
+       {"current_step": "upload_plantilla", "responses": UPLOADED}) for msg in ("hola", "")],
+    *[({"current_step": "upload_plantilla", "responses": dict(UPLOADED)}, msg, JOB,
+       {"current_step": "finalizado", "responses": UPLOADED, "document_job_id": "job-test"})
+      for msg in ("Continuar", "siguiente paso")],
+    ({"current_step": "finalizado", "responses": {}}, "otra cosa", JOB,
+     {"current_step": "finalizado", "responses": {"finalizado": "otra cosa"}, "document_job_id": "job-test"}),
+    # Reanudación tras el chat libre: se vuelve a mostrar el paso actual
+    *[case for step in FLOW for case in (
+        ({"current_step": step, "resume_from_alt": True}, "lo que sea", shown(step), {"current_step": step}),
+        ({"current_step": step}, "Continuar flujo", shown(step), {"current_step": step}),
+    )],
+    ({"current_step": "finalizado", "resume_from_alt": True}, "lo que sea",
+     {"response": "…", "current_step": "finalizado", "format": "markdown"}, {"current_step": "finalizado"}),
+    ({"current_step": "finalizado"}, "volver al flujo",
+     {"response": "…", "current_step": "finalizado", "format": "markdown"}, {"current_step": "finalizado"}),
+]
+
+
+@pytest.fixture
+def client(appmod, monkeypatch):
+    # Sin efectos externos: id de trabajo fijo y explicaciones "precalculadas"
+    monkeypatch.setattr(appmod.job_queue, "submit", lambda kind, payload, **kwargs: "job-test")
+    monkeypatch.setattr(appmod.precomputed_explanations, "get", lambda step, topic: f"Explicación de {step}")
+    return appmod.app.test_client()
+
+
+@pytest.mark.parametrize("state, message, expected, expected_session", CASES,
+                         ids=[f"{s.get('current_step', '-')}:{m!r}" for s, m, _, _ in CASES])
+def test_transition(client, state, message, expected, expected_session):
+    with client.session_transaction() as sess:
+        sess.update(state)
+
+    resp = client.post("/api/chat", json={"message": message})
+
+    assert resp.status_code == 200
+    assert resp.get_json() == expected
+    with client.session_transaction() as sess:
+        assert dict(sess) == expected_session
+
+
+def test_covers_every_step():
+    steps = {state.get("current_step") for state, _, _, _ in CASES}
+    assert set(FLOW) <= steps
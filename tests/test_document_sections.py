@@ -0,0 +1,78 @@
+# tests/test_document_sections.py
+# ============================================================
+# Generación del documento por secciones en paralelo (generate_sections_markdown)
+# contra un cliente simulado con latencia inyectada por sección.
+# ============================================================
+
+import re
+import time
+
+import utils
+from fakes import FakeClient
+
+PLACEHOLDER = "*No fue posible generar esta sección. Complétela manualmente.*"
+SECTIONS = [(f"Sección {i}", f"Instrucción {i}.") for i in range(1, 9)]
+# La primera sección es la más lenta: si se pidieran en serie, el orden de llegada sería el inverso
+LATENCY = {title: 0.6 - 0.05 * i for i, (title, _) in enumerate(SECTIONS)}
+SLOWEST = max(LATENCY.values())
+
+
+def _title(kwargs) -> str:
+    return re.search(r"sección '## (.+?)'", kwargs["messages"][-1]["content"]).group(1)
+
+
+def _client(**kwargs) -> FakeClient:
+    return FakeClient(reply=lambda kw: f"Cuerpo de {_title(kw)}.", latency=lambda kw: LATENCY[_title(kw)], **kwargs)
+
+
+def _headings(md: str):
+    return re.findall(r"^## (.+)$", md, flags=re.M)
+
+
+def test_wall_clock_close_to_slowest_section():
+    client = _client()
+    t0 = time.perf_counter()
+    md = utils.generate_sections_markdown("Contexto.", client=client, sections=SECTIONS, max_workers=len(SECTIONS))
+    elapsed = time.perf_counter() - t0
+
+    assert elapsed < SLOWEST + 0.4, elapsed
+    assert elapsed < sum(LATENCY.values()) / 2
+    assert len(client.completions.calls) == len(SECTIONS)
+    # Orden fijo de las secciones aunque terminen en otro orden
+    assert _headings(md) == [title for title, _ in SECTIONS]
+    for title, _ in SECTIONS:
+        assert f"## {title}\n\nCuerpo de {title}." in md
+
+
+def test_concurrency_cap():
+    t0 = time.perf_counter()
+    utils.generate_sections_markdown("Contexto.", client=_client(), sections=SECTIONS, max_workers=2)
+    # Con dos a la vez la suma se reparte en dos hilos: más que la sección más lenta
+    assert time.perf_counter() - t0 > SLOWEST + 0.5
+
+
+def test_failed_section_gets_placeholder():
+    failing = "Sección 3"
+    client = _client(fail=lambda kw: _title(kw) == failing)
+    md = utils.generate_sections_markdown("Contexto.", client=client, sections=SECTIONS, max_workers=len(SECTIONS))
+
+    assert _headings(md) == [title for title, _ in SECTIONS]
+    assert f"## {failing}\n\n{PLACEHOLDER}" in md
+    assert md.count(PLACEHOLDER) == 1
+    retries = [kw for kw in client.completions.calls if _title(kw) == failing]
+    assert len(retries) == utils.DOC_SECTION_ATTEMPTS
+
+
+def test_deadline_cuts_slow_sections():
+    t0 = time.perf_counter()
+    md = utils.generate_sections_markdown("Contexto.", client=_client(), sections=SECTIONS, max_workers=len(SECTIONS),
+                                          deadline=utils.deadline_after(0.35))
+    elapsed = time.perf_counter() - t0
+
+    assert elapsed < 0.35 + 0.3, elapsed
+    slow = [title for title, latency in LATENCY.items() if latency > 0.45]
+    fast = [title for title, latency in LATENCY.items() if latency < 0.25]
+    for title in slow:
+        assert f"## {title}\n\n{PLACEHOLDER}" in md
+    for title in fast:
+        assert f"## {title}\n\nCuerpo de {title}." in md
@@ -0,0 +1,130 @@
+# tests/test_jobs.py
+# ============================================================
+# Cola de trabajos (jobs.JobQueue) sobre SQLite real:
+# - Reclamo atómico: un trabajo se ejecuta una sola vez aunque lo intenten varios
+# - recover(): reencola los trabajos 'running' de un proceso muerto
+# - /api/jobs/<id>: solo la sesión que pidió el trabajo ve su estado
+# ============================================================
+
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from jobs import STATUS_DONE, STATUS_QUEUED, STATUS_RUNNING, JobQueue
+
+
+def _wait(jobs: JobQueue, job_id: str, status: str = STATUS_DONE, timeout: float = 5.0) -> dict:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = jobs.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} no llegó a {status}: {jobs.get(job_id)}")
+
+
+def _dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def test_claim_is_atomic(db_path):
+    jobs = JobQueue(db_path, max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def handler(payload):
+        calls.append(payload)
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+
+    jobs.register("prueba", handler)
+    job_id = jobs.submit("prueba", {"n": 1})
+    assert started.wait(5)
+
+    # Mientras corre, otros hilos y otra instancia (otro proceso de gunicorn) intentan reclamarlo
+    other = JobQueue(db_path, max_workers=1)
+    other.register("prueba", handler)
+    claimers = [threading.Thread(target=q._run, args=(job_id,)) for q in (jobs, other) for _ in range(4)]
+    for t in claimers:
+        t.start()
+    for t in claimers:
+        t.join(5)
+    release.set()
+
+    assert _wait(jobs, job_id)["result"] == {"ok": True}
+    assert calls == [{"n": 1}]
+
+
+def test_recover_requeues_dead_owner(db_path):
+    jobs = JobQueue(db_path, max_workers=1)
+    ran = []
+    jobs.register("prueba", lambda payload: ran.append(payload["n"]) or {"n": payload["n"]})
+    host = socket.gethostname()
+    owners = {"muerto": f"{host}:{_dead_pid()}", "vivo": f"{host}:{os.getpid()}",
+              "otro-host": "otra-maquina:1"}
+    now = time.time()
+    for i, (job_id, owner) in enumerate(owners.items()):
+        jobs._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, owner, created_at, updated_at) VALUES (?,?,?,?,?,?,?)",
+            (job_id, "prueba", STATUS_RUNNING, f'{{"n": {i}}}', owner, now, now),
+        )
+
+    assert jobs.recover() == 1
+    assert _wait(jobs, "muerto")["result"] == {"n": 0}
+    assert ran == [0]
+    # Un dueño vivo, o de otro host (no comprobable), conserva su trabajo
+    assert jobs.get("vivo")["status"] == STATUS_RUNNING
+    assert jobs.get("otro-host")["status"] == STATUS_RUNNING
+
+
+def test_submit_records_session(db_path):
+    jobs = JobQueue(db_path, max_workers=1)
+    jobs.register("prueba", lambda payload: {})
+    job_id = jobs.submit("prueba", {}, session_id="sesion-1")
+    assert _wait(jobs, job_id)["session_id"] == "sesion-1"
+    assert jobs.get(jobs.submit("prueba", {}))["session_id"] is None
+
+
+def test_old_database_gets_session_column(db_path):
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+               " payload TEXT NOT NULL, result TEXT, error TEXT, owner TEXT,"
+               " created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+    db.execute("INSERT INTO jobs VALUES ('viejo', 'prueba', ?, '{}', NULL, NULL, NULL, 0, 0)", (STATUS_QUEUED,))
+    db.commit()
+    db.close()
+
+    jobs = JobQueue(db_path, max_workers=1)
+    assert jobs.get("viejo")["session_id"] is None
+
+
+def test_job_status_only_for_owner_session(appmod, monkeypatch):
+    monkeypatch.setitem(appmod.job_queue._handlers, "prueba", lambda payload: {"filename": "doc.docx"})
+    owner, stranger = appmod.app.test_client(), appmod.app.test_client()
+    with owner.session_transaction() as sess:
+        sess["current_step"] = "finalizado"
+        sid = sess.sid
+    job_id = appmod.job_queue.submit("prueba", {}, session_id=sid)
+    orphan_id = appmod.job_queue.submit("prueba", {})
+    _wait(appmod.job_queue, job_id)
+
+    resp = owner.get(f"/api/jobs/{job_id}")
+    assert resp.status_code == 200
+    assert resp.get_json()["status"] == STATUS_DONE
+    assert stranger.get(f"/api/jobs/{job_id}").status_code == 404
+    assert owner.get(f"/api/jobs/{orphan_id}").status_code == 404
+    assert owner.get("/api/jobs/no-existe").status_code == 404
@@ -0,0 +1,118 @@
+# tests/test_llm_transport.py
+# ============================================================
+# Cliente AzureOpenAI real contra el servidor simulado (benchmarks/stub_azure.py):
+# - El pool reutiliza la conexión keep-alive entre llamadas
+# - El plazo total corta cabeceras lentas y streams que gotean bytes (sin reintentos)
+# - El timeout por fase de httpx sigue rigiendo sin plazo
+# - El cupo del limitador se libera en cuanto vence el plazo
+# ============================================================
+
+import os
+import sys
+import time
+
+import openai
+import pytest
+from openai import AzureOpenAI
+
+import llm_transport
+import utils
+from llm_limiter import AdmissionLimiter, AdmittedClient
+from llm_transport import make_http_client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from stub_azure import start_stub  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Hola"}]
+
+
+@pytest.fixture
+def stub():
+    server, endpoint = start_stub()
+    yield server, endpoint
+    server.shutdown()
+    server.server_close()
+
+
+def _azure(endpoint: str):
+    http_client, transport = make_http_client()
+    azure = AzureOpenAI(api_key="test", azure_endpoint=endpoint, api_version="2024-05-01-preview",
+                        http_client=http_client, timeout=http_client.timeout, max_retries=0)
+    return azure, transport
+
+
+def _drain(stream) -> str:
+    return "".join(stream)
+
+
+def test_pool_reuses_connection(stub):
+    server, endpoint = stub
+    azure, transport = _azure(endpoint)
+    fired = llm_transport._watchdog.fired
+
+    for _ in range(3):
+        assert utils.ask_markdown_azure(MESSAGES, client=azure, deadline=utils.deadline_after(0.5))
+        assert _drain(utils.stream_markdown_azure(MESSAGES, client=azure, deadline=utils.deadline_after(0.5)))
+    # Los plazos vencen con la conexión ya devuelta al pool: el vigía no debe cerrarla
+    time.sleep(0.6)
+    assert utils.ask_markdown_azure(MESSAGES, client=azure)
+
+    stats = transport.stats()
+    assert server.requests == stats["requests"] == 7
+    assert stats["connections_idle"] + stats["connections_in_use"] == 1
+    assert llm_transport._watchdog.fired == fired
+
+
+def test_deadline_bounds_slow_headers(stub):
+    server, endpoint = stub
+    server.cfg["delay"] = 2.0
+    azure, _ = _azure(endpoint)
+
+    t0 = time.perf_counter()
+    with pytest.raises(utils.DeadlineExceeded):
+        utils.ask_markdown_azure(MESSAGES, client=azure, deadline=utils.deadline_after(0.5))
+    assert time.perf_counter() - t0 < 1.0
+    assert server.requests == 1
+
+
+def test_deadline_cuts_trickling_stream(stub):
+    server, endpoint = stub
+    # Cada evento llega antes del timeout de lectura: solo el vigía corta a tiempo
+    server.cfg["chunk_delay"] = 0.8
+    azure, _ = _azure(endpoint)
+    fired = llm_transport._watchdog.fired
+
+    t0 = time.perf_counter()
+    with pytest.raises(utils.DeadlineExceeded):
+        _drain(utils.stream_markdown_azure(MESSAGES, client=azure, deadline=utils.deadline_after(1.0)))
+    assert time.perf_counter() - t0 < 1.4
+    assert llm_transport._watchdog.fired == fired + 1
+
+
+def test_read_timeout_without_deadline(stub, monkeypatch):
+    server, endpoint = stub
+    server.cfg["delay"] = 1.5
+    monkeypatch.setenv("LLM_READ_TIMEOUT", "0.3")
+    azure, transport = _azure(endpoint)
+
+    t0 = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        utils.ask_markdown_azure(MESSAGES, client=azure)
+    assert time.perf_counter() - t0 < 1.0
+    assert transport.stats()["timeouts"] == 1
+
+
+def test_slot_released_when_deadline_fires(stub, tmp_path):
+    server, endpoint = stub
+    server.cfg["chunk_delay"] = 0.8
+    azure, _ = _azure(endpoint)
+    limiter = AdmissionLimiter(str(tmp_path / "limiter.db"), max_concurrency=1)
+    client = AdmittedClient(azure, limiter)
+
+    with pytest.raises(utils.DeadlineExceeded):
+        _drain(utils.stream_markdown_azure(MESSAGES, client=client, deadline=utils.deadline_after(0.5)))
+    assert limiter.snapshot()["in_flight"] == 0
+
+    # Con un único cupo, la siguiente llamada solo entra si el anterior se liberó
+    server.cfg["chunk_delay"] = 0.0
+    assert utils.ask_markdown_azure(MESSAGES, client=client, deadline=utils.deadline_after(2.0))
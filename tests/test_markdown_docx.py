@@ -0,0 +1,163 @@
+# tests/test_markdown_docx.py
+# ============================================================
+# Markdown -> DOCX (markdown_docx.render_markdown) sobre un Document real:
+# - Estilos de párrafo y formato de runs (negrita, itálica, monoespaciado)
+# - Listas anidadas, también más allá de MAX_LIST_LEVEL, y numeración reiniciada
+# - Tablas GFM con alineación por columna
+# - Hipervínculos reales: relaciones externas con ids únicos
+# - Bloques <center> / <div align="..."> de varias líneas
+# ============================================================
+
+from io import BytesIO
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+
+from markdown_docx import MAX_LIST_LEVEL, ListBlock, Para, parse_markdown, render_markdown
+
+
+def _render(md: str, **kwargs) -> Document:
+    doc = Document()
+    render_markdown(doc, md, **kwargs)
+    return doc
+
+
+def _styles(doc):
+    return [(p.style.name, p.text) for p in doc.paragraphs]
+
+
+def _num_id(p):
+    num_pr = p._p.pPr.numPr if p._p.pPr is not None else None
+    return num_pr.numId.val if num_pr is not None else None
+
+
+def test_paragraph_styles_and_runs():
+    doc = _render("# Título\n\n## Subtítulo\n\nTexto **negrita**, *itálica* y `codigo`.\n\n---\n\nFin")
+
+    assert _styles(doc)[:3] == [("Heading 1", "Título"), ("Heading 2", "Subtítulo"),
+                                ("Normal", "Texto negrita, itálica y codigo.")]
+    runs = [(r.text, bool(r.bold), bool(r.italic), r.font.name) for r in doc.paragraphs[2].runs]
+    assert runs == [("Texto ", False, False, None), ("negrita", True, False, None), (", ", False, False, None),
+                    ("itálica", False, True, None), (" y ", False, False, None),
+                    ("codigo", False, False, "Courier New"), (".", False, False, None)]
+    # El separador es un salto de línea en su propio párrafo
+    assert doc.paragraphs[3]._p.findall(".//" + qn("w:br"))
+    assert doc.paragraphs[4].text == "Fin"
+
+
+def test_justify_applies_to_paragraphs_and_lists():
+    doc = _render("Párrafo\n\n- viñeta\n\n# Título", justify=True)
+    alignments = [p.alignment for p in doc.paragraphs]
+    assert alignments == [WD_ALIGN_PARAGRAPH.JUSTIFY, WD_ALIGN_PARAGRAPH.JUSTIFY, None]
+
+
+def test_nested_lists_beyond_max_level():
+    md = "\n".join(f"{'  ' * depth}- nivel {depth + 1}" for depth in range(MAX_LIST_LEVEL + 2))
+    nodes = parse_markdown(md)
+
+    # Los niveles de más quedan como hermanos en el último nivel admitido
+    block, depth = nodes[0], 1
+    while block.items[-1].children:
+        block, depth = block.items[-1].children[0], depth + 1
+    assert depth == MAX_LIST_LEVEL
+    assert [item.text for item in block.items] == [f"nivel {n}" for n in range(MAX_LIST_LEVEL, MAX_LIST_LEVEL + 3)]
+
+    doc = _render(md)
+    assert _styles(doc) == [("List Bullet", "nivel 1"), ("List Bullet 2", "nivel 2")] + [
+        ("List Bullet 3", f"nivel {n}") for n in range(3, MAX_LIST_LEVEL + 3)]
+
+
+def test_mixed_and_ordered_lists_restart_numbering():
+    doc = _render("1. uno\n2. dos\n   - viñeta\n\nPárrafo\n\n3. tres\n4. cuatro")
+
+    assert _styles(doc) == [("List Number", "uno"), ("List Number", "dos"), ("List Bullet 2", "viñeta"),
+                            ("Normal", "Párrafo"), ("List Number", "tres"), ("List Number", "cuatro")]
+    first, second = _num_id(doc.paragraphs[0]), _num_id(doc.paragraphs[4])
+    assert first is not None and second is not None and first != second
+    assert _num_id(doc.paragraphs[1]) == first
+    assert _num_id(doc.paragraphs[2]) is None
+    # Cada lista numerada es una instancia nueva que arranca en su primer número
+    numbering = doc.part.numbering_part.numbering_definitions._numbering
+    starts = {num.numId: num.find(".//" + qn("w:startOverride")).get(qn("w:val")) for num in numbering.num_lst
+              if num.numId in (first, second)}
+    assert starts == {first: "1", second: "3"}
+
+
+def test_gfm_table_with_alignment():
+    doc = _render("| Izq | Centro | Der | Nada |\n|:--|:-:|--:|---|\n| a | **b** | c \\| d | e |\n| f |")
+
+    assert not doc.paragraphs
+    table = doc.tables[0]
+    assert table.style.name == "Table Grid"
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [
+        ["Izq", "Centro", "Der", "Nada"], ["a", "b", "c | d", "e"], ["f", "", "", ""]]
+    for row in table.rows:
+        assert [cell.paragraphs[0].alignment for cell in row.cells] == [
+            WD_ALIGN_PARAGRAPH.LEFT, WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.RIGHT, None]
+    assert all(run.bold for cell in table.rows[0].cells for run in cell.paragraphs[0].runs)
+    assert table.rows[1].cells[1].paragraphs[0].runs[0].bold
+    assert not table.rows[1].cells[0].paragraphs[0].runs[0].bold
+
+
+def test_real_hyperlinks_with_unique_relationship_ids():
+    doc = Document()
+    existing = set(doc.part.rels)
+    render_markdown(doc, "Ver [el **sitio**](https://a.example/x) y [otro](https://b.example).\n\n"
+                         "Otra vez [el sitio](https://a.example/x).")
+
+    links = [h for p in doc.paragraphs for h in p._p.findall(qn("w:hyperlink"))]
+    rids = [h.get(qn("r:id")) for h in links]
+    assert len(rids) == 3
+    assert rids[0] == rids[2] != rids[1]  # el mismo destino reutiliza su relación
+    assert not existing & set(rids)
+    rels = doc.part.rels
+    assert {rid: (rels[rid].reltype, rels[rid].target_ref, rels[rid].is_external) for rid in rids} == {
+        rids[0]: (RT.HYPERLINK, "https://a.example/x", True),
+        rids[1]: (RT.HYPERLINK, "https://b.example", True),
+    }
+    # El texto del enlace conserva su formato y va subrayado
+    runs = links[0].findall(qn("w:r"))
+    assert [r.find(qn("w:t")).text for r in runs] == ["el ", "sitio"]
+    assert runs[1].find(qn("w:rPr")).find(qn("w:b")) is not None
+    assert all(r.find(qn("w:rPr")).find(qn("w:u")) is not None for r in runs)
+    assert doc.paragraphs[0].text.startswith("Ver ")
+
+    # Un segundo render sobre el mismo documento no choca con los ids ya usados
+    render_markdown(doc, "[nuevo](https://c.example)")
+    new_rid = doc.paragraphs[-1]._p.find(qn("w:hyperlink")).get(qn("r:id"))
+    assert new_rid not in rids and rels[new_rid].target_ref == "https://c.example"
+
+    buf = BytesIO()
+    doc.save(buf)
+    reopened = Document(BytesIO(buf.getvalue()))
+    assert reopened.part.rels[rids[1]].target_ref == "https://b.example"
+
+
+def test_div_align_blocks():
+    md = ('<div align="right">\nLínea uno\n\n- no es lista\n## Título\n</div>\nDespués\n\n'
+          "<center>**Centrado**</center>\n\n<p align='justify'>Justificado</p>")
+    nodes = parse_markdown(md)
+    assert not any(isinstance(node, ListBlock) for node in nodes)
+    assert Para("- no es lista", "right") in nodes
+
+    doc = _render(md)
+    assert [(p.text, p.alignment) for p in doc.paragraphs] == [
+        ("Línea uno", WD_ALIGN_PARAGRAPH.RIGHT),
+        ("- no es lista", WD_ALIGN_PARAGRAPH.RIGHT),
+        ("Título", WD_ALIGN_PARAGRAPH.RIGHT),
+        ("Después", None),
+        ("Centrado", WD_ALIGN_PARAGRAPH.CENTER),
+        ("Justificado", WD_ALIGN_PARAGRAPH.JUSTIFY),
+    ]
+    assert doc.paragraphs[2].style.name == "Heading 2"
+    assert doc.paragraphs[4].runs[0].bold
+
+
+def test_render_before_anchor():
+    doc = Document()
+    doc.add_paragraph("Inicio")
+    end = doc.add_paragraph("Final")
+    render_markdown(doc, "- medio\n\nTexto", before=end._p)
+    assert [p.text for p in doc.paragraphs] == ["Inicio", "medio", "Texto", "Final"]
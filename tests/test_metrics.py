@@ -0,0 +1,84 @@
+# tests/test_metrics.py
+# ============================================================
+# Agregación de métricas entre procesos (MetricsStore / Metrics.render):
+# los workers muertos se funden en la fila "retired" sin cambiar los totales.
+# ============================================================
+
+import subprocess
+import sys
+
+from metrics import RETIRED_PROC, Metrics, MetricsStore, Registry
+
+
+def _registry():
+    reg = Registry()
+    reg.counter("app_requests_total", "Peticiones", ["route"])
+    reg.gauge("app_inflight", "En curso")
+    reg.histogram("app_seconds", "Duración", buckets=(0.1, 1.0))
+    return reg
+
+
+def _record(reg, requests, seconds, inflight):
+    reg.families["app_requests_total"].inc(requests, route="/api/chat")
+    reg.families["app_seconds"].observe(seconds)
+    reg.families["app_inflight"].set(inflight)
+
+
+def _dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _kill(store, proc, pid):
+    """Simula un worker que terminó hace rato: pid inexistente y sin volcados recientes."""
+    store._conn().execute("UPDATE procs SET pid=?, updated_at=0 WHERE proc=?", (pid, proc))
+
+
+def _procs(store):
+    return sorted(p for (p,) in store._conn().execute("SELECT DISTINCT proc FROM samples"))
+
+
+def test_dead_workers_fold_into_retired(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.sqlite3"))
+    workers = [_registry() for _ in range(3)]
+    for i, reg in enumerate(workers):
+        _record(reg, requests=i + 1, seconds=0.5 * i, inflight=10)
+        reg.flush(store)
+    live = workers[0]
+    metrics = Metrics(live, store)
+    before = metrics.render()
+    assert "app_requests_total{route=\"/api/chat\"} 6" in before
+
+    for reg in workers[1:]:
+        _kill(store, reg.proc, _dead_pid())
+    after = metrics.render()
+
+    assert _procs(store) == sorted([live.proc, RETIRED_PROC])
+    # Contadores e histogramas conservan el total; el gauge solo cuenta el proceso vivo
+    assert "app_requests_total{route=\"/api/chat\"} 6" in after
+    assert "app_seconds_count 3" in after
+    assert "app_seconds_bucket{le=\"1\"} 3" in after
+    assert "app_inflight 10" in after
+    retired_fields = {name for (name,) in store._conn().execute(
+        "SELECT name FROM samples WHERE proc=?", (RETIRED_PROC,))}
+    assert "app_inflight" not in retired_fields
+
+    # Un segundo worker muerto se suma a la misma fila agregada
+    late = _registry()
+    _record(late, requests=4, seconds=2.0, inflight=1)
+    late.flush(store)
+    _kill(store, late.proc, _dead_pid())
+    assert "app_requests_total{route=\"/api/chat\"} 10" in metrics.render()
+    assert _procs(store) == sorted([live.proc, RETIRED_PROC])
+
+
+def test_stale_but_alive_worker_is_kept(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.sqlite3"))
+    reg = _registry()
+    _record(reg, requests=1, seconds=0.1, inflight=1)
+    reg.flush(store)
+    store._conn().execute("UPDATE procs SET updated_at=0")
+
+    assert store.retire_dead(["app_inflight"], stale_before=1.0) == 0
+    assert _procs(store) == [reg.proc]
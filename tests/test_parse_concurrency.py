@@ -0,0 +1,91 @@
+# tests/test_parse_concurrency.py
+# ============================================================
+# Parseo concurrente de plantillas: varios libros distintos parseados (y subidos)
+# en paralelo deben dar cada uno su propio árbol, idéntico al parseo en serie.
+# ============================================================
+
+import io
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from openpyxl import Workbook
+
+import utils
+from tree_store import load_tree
+
+N_WORKBOOKS = 8
+
+
+def build_workbook(path: str, sheets: int, rows: int, seed: int) -> None:
+    """Hojas con la forma de la plantilla: causas en A–K y objetivos en L–W; textos distintos por semilla."""
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Hoja-{s + 1}")
+        ws.append(["Causas"] + [None] * 10 + ["Objetivos"])
+        ws.append(["ID", "Descripción", "Efecto"] + [None] * 8 + ["ID", "Descripción", "Medio", "Fin"])
+        for r in range(rows):
+            c, ci = f"C{r // 5 + 1}", f"C{r // 5 + 1}CI{r % 5 + 1}"
+            o, mi = f"O{r // 5 + 1}", f"O{r // 5 + 1}MI{r % 5 + 1}"
+            tag = f"{seed}-{s}-{r} {rnd.random():.6f}"
+            causas = [c if r % 5 == 0 else None, f"Causa {tag}", f"Efecto {tag}", None,
+                      c, ci, f"Causa indirecta {tag}", None, ci, f"{ci}E1", f"Efecto indirecto {tag}"]
+            objetivos = [o if r % 5 == 0 else None, f"Objetivo {tag}", f"Medio {tag}", f"Fin {tag}", None,
+                         o, mi, f"Medio indirecto {tag}", None, mi, f"{mi}F1", f"Fin indirecto {tag}"]
+            ws.append(causas + objetivos)
+    wb.save(path)
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    paths = []
+    for i in range(N_WORKBOOKS):
+        path = tmp_path / f"libro-{i}.xlsx"
+        build_workbook(str(path), sheets=1 + i % 3, rows=20 + 5 * i, seed=i)
+        paths.append(str(path))
+    return paths
+
+
+def _run_together(fn, items):
+    """Aplica fn a cada elemento en su propio hilo, arrancando todos a la vez."""
+    barrier = threading.Barrier(len(items))
+
+    def run(item):
+        barrier.wait()
+        return fn(item)
+
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(run, items))
+
+
+def test_parallel_parse_matches_serial(workbooks):
+    serial = [utils.parse_excel_all_sheets(p) for p in workbooks]
+    assert len({repr(t) for t in serial}) == N_WORKBOOKS  # cada libro tiene un árbol distinto
+
+    assert _run_together(utils.parse_excel_all_sheets, workbooks) == serial
+
+
+def test_parallel_mixed_sheet_matches_serial(workbooks):
+    jobs = [(p, "Hoja-1") for p in workbooks]
+    serial = [utils.parse_mixed_sheet(p, sheet) for p, sheet in jobs]
+
+    assert _run_together(lambda job: utils.parse_mixed_sheet(*job), jobs) == serial
+    # La ruta pandas y la de openpyxl por filas coinciden
+    assert [t["Hoja-1"] for t in (utils.parse_excel_all_sheets(p) for p in workbooks)] == serial
+
+
+def test_parallel_uploads_each_get_own_tree(appmod, workbooks):
+    expected = [utils.parse_excel_all_sheets(p) for p in workbooks]
+
+    def upload(path):
+        client = appmod.app.test_client()
+        with open(path, "rb") as f:
+            data = {"tipo": "plantilla", "file": (io.BytesIO(f.read()), "plantilla.xlsx")}
+        resp = client.post("/api/upload_formulario", data=data, content_type="multipart/form-data")
+        assert resp.status_code == 200, resp.get_json()
+        with client.session_transaction() as sess:
+            return load_tree(sess["plantilla_json_path"])
+
+    assert _run_together(upload, workbooks) == expected
@@ -0,0 +1,188 @@
+# tests/test_retention.py
+# ============================================================
+# Retención de archivos generados (retention.py) con las sesiones y la cola reales:
+# nada referenciado, reciente o en uso se borra; el bloqueo y el dry-run se respetan.
+# ============================================================
+
+import os
+import threading
+import time
+
+import pytest
+
+from jobs import JobQueue, STATUS_DONE, STATUS_QUEUED, STATUS_RUNNING
+from retention import TRASH_SUFFIX, referenced_artifacts, retention_from_env
+from session_store import ServerSideSessionInterface, SQLiteSessionStore
+
+DAY = 24 * 3600
+OLD = 30 * DAY
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    paths = {name: tmp_path / name for name in ("documents", "formularios", "formularios_json", "data")}
+    for path in paths.values():
+        path.mkdir()
+    return paths
+
+
+@pytest.fixture
+def sessions(dirs):
+    return ServerSideSessionInterface(SQLiteSessionStore(str(dirs["data"] / "sessions.sqlite3")), idle_ttl=2 * 3600)
+
+
+@pytest.fixture
+def jobs(dirs):
+    return JobQueue(str(dirs["data"] / "jobs.sqlite3"), max_workers=1)
+
+
+def _retention(dirs, referenced):
+    return retention_from_env(str(dirs["documents"]), str(dirs["formularios"]), str(dirs["formularios_json"]),
+                              str(dirs["data"]), referenced=referenced, session_ttl_s=2 * 3600)
+
+
+def _make(folder, name, age_s, size=100):
+    path = folder / name
+    path.write_bytes(b"x" * size)
+    stamp = time.time() - age_s
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def _plantilla(dirs, stem, age_s=OLD):
+    return [_make(dirs["formularios"], f"{stem}.xlsx", age_s),
+            _make(dirs["formularios_json"], f"{stem}.tree", age_s),
+            _make(dirs["formularios_json"], f"{stem}.json", age_s)]
+
+
+def _wait_status(jobs, job_id, status):
+    for _ in range(200):
+        if jobs.get(job_id)["status"] == status:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"el trabajo {job_id} no llegó a {status}")
+
+
+def test_referenced_files_are_never_removed(dirs, sessions, jobs):
+    release = threading.Event()
+    jobs.register("documento", lambda payload: {"filename": payload["filename"]})
+    jobs.register("bloqueante", lambda payload: release.wait(5) and {})
+
+    in_session = _plantilla(dirs, "plantilla-sesion")
+    doc = _make(dirs["documents"], "proyecto_inversion_1.docx", OLD)
+    in_running_job = _plantilla(dirs, "plantilla-en-curso")
+    in_queued_job = _plantilla(dirs, "plantilla-en-cola")
+    orphan = _plantilla(dirs, "plantilla-huerfana")
+    orphan_doc = _make(dirs["documents"], "proyecto_inversion_2.docx", OLD)
+
+    done_id = jobs.submit("documento", {"filename": doc.name})
+    _wait_status(jobs, done_id, STATUS_DONE)
+    running_id = jobs.submit("bloqueante", {"responses": {"upload_plantilla": "plantilla-en-curso.xlsx"}})
+    queued_id = jobs.submit("bloqueante", {"responses": {"upload_plantilla": "plantilla-en-cola.xlsx"}})
+    try:
+        _wait_status(jobs, running_id, STATUS_RUNNING)
+        assert jobs.get(queued_id)["status"] == STATUS_QUEUED
+        sessions.store.save("s1", {"responses": {"upload_plantilla": "plantilla-sesion.xlsx"}}, [], cleared=True)
+        sessions.store.save("s2", {"document_job_id": done_id}, [], cleared=True)
+
+        report = _retention(dirs, lambda: referenced_artifacts(sessions, jobs)).run()
+    finally:
+        release.set()
+
+    removed = {os.path.basename(r.path) for r in report.removals}
+    assert removed == {p.name for p in orphan} | {orphan_doc.name}
+    for path in in_session + in_running_job + in_queued_job + [doc]:
+        assert path.exists(), path.name
+    assert not any(p.exists() for p in orphan + [orphan_doc])
+    assert report.references_known
+
+
+def test_expired_session_no_longer_protects(dirs, sessions, jobs):
+    files = _plantilla(dirs, "plantilla-vieja")
+    sessions.store.save("s1", {"responses": {"upload_plantilla": "plantilla-vieja.xlsx"}}, [], cleared=True)
+    sessions.store._conn().execute("UPDATE session_meta SET accessed_at=?", (time.time() - DAY,))
+
+    _retention(dirs, lambda: referenced_artifacts(sessions, jobs)).run()
+
+    assert not any(p.exists() for p in files)
+
+
+def test_recent_files_survive_even_over_quota(dirs, sessions, jobs):
+    retention = _retention(dirs, lambda: referenced_artifacts(sessions, jobs))
+    retention.max_bytes = 0
+    fresh = _make(dirs["documents"], "proyecto_inversion_nuevo.docx", retention.min_age_s / 2)
+    stale = _make(dirs["documents"], "proyecto_inversion_viejo.docx", retention.min_age_s * 2)
+
+    report = retention.run()
+
+    assert fresh.exists()
+    assert not stale.exists()
+    assert [r.reason for r in report.removals] == ["cuota"]
+    assert report.protected == 1
+
+
+def test_cookie_backend_widens_grace(dirs, jobs):
+    # Con sesiones en la cookie no se conocen las referencias: gracia = duración de la sesión
+    retention = _retention(dirs, lambda: referenced_artifacts(None, jobs))
+    retention.max_bytes = 0
+    within_session = _make(dirs["documents"], "proyecto_inversion_1.docx", 1.5 * 3600)
+    beyond_session = _make(dirs["documents"], "proyecto_inversion_2.docx", 3 * 3600)
+
+    report = retention.run()
+
+    assert not report.references_known
+    assert within_session.exists()
+    assert not beyond_session.exists()
+
+    # La misma antigüedad con referencias conocidas (ninguna) solo tiene la gracia mínima
+    known = _retention(dirs, lambda: set())
+    known.max_bytes = 0
+    assert known.run().references_known
+    assert not within_session.exists()
+
+
+def test_file_reused_during_pass_is_restored(dirs, monkeypatch):
+    retention = _retention(dirs, lambda: set())
+    doc = _make(dirs["documents"], "proyecto_inversion_1.docx", OLD)
+    plan = retention._plan
+
+    def plan_then_reuse(dry_run):
+        report = plan(dry_run)
+        os.utime(doc)  # una subida/descarga lo reutiliza entre la decisión y el borrado
+        return report
+
+    monkeypatch.setattr(retention, "_plan", plan_then_reuse)
+    report = retention.run()
+
+    assert report.removals == []
+    assert doc.exists()
+    assert not any(name.endswith(TRASH_SUFFIX) for name in os.listdir(dirs["documents"]))
+
+
+def test_run_while_locked_returns_none(dirs):
+    retention = _retention(dirs, lambda: set())
+    doc = _make(dirs["documents"], "proyecto_inversion_1.docx", OLD)
+    other = _retention(dirs, lambda: set())  # otro worker con la pasada en curso
+    assert other._lock.acquire()
+    try:
+        assert retention.run() is None
+        assert doc.exists()
+    finally:
+        other._lock.release()
+    assert retention.run() is not None
+    assert not doc.exists()
+
+
+def test_dry_run_touches_nothing(dirs):
+    retention = _retention(dirs, lambda: set())
+    doc = _make(dirs["documents"], "proyecto_inversion_1.docx", OLD)
+    tmp = _make(dirs["formularios"], "plantilla-x.xlsx.123.tmp", OLD)
+    trash = _make(dirs["documents"], f"proyecto_inversion_2.docx.99{TRASH_SUFFIX}", OLD)
+    before = sorted(os.listdir(dirs["documents"])) + sorted(os.listdir(dirs["formularios"]))
+
+    report = retention.run(dry_run=True)
+
+    assert report.dry_run
+    assert {os.path.basename(r.path) for r in report.removals} == {doc.name, tmp.name}
+    assert sorted(os.listdir(dirs["documents"])) + sorted(os.listdir(dirs["formularios"])) == before
+    assert trash.exists()
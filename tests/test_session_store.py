@@ -0,0 +1,114 @@
+# tests/test_session_store.py
+# ============================================================
+# Sesiones del lado del servidor (session_store) con una app Flask mínima:
+# - Una sesión sin cambios no escribe en cada petición (touch acotado por fracción del TTL)
+# - /static no lee ni escribe la sesión
+# - Ambos backends (SQLite y archivos JSON)
+# ============================================================
+
+import os
+
+import pytest
+from flask import Flask, session
+
+from session_store import FileSessionStore, ServerSideSessionInterface, SQLiteSessionStore
+
+IDLE_TTL = 1000.0
+
+
+class CountingStore:
+    """Envuelve un almacén real y cuenta las llamadas a load/touch/save."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = {"load": 0, "touch": 0, "save": 0}
+
+    def __getattr__(self, name):
+        attr = getattr(self.inner, name)
+        if name not in self.calls:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+@pytest.fixture(params=["sqlite", "file"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return CountingStore(SQLiteSessionStore(str(tmp_path / "sessions.sqlite3")))
+    return CountingStore(FileSessionStore(str(tmp_path / "sessions")))
+
+
+@pytest.fixture
+def client(store, tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "app.js").write_text("console.log(1);", encoding="utf-8")
+    app = Flask(__name__, static_folder=str(static))
+    app.secret_key = "pruebas"
+    app.session_interface = ServerSideSessionInterface(store, idle_ttl=IDLE_TTL, purge_probability=0.0)
+
+    @app.route("/set")
+    def set_value():
+        session["paso"] = "inicio"
+        return "ok"
+
+    @app.route("/ver")
+    def get_value():
+        return session.get("paso", "")
+
+    return app.test_client()
+
+
+def _age(store, seconds: float) -> None:
+    """Retrasa la última actividad registrada de todas las sesiones."""
+    inner = store.inner
+    if isinstance(inner, SQLiteSessionStore):
+        inner._conn().execute("UPDATE session_meta SET accessed_at = accessed_at - ?", (seconds,))
+        return
+    for name in os.listdir(inner.directory):
+        path = os.path.join(inner.directory, name)
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+
+def test_unmodified_session_skips_touch(client, store):
+    client.get("/set")
+    assert store.calls["save"] == 1
+
+    for _ in range(5):
+        assert client.get("/ver").get_data(as_text=True) == "inicio"
+    assert store.calls["touch"] == 0
+    assert store.calls["save"] == 1
+
+
+def test_touch_once_activity_is_old(client, store):
+    client.get("/set")
+    _age(store, 0.5 * IDLE_TTL)
+
+    client.get("/ver")
+    client.get("/ver")
+    # El primer acceso renueva la actividad; el segundo ya la ve reciente
+    assert store.calls["touch"] == 1
+    assert client.get("/ver").get_data(as_text=True) == "inicio"
+
+
+def test_expired_session_starts_over(client, store):
+    client.get("/set")
+    _age(store, IDLE_TTL + 1)
+    assert client.get("/ver").get_data(as_text=True) == ""
+
+
+def test_static_does_not_open_session(client, store):
+    client.get("/set")
+    loads, touches = store.calls["load"], store.calls["touch"]
+    _age(store, 0.5 * IDLE_TTL)
+
+    resp = client.get("/static/app.js")
+    assert resp.status_code == 200
+    resp.close()
+    assert store.calls["load"] == loads
+    assert store.calls["touch"] == touches
+    assert "Set-Cookie" not in resp.headers
@@ -0,0 +1,105 @@
+# tests/test_streaming.py
+# ============================================================
+# Respuestas en streaming (SSE) del chat libre y de las compuertas:
+# el primer evento 'data' sale antes de que el modelo termine, y los
+# errores llegan como 'event: error' dentro del mismo stream.
+# ============================================================
+
+import json
+import time
+
+import pytest
+
+from fakes import FakeClient
+from llm_limiter import LLMBusy
+
+CHUNKS = ["El ciclo ", "de inversión ", "tiene ", "cuatro fases."]
+CHUNK_DELAY = 0.2
+
+
+@pytest.fixture
+def fake(appmod, monkeypatch):
+    """Cliente simulado detrás del limitador (app.client), sin caché de respuestas."""
+    def install(**kwargs):
+        client = FakeClient(chunk_delay=CHUNK_DELAY, **kwargs)
+        monkeypatch.setattr(appmod.client, "_client", client)
+        return client
+    monkeypatch.setattr(appmod, "completion_cache", None)
+    return install
+
+
+def _read_events(resp):
+    """(instante de llegada, evento, datos) de cada evento SSE, a medida que se reciben."""
+    events, buf = [], ""
+    for part in resp.response:
+        buf += part.decode("utf-8") if isinstance(part, bytes) else part
+        while "\n\n" in buf:
+            raw, buf = buf.split("\n\n", 1)
+            name, data = "message", None
+            for line in raw.splitlines():
+                if line.startswith("event: "):
+                    name = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+            events.append((time.perf_counter(), name, data))
+    return events
+
+
+def _post_stream(appmod, url, message, **session_values):
+    client = appmod.app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(session_values)
+    resp = client.post(url, json={"message": message, "stream": True}, buffered=False)
+    return client, resp
+
+
+def test_chat_alt_streams_before_completion(appmod, fake):
+    llm = fake(chunks=CHUNKS)
+    _, resp = _post_stream(appmod, "/api/chat_alt", "¿Qué es el ciclo de inversión?", mode="alt")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+
+    events = _read_events(resp)
+    data = [e for e in events if e[1] == "message"]
+    first_at = data[0][0]
+    # El primer fragmento llegó antes de que el modelo entregara el último
+    assert first_at < llm.completions.yielded[-1]
+    assert events[-1][0] - first_at >= CHUNK_DELAY * (len(CHUNKS) - 1) * 0.8
+    assert "".join(d["delta"] for _, _, d in data) == "".join(CHUNKS)
+    assert events[-1][1] == "done"
+
+
+def test_gate_explanation_streams_with_intro(appmod, fake, monkeypatch):
+    monkeypatch.setattr(appmod.precomputed_explanations, "get", lambda *args: None)
+    llm = fake(chunks=CHUNKS)
+    client, resp = _post_stream(appmod, "/api/chat", "No", current_step="gate_1_ciclo", mode="flow", responses={})
+    assert resp.status_code == 200
+
+    events = _read_events(resp)
+    data = [d["delta"] for _, name, d in events if name == "message"]
+    assert data[0] == appmod.ALT_INTRO_MD
+    assert "".join(data[1:]) == "".join(CHUNKS)
+    assert events[1][0] < llm.completions.yielded[-1]
+    assert events[-1][1] == "done"
+    with client.session_transaction() as sess:
+        assert sess["mode"] == "alt"
+        assert sess["after_alt_next_step"] == "gate_2_herramienta"
+
+
+def test_error_mid_stream_becomes_error_event(appmod, fake):
+    fake(chunks=CHUNKS[:2] + [RuntimeError("se cayó la conexión")])
+    _, resp = _post_stream(appmod, "/api/chat_alt", "Pregunta con error", mode="alt")
+
+    events = _read_events(resp)
+    names = [name for _, name, _ in events]
+    assert names == ["message", "message", "error"]
+    assert "se cayó la conexión" in events[-1][2]["error"]
+
+
+def test_busy_mid_stream_reports_error_code(appmod, fake):
+    fake(chunks=CHUNKS[:1] + [LLMBusy("limite_azure", 3.0)])
+    _, resp = _post_stream(appmod, "/api/chat_alt", "Pregunta saturada", mode="alt")
+
+    events = _read_events(resp)
+    assert events[-1][1] == "error"
+    assert events[-1][2]["error_code"] == "busy"
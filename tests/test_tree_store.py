@@ -0,0 +1,49 @@
+# tests/test_tree_store.py
+# ============================================================
+# Migración de árboles .json -> .tree (tree_store.migrate_dir).
+# ============================================================
+
+import json
+
+from tree_store import encode_tree, load_tree, migrate_dir
+
+TREE = {"Hoja-1": {"causas": {"items": [{"id": "C1", "descripcion": "Causa"}]}, "objetivos": {"items": []}}}
+
+
+def _write_json(path, tree):
+    path.write_text(json.dumps(tree, ensure_ascii=False), encoding="utf-8")
+
+
+def test_converts_and_removes_json(tmp_path):
+    _write_json(tmp_path / "plantilla-a.json", TREE)
+
+    stats = migrate_dir(str(tmp_path))
+
+    assert stats["converted"] == 1
+    assert not (tmp_path / "plantilla-a.json").exists()
+    assert load_tree(str(tmp_path / "plantilla-a.tree")) == TREE
+
+
+def test_existing_identical_tree_removes_json(tmp_path):
+    _write_json(tmp_path / "plantilla-a.json", TREE)
+    (tmp_path / "plantilla-a.tree").write_bytes(encode_tree(TREE))
+
+    stats = migrate_dir(str(tmp_path))
+
+    assert stats["skipped"] == 1
+    assert not (tmp_path / "plantilla-a.json").exists()
+
+
+def test_existing_stale_or_corrupt_tree_keeps_json(tmp_path):
+    stale = {"Hoja-1": {"causas": {"items": []}, "objetivos": {"items": []}}}
+    _write_json(tmp_path / "plantilla-a.json", TREE)
+    (tmp_path / "plantilla-a.tree").write_bytes(encode_tree(stale))
+    _write_json(tmp_path / "plantilla-b.json", TREE)
+    (tmp_path / "plantilla-b.tree").write_bytes(b"no es un arbol")
+
+    stats = migrate_dir(str(tmp_path))
+
+    assert stats["conflicts"] == 2
+    assert stats["skipped"] == 0
+    assert (tmp_path / "plantilla-a.json").exists()
+    assert (tmp_path / "plantilla-b.json").exists()
@@ -0,0 +1,377 @@
+
+# tracing.py
+# ============================================================
+# Trazas por petición y perfilado bajo demanda:
+# - Spans anidados (ruta -> paso -> carga del libro -> hoja -> ronda del LLM -> .docx -> guardado)
+#   propagados con contextvars, también a los hilos de secciones y a la cola de trabajos
+# - Exportación a JSON propio o al formato Chrome trace (chrome://tracing, Perfetto)
+# - Perfilador por muestreo opcional: pila de los hilos de la petición cada PROFILE_INTERVAL_MS,
+#   volcada en formato "folded" (flamegraph.pl, speedscope)
+# - Sin traza activa cada span cuesta una lectura de ContextVar; el perfilador solo corre
+#   mientras haya peticiones perfiladas
+# - Las trazas terminadas se guardan en data/traces/ (compartidas entre workers)
+# ============================================================
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import hmac
+import uuid
+import random
+import logging
+import threading
+import contextvars
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Trace:
+    """Una petición trazada: sus spans, sus hilos activos y (si se perfila) las pilas muestreadas."""
+
+    def __init__(self, label: str, *, profile: bool = False, on_finish: Optional[Callable[["Trace"], None]] = None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.profile = profile
+        self.samples: Counter = Counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.threads: Dict[int, int] = {}  # ident -> nº de ejecuciones en curso dentro de la traza
+        self.thread_names: Dict[int, str] = {}
+        self._holds = 0
+        self._lock = threading.Lock()
+        self._on_finish = on_finish
+
+    # Una traza termina cuando la soltó la petición y todo el trabajo derivado (hilos, cola)
+    def hold(self) -> None:
+        with self._lock:
+            self._holds += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._holds -= 1
+            done = self._holds == 0
+        if done:
+            if self.profile:
+                _sampler.remove(self)
+            if self._on_finish is not None:
+                try:
+                    self._on_finish(self)
+                except Exception:
+                    logger.exception("No se pudo guardar la traza %s", self.id)
+
+    def enter_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            self.threads[ident] = self.threads.get(ident, 0) + 1
+            self.thread_names.setdefault(ident, threading.current_thread().name)
+
+    def exit_thread(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            n = self.threads.get(ident, 0) - 1
+            if n > 0:
+                self.threads[ident] = n
+            else:
+                self.threads.pop(ident, None)
+
+    def add_span(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(record)
+
+    # ---------- Exportación ----------
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+            samples = dict(self.samples)
+        return {
+            "id": self.id, "label": self.label, "pid": os.getpid(), "started_at": self.started_at,
+            "duration_ms": max((s["start_ms"] + s["duration_ms"] for s in spans), default=0.0),
+            "threads": {str(k): v for k, v in self.thread_names.items()},
+            "spans": spans,
+            "profile": {"interval_ms": _sampler.interval_s * 1000, "samples": samples} if self.profile else None,
+        }
+
+
+class Span:
+    __slots__ = ("trace", "parent", "name", "attrs", "activate", "id", "_start", "_token")
+
+    def __init__(self, trace: Trace, parent: Optional["Span"], name: str, attrs: Dict[str, Any], activate: bool = True):
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.activate = activate
+        self.id = uuid.uuid4().hex[:16]
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        self._token = _current.set(self) if self.activate else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                pass  # cerrado desde otro contexto (p. ej. al terminar una respuesta en streaming)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add_span({
+            "id": self.id, "parent": self.parent.id if self.parent else None, "name": self.name,
+            "thread": threading.get_ident(),
+            "start_ms": round((self._start - self.trace.t0) * 1000, 3),
+            "duration_ms": round((end - self._start) * 1000, 3),
+            "attrs": self.attrs,
+        })
+
+
+class _NoopSpan:
+    """Span sin traza activa: no mide ni guarda nada."""
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, *, activate: bool = True, **attrs):
+    """Span hijo del actual; sin traza activa devuelve un span vacío.
+
+    `activate=False` mide sin volverse el span actual (p. ej. dentro de un generador, que
+    comparte el contexto de quien lo itera).
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, parent, name, attrs, activate)
+
+
+def current_trace() -> Optional[Trace]:
+    parent = _current.get()
+    return parent.trace if parent is not None else None
+
+
+def bind(fn: Callable) -> Callable:
+    """Envuelve `fn` para ejecutarla en otro hilo dentro de la traza actual (o la deja igual si no hay)."""
+    parent = _current.get()
+    if parent is None:
+        return fn
+    trace = parent.trace
+    ctx = contextvars.copy_context()
+    trace.hold()
+
+    def run(*args, **kwargs):
+        trace.enter_thread()
+        try:
+            return ctx.run(fn, *args, **kwargs)
+        finally:
+            trace.exit_thread()
+            trace.release()
+    return run
+
+
+class RootSpan:
+    """Span raíz de una petición: activa la traza en el contexto actual y la suelta al salir."""
+
+    def __init__(self, trace: Trace, name: str, **attrs):
+        self.trace = trace
+        self.span = Span(trace, None, name, attrs)
+
+    def __enter__(self) -> Span:
+        self.trace.hold()
+        self.trace.enter_thread()
+        if self.trace.profile:
+            _sampler.add(self.trace)
+        return self.span.__enter__()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self.span.__exit__(exc_type, exc, tb)
+        finally:
+            self.trace.exit_thread()
+            self.trace.release()
+
+
+# -------------------------- Perfilador por muestreo --------------------------
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """Un hilo por proceso que muestrea las pilas de los hilos de las trazas perfiladas."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._traces: List[Trace] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.append(trace)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="trace-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, trace: Trace) -> None:
+        with self._lock:
+            if trace in self._traces:
+                self._traces.remove(trace)
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                traces = list(self._traces)
+                if not traces:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for trace in traces:
+                with trace._lock:
+                    threads = [(ident, trace.thread_names.get(ident, "?")) for ident in trace.threads if ident != me]
+                for ident, thread_name in threads:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(thread_name)
+                    with trace._lock:
+                        trace.samples[";".join(reversed(stack))] += 1
+            del frames
+            time.sleep(self.interval_s)
+
+
+_sampler = _Sampler(float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+
+
+# -------------------------- Exportación --------------------------
+def to_chrome_trace(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato Chrome trace (eventos completos "X" en microsegundos) a partir de to_json()."""
+    pid = data["pid"]
+    events: List[Dict[str, Any]] = [
+        {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": data["label"]}},
+    ]
+    for tid, name in data["threads"].items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": int(tid), "args": {"name": name}})
+    for s in data["spans"]:
+        events.append({
+            "name": s["name"], "cat": s["name"].split(".")[0], "ph": "X", "pid": pid, "tid": s["thread"],
+            "ts": round(s["start_ms"] * 1000, 1), "dur": round(s["duration_ms"] * 1000, 1), "args": s["attrs"],
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": data["id"]}}
+
+
+def to_folded(data: Dict[str, Any]) -> str:
+    """Pilas muestreadas en formato folded: "hilo;f1 (a.py:1);f2 (b.py:9) <muestras>" por línea."""
+    samples = (data.get("profile") or {}).get("samples") or {}
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(samples.items()))
+
+
+class TraceStore:
+    """Trazas terminadas en disco (una por archivo JSON); conserva las `keep` más recientes."""
+
+    def __init__(self, directory: str, *, keep: int = 200):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, trace_id: str) -> str:
+        return os.path.join(self.directory, f"{trace_id}.json")
+
+    def save(self, trace: Trace) -> None:
+        path = self._path(trace.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_json(), f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def load(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        if not trace_id.isalnum():
+            return None
+        try:
+            with open(self._path(trace_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        return sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        out = []
+        for entry in self._entries()[:limit]:
+            data = self.load(entry.name[:-len(".json")])
+            if data is not None:
+                out.append({k: data[k] for k in ("id", "label", "started_at", "duration_ms")}
+                           | {"spans": len(data["spans"]), "profiled": data["profile"] is not None})
+        return out
+
+    def _prune(self) -> None:
+        for entry in self._entries()[self.keep:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class Tracer:
+    """Decide qué peticiones se trazan/perfilan (cabecera o muestreo) y guarda lo terminado."""
+
+    def __init__(self, store: TraceStore, *, sample_rate: float = 0.0, profile_rate: float = 0.0, token: str = ""):
+        self.store = store
+        self.sample_rate = sample_rate
+        self.profile_rate = profile_rate
+        self.token = token
+
+    def start(self, label: str, headers) -> Optional[RootSpan]:
+        """RootSpan para la petición, o None (el caso habitual) si no toca trazarla.
+
+        Solo un operador puede forzarla: `X-Trace: <token>` / `X-Profile: <token>` con el
+        TRACE_TOKEN configurado. Sin token las cabeceras se ignoran y solo cuenta el muestreo.
+        Perfilar implica trazar.
+        """
+        profile = self._asked(headers.get("X-Profile")) or (self.profile_rate > 0 and random.random() < self.profile_rate)
+        traced = profile or self._asked(headers.get("X-Trace")) or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not traced:
+            return None
+        return RootSpan(Trace(label, profile=profile, on_finish=self.store.save), label)
+
+    def _asked(self, value: Optional[str]) -> bool:
+        if not value or not self.token:
+            return False
+        return hmac.compare_digest(value, self.token)
+
+
+def tracer_from_env(data_dir: str) -> Tracer:
+    return Tracer(
+        TraceStore(os.path.join(data_dir, "traces"), keep=int(os.getenv("TRACE_KEEP", "200"))),
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+        profile_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        token=os.getenv("TRACE_TOKEN", ""),
+    )
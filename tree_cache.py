@@ -0,0 +1,93 @@
+
+# tree_cache.py
+# ============================================================
+# Caché en memoria de árboles ya parseados (plantillas subidas):
+# - Llave = SHA-256 del contenido del .xlsx subido
+# - Acotada por bytes residentes (LRU) y con TTL
+# - En un fallo recurre al árbol en disco (.tree o JSON anterior) y lo deja en caché
+# ============================================================
+
+from __future__ import annotations
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils import load_tree_json
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _tree_nbytes(tree: Dict[str, Any]) -> int:
+    """Tamaño aproximado del árbol: bytes de su JSON compacto."""
+    return len(json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+class TreeCache:
+    """LRU de árboles por hash de contenido, acotado por bytes y con TTL."""
+
+    def __init__(self, *, max_bytes: int = 32 * 1024 * 1024, ttl_s: float = 2 * 3600):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._resident = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "disk_loads": 0, "evictions": 0}
+
+    def put(self, key: str, tree: Dict[str, Any]) -> None:
+        nbytes = _tree_nbytes(tree)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._resident -= old[1]
+            self._items[key] = (tree, nbytes, time.time())
+            self._resident += nbytes
+            while self._resident > self.max_bytes:
+                _, (_, n, _) = self._items.popitem(last=False)
+                self._resident -= n
+                self._stats["evictions"] += 1
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not key:
+            return None
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.time() - item[2] > self.ttl_s:
+                self._items.pop(key)
+                self._resident -= item[1]
+                self._stats["evictions"] += 1
+                item = None
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[0]
+
+    def get_or_load(self, key: Optional[str], json_path: str) -> Optional[Dict[str, Any]]:
+        """Árbol desde memoria; si no está, desde disco (y queda en caché)."""
+        tree = self.get(key)
+        if tree is not None:
+            return tree
+        tree = load_tree_json(json_path)
+        if tree is not None:
+            with self._lock:
+                self._stats["disk_loads"] += 1
+            if key:
+                self.put(key, tree)
+        return tree
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._items)
+            out["resident_bytes"] = self._resident
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
@@ -0,0 +1,166 @@
+
+# tree_model.py
+# ============================================================
+# Modelo compacto de los árboles de la plantilla (causas/efectos y objetivos/medios/fines):
+# - Nodos con __slots__ (sin dict por instancia); las hojas son tuplas (id, descripción)
+# - Índice global id de rama -> raíz: resolver a qué nodo pertenece una referencia es O(1)
+# - Las hojas que llegan antes que su rama (columnas I/J/K o J/K/L apuntando a una rama aún
+#   no declarada) esperan en un índice de huérfanas y se concilian en O(1) cuando la rama
+#   aparece; las que nunca se declaran se descartan, igual que el antiguo marcador "*"
+# - Una sola pasada por las filas: O(n) en total
+# - to_json() produce exactamente el esquema JSON de siempre
+# ============================================================
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class TreeSpec(NamedTuple):
+    """Forma de un bloque de la hoja: columnas y nombres de campo del JSON."""
+    tipo: str
+    directs: Tuple[str, ...]  # campos directos de la raíz, p. ej. ("efecto_directo",)
+    branches: str             # lista de ramas de la raíz, p. ej. "causas_indirectas"
+    leaves: str               # lista de hojas de cada rama, p. ej. "efectos_indirectos"
+
+    @property
+    def branch_col(self) -> int:
+        # Raíz: id, descripción, directos | separador | rama: padre, id, descripción
+        return len(self.directs) + 3
+
+    @property
+    def leaf_col(self) -> int:
+        # ... | separador | hoja: id de la rama, id, descripción
+        return self.branch_col + 4
+
+    @property
+    def width(self) -> int:
+        return self.leaf_col + 3
+
+
+# Causas: A,B,C | D (sep) | E,F,G (CI) | H (sep) | I,J,K (Efectos Indirectos)
+CAUSAS_SPEC = TreeSpec("causas", ("efecto_directo",), "causas_indirectas", "efectos_indirectos")
+# Objetivos: A,B,C,D | E (sep) | F,G,H (MI) | I (sep) | J,K,L (Fines Indirectos)
+OBJETIVOS_SPEC = TreeSpec("objetivos", ("medio_directo", "fin_directo"), "medios_indirectos", "fines_indirectos")
+
+
+class Branch:
+    """Causa indirecta / medio indirecto con sus hojas (efectos / fines indirectos)."""
+    __slots__ = ("id", "descripcion", "leaves")
+
+    def __init__(self, id: str, descripcion: Optional[str]):
+        self.id = id
+        self.descripcion = descripcion
+        self.leaves: List[Tuple[str, Optional[str]]] = []
+
+
+class Root:
+    """Causa / objetivo: descripción, campos directos y ramas en orden de aparición."""
+    __slots__ = ("id", "descripcion", "directs", "branches")
+
+    def __init__(self, id: str, descripcion: Optional[str], directs: Tuple[Optional[str], ...]):
+        self.id = id
+        self.descripcion = descripcion
+        self.directs = directs
+        self.branches: Dict[str, Branch] = {}
+
+    def has_content(self) -> bool:
+        return bool(self.descripcion or any(self.directs) or self.branches)
+
+
+def _cell(v) -> Optional[str]:
+    return str(v).strip() if v else None
+
+
+def _num_from_id(id_str: str) -> int:
+    """Convierte ID tipo 'C1' o 'O3' a número para ordenar de forma estable."""
+    if not id_str:
+        return 999999
+    digits = ''.join(ch for ch in id_str if ch.isdigit())
+    return int(digits) if digits else 999999
+
+
+class Tree:
+    """Árbol de un bloque (causas u objetivos) construido fila a fila."""
+    __slots__ = ("spec", "roots", "parent_of", "orphans", "_cols")
+
+    def __init__(self, spec: TreeSpec):
+        self.spec = spec
+        self.roots: Dict[str, Root] = {}
+        # Índice global: id de rama -> id de su raíz (la última declaración manda)
+        self.parent_of: Dict[str, str] = {}
+        # Hojas cuya rama aún no se ha declarado, por id de rama
+        self.orphans: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        self._cols = (spec.width, len(spec.directs), spec.branch_col, spec.leaf_col)
+
+    def add_row(self, row: tuple) -> None:
+        width, nd, b, f = self._cols
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+
+        if row[0]:
+            root_id = str(row[0]).strip()
+            if root_id not in self.roots:
+                self.roots[root_id] = Root(root_id, _cell(row[1]), tuple(_cell(v) for v in row[2:2 + nd]))
+
+        parent, branch_id = row[b], row[b + 1]
+        if parent and branch_id:
+            parent, branch_id = str(parent).strip(), str(branch_id).strip()
+        if parent and branch_id:
+            branch_desc = _cell(row[b + 2])
+            root = self.roots.get(parent)
+            if root is None:
+                root = self.roots[parent] = Root(parent, None, (None,) * nd)
+            branch = root.branches.get(branch_id)
+            if branch is None:
+                branch = root.branches[branch_id] = Branch(branch_id, branch_desc)
+            elif branch_desc:
+                branch.descripcion = branch_desc
+            self.parent_of[branch_id] = parent
+            pending = self.orphans.pop(branch_id, None)
+            if pending:
+                branch.leaves.extend(pending)
+
+        ref, leaf_id = row[f], row[f + 1]
+        if ref and leaf_id:
+            ref, leaf_id = str(ref).strip(), str(leaf_id).strip()
+        if ref and leaf_id:
+            leaf = (leaf_id, _cell(row[f + 2]))
+            parent = self.parent_of.get(ref)
+            if parent is not None:
+                self.roots[parent].branches[ref].leaves.append(leaf)
+            else:
+                self.orphans.setdefault(ref, []).append(leaf)
+
+    def to_json(self) -> Dict[str, Any]:
+        """Mismo esquema (y orden de claves) que los parsers anteriores; las huérfanas no salen.
+
+        Consume el árbol: cada raíz se libera al convertirla, así el pico de memoria no suma
+        el modelo completo más el JSON completo.
+        """
+        spec = self.spec
+        roots = [r for r in self.roots.values() if r.id != "*" and r.has_content()]
+        self.roots.clear()
+        self.parent_of.clear()
+        self.orphans.clear()
+        roots.sort(key=lambda r: (_num_from_id(r.id), r.id))
+        roots.reverse()
+        items = []
+        while roots:
+            r = roots.pop()
+            item: Dict[str, Any] = {"id": r.id, "descripcion": r.descripcion}
+            for name, desc in zip(spec.directs, r.directs):
+                item[name] = {"descripcion": desc}
+            item[spec.branches] = [
+                {"id": b.id, "descripcion": b.descripcion,
+                 spec.leaves: [{"id": lid, "descripcion": ldesc} for lid, ldesc in b.leaves]}
+                for b in r.branches.values()
+            ]
+            items.append(item)
+        return {"tipo": spec.tipo, "items": items}
+
+
+def build_tree(rows: Iterable[tuple], spec: TreeSpec) -> Dict[str, Any]:
+    tree = Tree(spec)
+    for row in rows:
+        tree.add_row(row)
+    return tree.to_json()
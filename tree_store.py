@@ -0,0 +1,241 @@
+
+# tree_store.py
+# ============================================================
+# Almacenamiento en disco de los árboles parseados de las plantillas:
+# - Formato binario compacto (.tree): cabecera con firma, versión de esquema y códec,
+#   seguida del JSON compacto comprimido (zstd si está instalado, si no zlib)
+# - orjson (opcional) acelera la (de)serialización del JSON compacto
+# - Lectura transparente de los .json anteriores (UTF-8 con BOM, indentados)
+# - El formato de escritura se elige con TREE_STORE_FORMAT (tree | json)
+# - Migración de una carpeta de .json al formato binario
+#
+# Uso: python tree_store.py migrate [--dir static/formularios_json] [--keep-json] [--dry-run]
+# ============================================================
+
+from __future__ import annotations
+import os
+import json
+import zlib
+import struct
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # opcional: pip install zstandard
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:  # opcional: pip install orjson (decodifica ~2x más rápido, mismos bytes)
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IDTREE"
+SCHEMA_VERSION = 1
+TREE_EXT = ".tree"
+JSON_EXT = ".json"
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_NAMES = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+
+# Cabecera: firma (6 bytes) | versión de esquema (u8) | códec (u8) | tamaño sin comprimir (u32, big-endian)
+_HEADER = struct.Struct(">6sBBI")
+
+
+class TreeFormatError(ValueError):
+    """Archivo .tree con firma, versión o códec desconocidos."""
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(codec: int, data: bytes, size: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise TreeFormatError("El árbol está comprimido con zstd y 'zstandard' no está instalado")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_NONE:
+        return data
+    raise TreeFormatError(f"Códec desconocido: {codec}")
+
+
+def default_codec() -> int:
+    name = os.getenv("TREE_STORE_CODEC", "auto").lower()
+    if name == "auto":
+        return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+    if name not in CODEC_NAMES:
+        raise ValueError(f"TREE_STORE_CODEC desconocido: {name}")
+    if name == "zstd" and zstandard is None:
+        logger.warning("TREE_STORE_CODEC=zstd pero 'zstandard' no está instalado; se usa zlib")
+        return CODEC_ZLIB
+    return CODEC_NAMES[name]
+
+
+def _dumps_compact(tree: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(tree)
+    return json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def encode_tree(tree: Dict[str, Any], *, codec: Optional[int] = None) -> bytes:
+    codec = default_codec() if codec is None else codec
+    raw = _dumps_compact(tree)
+    return _HEADER.pack(MAGIC, SCHEMA_VERSION, codec, len(raw)) + _compress(codec, raw)
+
+
+def decode_tree(data: bytes) -> Dict[str, Any]:
+    """Decodifica un .tree; si no lleva la firma se interpreta como JSON anterior (con o sin BOM)."""
+    if not data.startswith(MAGIC):
+        return json.loads(data.decode("utf-8-sig"))
+    if len(data) < _HEADER.size:
+        raise TreeFormatError("Cabecera incompleta")
+    _, version, codec, size = _HEADER.unpack_from(data)
+    if version > SCHEMA_VERSION:
+        raise TreeFormatError(f"Versión de esquema {version} no soportada (máximo {SCHEMA_VERSION})")
+    return _loads(_decompress(codec, data[_HEADER.size:], size))
+
+
+# -------------------------- Archivos --------------------------
+def _write_atomic(path: str, data: bytes) -> None:
+    # Escritura atómica: un lector concurrente nunca ve un archivo a medio escribir
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode_legacy_json(tree: Dict[str, Any]) -> bytes:
+    return json.dumps(tree, ensure_ascii=False, indent=2).encode("utf-8-sig")
+
+
+# Escritores por formato (TREE_STORE_FORMAT): extensión y serializador
+WRITERS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], bytes]]] = {
+    "tree": (TREE_EXT, encode_tree),
+    "json": (JSON_EXT, _encode_legacy_json),
+}
+
+
+def save_tree(tree: Dict[str, Any], out_dir: str, base_filename: str, *, fmt: Optional[str] = None) -> str:
+    fmt = (fmt or os.getenv("TREE_STORE_FORMAT", "tree")).lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"TREE_STORE_FORMAT desconocido: {fmt}")
+    ext, encode = WRITERS[fmt]
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"{base_filename}{ext}")
+    _write_atomic(out_path, encode(tree))
+    return out_path
+
+
+def resolve_tree_path(path: str) -> Optional[str]:
+    """La ruta tal cual, o su gemela .tree/.json (p. ej. una sesión que guardó la ruta .json antes de migrar)."""
+    if os.path.exists(path):
+        return path
+    stem, ext = os.path.splitext(path)
+    for alt in (TREE_EXT, JSON_EXT):
+        if alt != ext and os.path.exists(stem + alt):
+            return stem + alt
+    return None
+
+
+def find_tree(out_dir: str, base_filename: str) -> Optional[str]:
+    """Árbol guardado para esa plantilla: primero el binario, luego el JSON anterior."""
+    return resolve_tree_path(os.path.join(out_dir, f"{base_filename}{TREE_EXT}"))
+
+
+def load_tree(path: str) -> Optional[Dict[str, Any]]:
+    resolved = resolve_tree_path(path)
+    if resolved is None:
+        return None
+    try:
+        with open(resolved, "rb") as f:
+            return decode_tree(f.read())
+    except Exception:
+        logger.exception("No se pudo leer el árbol %s", resolved)
+        return None
+
+
+# -------------------------- Migración --------------------------
+def _same_tree(path: str, tree: Dict[str, Any]) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return decode_tree(f.read()) == tree
+    except Exception:
+        return False
+
+
+def migrate_dir(directory: str, *, keep_json: bool = False, dry_run: bool = False) -> Dict[str, int]:
+    """Convierte cada .json de la carpeta a .tree, verificando que se lea igual antes de borrar el original.
+    Si ya existe el .tree, el .json solo se borra cuando ese .tree contiene el mismo árbol."""
+    stats = {"converted": 0, "skipped": 0, "conflicts": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(JSON_EXT):
+            continue
+        src = os.path.join(directory, name)
+        dst = os.path.join(directory, name[:-len(JSON_EXT)] + TREE_EXT)
+        try:
+            with open(src, "rb") as f:
+                raw = f.read()
+            tree = json.loads(raw.decode("utf-8-sig"))
+            data = encode_tree(tree)
+            if decode_tree(data) != tree:
+                raise TreeFormatError("La verificación de ida y vuelta no coincide")
+        except Exception as e:
+            logger.error("Migración: %s no se pudo convertir (%s)", name, e)
+            stats["failed"] += 1
+            continue
+        if os.path.exists(dst):
+            if not _same_tree(dst, tree):
+                # El .tree existente está dañado o es otro árbol: no se pierde el .json
+                logger.warning("Migración: %s no coincide con %s; se conserva el .json",
+                               os.path.basename(dst), name)
+                stats["conflicts"] += 1
+                continue
+            stats["skipped"] += 1
+        else:
+            if not dry_run:
+                _write_atomic(dst, data)
+            stats["converted"] += 1
+            stats["bytes_before"] += len(raw)
+            stats["bytes_after"] += len(data)
+        if not keep_json and not dry_run:
+            os.remove(src)
+    return stats
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Almacén de árboles de plantillas.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="Convertir los .json de una carpeta al formato .tree")
+    mig.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "formularios_json"))
+    mig.add_argument("--keep-json", action="store_true", help="Conservar los .json originales")
+    mig.add_argument("--dry-run", action="store_true", help="Solo informar, sin escribir ni borrar")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    stats = migrate_dir(args.dir, keep_json=args.keep_json, dry_run=args.dry_run)
+    before, after = stats["bytes_before"], stats["bytes_after"]
+    print(f"{'Se convertirían' if args.dry_run else 'Convertidos'} {stats['converted']} árbol(es) "
+          f"({stats['skipped']} ya tenían .tree, {stats['conflicts']} con un .tree distinto, "
+          f"{stats['failed']} con error): "
+          f"{before / 1024:.1f} KiB -> {after / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,16 +14,36 @@ import os
 import re
 import json
 import time
-from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import atexit
+import threading
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Iterator, Optional, Tuple
 from io import BytesIO
 
 from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_BREAK
+from docx.enum.text import WD_ALIGN_PARAGRAPH
 from openpyxl import load_workbook
 from datetime import datetime
 import pandas as pd
 
+from llm_cache import completion_key
+from llm_transport import call_deadline
+from metrics import (
+    DOCX_SECONDS, LLM_CACHE_HITS, LLM_CONTINUATIONS, LLM_ERRORS, LLM_FINISH, LLM_SECONDS, LLM_TOKENS,
+    PARSE_SECONDS, WORKBOOK_SHEETS,
+)
+from markdown_docx import render_markdown
+from prompt_budget import PromptPart, budget_from_env, count_tokens
+from tree_model import CAUSAS_SPEC, OBJETIVOS_SPEC, build_tree
+from tracing import bind, span
+from tree_store import find_tree, load_tree, save_tree
+
+logger = logging.getLogger(__name__)
+
 # Fecha actual
 fecha = datetime.now()
 meses = {
@@ -47,6 +67,44 @@ Contexto fijo:
 """
 
 # -------------------------- LLM helper --------------------------
+class DeadlineExceeded(TimeoutError):
+    """Se agotó el plazo total de una llamada al LLM (incluidas sus continuaciones)."""
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """Plazo absoluto (time.monotonic) a partir de una duración; None o <= 0 = sin plazo."""
+    return time.monotonic() + seconds if seconds and seconds > 0 else None
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    """Segundos que quedan antes del plazo; lanza DeadlineExceeded si ya venció."""
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Se agotó el tiempo de espera de la respuesta del modelo")
+    return left
+
+
+def _timeout_kwargs(deadline: Optional[float]) -> Dict[str, float]:
+    left = _remaining(deadline)
+    return {} if left is None else {"timeout": left}
+
+
+def _without_sdk_retries(client, deadline: Optional[float]):
+    """Con plazo, el SDK no reintenta: cada reintento volvería a empezar su timeout."""
+    if deadline is None or not getattr(client, "max_retries", 0):
+        return client
+    return client.with_options(max_retries=0)
+
+
+def _as_deadline(error: Exception, deadline: Optional[float]) -> Exception:
+    """El corte por plazo llega como timeout o error de lectura de httpx: se informa como DeadlineExceeded."""
+    if deadline is None or isinstance(error, DeadlineExceeded) or time.monotonic() < deadline:
+        return error
+    return DeadlineExceeded(f"Se agotó el plazo de la llamada al LLM ({type(error).__name__})")
+
+
 def ask_markdown_azure(
     messages: List[Dict[str, str]],
     *,
@@ -55,9 +113,17 @@ def ask_markdown_azure(
     max_tokens: int = 1800,
     temperature: float = 0.4,
     max_rounds: int = 3,
-    use_primer = True
+    use_primer = True,
+    cache = None,
+    use_cache: bool = True,
+    deadline: Optional[float] = None,
+    site: str = "otro"
 ) -> str:
-    """Envía mensajes a Azure OpenAI y concatena si se corta por longitud."""
+    """Envía mensajes a Azure OpenAI y concatena si se corta por longitud.
+    Con `cache` (CompletionCache) reutiliza respuestas idénticas; `use_cache=False` lo omite por llamada.
+    `deadline` (ver deadline_after) acota el tiempo total, continuaciones incluidas.
+    `site` identifica el punto de llamada en las métricas (tokens, finish_reason, latencia).
+    """
     full_text, rounds = "", 0
     _messages = list(messages)
     if use_primer:
@@ -65,72 +131,165 @@ def ask_markdown_azure(
         _messages = [sys] + _messages
     if model_name is None:
         model_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    key = None
+    if cache is not None and use_cache:
+        key = _cache_key(model_name, _messages, temperature, max_tokens, use_primer)
+        cached = cache.get(key)
+        if cached is not None:
+            LLM_CACHE_HITS.inc(site=site)
+            return cached
+    client = _without_sdk_retries(client, deadline)
     while rounds < max_rounds:
         rounds += 1
-        resp = client.chat.completions.create(
-            model=model_name, messages=_messages, temperature=temperature, max_tokens=max_tokens
-        )
-        choice = resp.choices[0]
-        chunk = (choice.message.content or "").strip()
-        full_text += chunk
-        finish = getattr(choice, "finish_reason", None)
+        if rounds > 1:
+            LLM_CONTINUATIONS.inc(site=site)
+        timeout_kwargs = _timeout_kwargs(deadline)
+        t0 = time.perf_counter()
+        with span("llm.ronda", site=site, round=rounds) as sp:
+            try:
+                with call_deadline(deadline):
+                    resp = client.chat.completions.create(
+                        model=model_name, messages=_messages, temperature=temperature, max_tokens=max_tokens,
+                        **timeout_kwargs
+                    )
+            except Exception as e:
+                error = _as_deadline(e, deadline)
+                LLM_ERRORS.inc(site=site, error=type(error).__name__)
+                if error is e:
+                    raise
+                raise error from e
+            finally:
+                LLM_SECONDS.observe(time.perf_counter() - t0, site=site)
+            choice = resp.choices[0]
+            chunk = (choice.message.content or "").strip()
+            full_text += chunk
+            finish = getattr(choice, "finish_reason", None)
+            _record_round(site, finish, getattr(resp, "usage", None), sp)
         if finish not in ("length", "content_filter"):
             break
         _messages += [
             {"role": "assistant", "content": chunk},
             {"role": "user", "content": "Por favor continúa exactamente donde te quedaste."},
         ]
+    if key is not None:
+        cache.set(key, full_text)
     return full_text
 
 
-# -------------------------- DOCX helpers --------------------------
-def _add_rich_text(paragraph, text: str) -> None:
-    """Aplica **negrita**, *itálica*, `monoespaciado` y [enlaces](url) simple dentro de un párrafo."""
-    # Procesar enlaces primero: [texto](url) -> texto (url)
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1 (\2)', text)
-    
-    # Procesar texto con negrita, itálica y monoespaciado
-    token_re = re.compile(r'(\*\*.+?\*\*|\*.+?\*|`.+?`)')
-    parts = token_re.split(text)
-    for part in parts:
-        if not part:
-            continue
-        if part.startswith("**") and part.endswith("**"):
-            run = paragraph.add_run(part[2:-2])
-            run.bold = True
-        elif part.startswith("*") and part.endswith("*"):
-            run = paragraph.add_run(part[1:-1])
-            run.italic = True
-        elif part.startswith("`") and part.endswith("`"):
-            run = paragraph.add_run(part[1:-1])
-            run.font.name = "Courier New"
-            run.font.size = Pt(10)
-        else:
-            paragraph.add_run(part)
-
-
-def _add_markdown_line(doc, line: str) -> None:
-    """Convierte una línea de Markdown muy simple a estructuras de docx.
-    Soporta #, ##, ###, ####; listas numeradas y con viñetas.
+def _cache_key(model_name, messages, temperature, max_tokens, use_primer) -> str:
+    return completion_key(
+        model=model_name, messages=messages, temperature=temperature,
+        max_tokens=max_tokens, primer=SYSTEM_PRIMER if use_primer else "",
+    )
+
+
+def _record_round(site: str, finish: Optional[str], usage, sp) -> None:
+    """Métricas de una ronda: finish_reason y tokens de resp.usage (si vienen); también en su span."""
+    LLM_FINISH.inc(site=site, reason=finish or "desconocido")
+    sp.set(finish_reason=finish)
+    if usage is not None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        LLM_TOKENS.inc(prompt_tokens, site=site, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, site=site, kind="completion")
+        sp.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def stream_markdown_azure(
+    messages: List[Dict[str, str]],
+    *,
+    client,
+    model_name: Optional[str] = None,
+    max_tokens: int = 1800,
+    temperature: float = 0.4,
+    max_rounds: int = 3,
+    use_primer = True,
+    cache = None,
+    use_cache: bool = True,
+    deadline: Optional[float] = None,
+    site: str = "otro"
+) -> Iterator[str]:
+    """Versión en streaming de ask_markdown_azure: entrega fragmentos apenas llegan.
+    Las rondas de continuación (finish_reason == "length") se empalman en el mismo flujo y
+    la concatenación de los fragmentos es idéntica al texto que devolvería ask_markdown_azure.
+    Comparte la caché con ask_markdown_azure: un acierto se entrega como un único fragmento.
+    Con `deadline` el flujo se corta (DeadlineExceeded) al vencer el plazo, aunque el servidor siga enviando bytes;
+    el stream se cierra también si quien itera abandona el generador.
     """
-    s = line.strip()
-    if not s:
-        return
-    if s == '---':
-        p = doc.add_paragraph(); p.add_run().add_break(WD_BREAK.LINE); return
-    if s.startswith('#### '):
-        doc.add_heading(s[5:], level=4); return
-    if s.startswith('### '):
-        doc.add_heading(s[4:], level=3); return
-    if s.startswith('## '):
-        doc.add_heading(s[3:], level=2); return
-    if s.startswith('# '):
-        doc.add_heading(s[2:], level=1); return
-    if re.match(r'^\d+\.\s', s):
-        p = doc.add_paragraph(style='List Number'); _add_rich_text(p, re.sub(r'^\d+\.\s', '', s, 1)); return
-    if s.startswith('- ') or s.startswith('* '):
-        p = doc.add_paragraph(style='List Bullet'); _add_rich_text(p, s[2:]); return
-    p = doc.add_paragraph(); _add_rich_text(p, s)
+    rounds = 0
+    _messages = list(messages)
+    if use_primer:
+        sys = {"role": "system", "content": SYSTEM_PRIMER + "\nResponde en Markdown válido."}
+        _messages = [sys] + _messages
+    if model_name is None:
+        model_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    key, full_text = None, ""
+    if cache is not None and use_cache:
+        key = _cache_key(model_name, _messages, temperature, max_tokens, use_primer)
+        cached = cache.get(key)
+        if cached is not None:
+            LLM_CACHE_HITS.inc(site=site)
+            yield cached
+            return
+    client = _without_sdk_retries(client, deadline)
+    while rounds < max_rounds:
+        rounds += 1
+        if rounds > 1:
+            LLM_CONTINUATIONS.inc(site=site)
+        round_text, pending_ws, finish, usage = "", "", None, None
+        timeout_kwargs = _timeout_kwargs(deadline)
+        t0 = time.perf_counter()
+        # Sin activar: el generador comparte el contexto de quien lo itera
+        with span("llm.ronda", activate=False, site=site, round=rounds, stream=True) as sp:
+            events = None
+            try:
+                with call_deadline(deadline):
+                    events = client.chat.completions.create(
+                        model=model_name, messages=_messages, temperature=temperature, max_tokens=max_tokens,
+                        stream=True, **timeout_kwargs
+                    )
+                for event in events:
+                    _remaining(deadline)
+                    # Solo llega si el despliegue envía el uso en streaming (último evento, sin choices)
+                    usage = getattr(event, "usage", None) or usage
+                    if not event.choices:  # Azure envía primero los resultados del filtro de contenido
+                        continue
+                    choice = event.choices[0]
+                    finish = choice.finish_reason or finish
+                    delta = (choice.delta.content if choice.delta else None) or ""
+                    if not round_text:
+                        delta = delta.lstrip()
+                    if not delta:
+                        continue
+                    # Igual que .strip() por ronda: el espacio final se retiene hasta ver más texto
+                    body = delta.rstrip()
+                    if not body:
+                        pending_ws += delta
+                        continue
+                    out = pending_ws + body
+                    pending_ws = delta[len(body):]
+                    round_text += out
+                    yield out
+            except Exception as e:
+                error = _as_deadline(e, deadline)
+                LLM_ERRORS.inc(site=site, error=type(error).__name__)
+                if error is e:
+                    raise
+                raise error from e
+            finally:
+                if events is not None:
+                    getattr(events, "close", lambda: None)()
+                LLM_SECONDS.observe(time.perf_counter() - t0, site=site)
+            _record_round(site, finish, usage, sp)
+        full_text += round_text
+        if finish not in ("length", "content_filter"):
+            break
+        _messages += [
+            {"role": "assistant", "content": round_text},
+            {"role": "user", "content": "Por favor continúa exactamente donde te quedaste."},
+        ]
+    if key is not None:
+        cache.set(key, full_text)
 
 
 def _filtered_responses_for_report(responses: dict) -> dict:
@@ -139,7 +298,19 @@ def _filtered_responses_for_report(responses: dict) -> dict:
 
 
 # -------------------------- Árbol -> Outline para prompt --------------------------
-def causas_tree_to_outline(tree: Dict[str, Any]) -> str:
+# Niveles de detalle del outline (para ajustarlo al presupuesto de tokens); lo que se omite
+# queda resumido con su cantidad para que el modelo sepa que existe
+OUTLINE_FULL = 3      # todo el árbol
+OUTLINE_BRANCHES = 2  # sin hojas (efectos / fines indirectos)
+OUTLINE_DIRECTS = 1   # sin ramas (causas / medios indirectos)
+OUTLINE_ROOTS = 0     # solo las causas / objetivos
+
+
+def _plural(n: int, singular: str, plural: str) -> str:
+    return f"{n} {singular if n == 1 else plural}"
+
+
+def causas_tree_to_outline(tree: Dict[str, Any], *, depth: int = OUTLINE_FULL) -> str:
     """Devuelve un outline sin códigos (C1, CI1, etc.)."""
     if not tree or not tree.get("items"): 
         return "(sin causas)"
@@ -148,20 +319,29 @@ def causas_tree_to_outline(tree: Dict[str, Any]) -> str:
         cdesc = (c.get("descripcion") or "").strip()
         edesc = ((c.get("efecto_directo") or {}).get("descripcion") or "").strip()
         lines.append(f"Causa: {cdesc}")
+        if depth < OUTLINE_DIRECTS:
+            continue
         if edesc:
             lines.append(f"Efecto directo: {edesc}")
         cis = c.get("causas_indirectas", [])
-        if cis:
+        if cis and depth < OUTLINE_BRANCHES:
+            lines.append(f"Causas indirectas: {_plural(len(cis), 'causa indirecta', 'causas indirectas')} (detalle omitido)")
+        elif cis:
             lines.append("Causas indirectas:")
             for ci in cis:
                 cidesc = (ci.get("descripcion") or "").strip()
+                eis = ci.get("efectos_indirectos", [])
+                if depth < OUTLINE_FULL:
+                    suffix = f" ({_plural(len(eis), 'efecto indirecto', 'efectos indirectos')})" if eis else ""
+                    lines.append(f"  a) {cidesc}{suffix}")
+                    continue
                 lines.append(f"  a) {cidesc}")
-                for ei in ci.get("efectos_indirectos", []):
+                for ei in eis:
                     lines.append(f"     * Efecto indirecto: {(ei.get('descripcion') or '').strip()}")
     return "\n".join(lines)
 
 
-def objetivos_tree_to_outline(tree: Dict[str, Any]) -> str:
+def objetivos_tree_to_outline(tree: Dict[str, Any], *, depth: int = OUTLINE_FULL) -> str:
     """Devuelve un outline sin códigos (O1, MI1, etc.)."""
     if not tree or not tree.get("items"): 
         return "(sin objetivos)"
@@ -171,37 +351,409 @@ def objetivos_tree_to_outline(tree: Dict[str, Any]) -> str:
         md = ((o.get("medio_directo") or {}).get("descripcion") or "").strip()
         fd = ((o.get("fin_directo") or {}).get("descripcion") or "").strip()
         lines.append(f"Objetivo: {odesc}")
+        if depth < OUTLINE_DIRECTS:
+            continue
         if md: lines.append(f"Medio directo: {md}")
         if fd: lines.append(f"Fin directo: {fd}")
         mis = o.get("medios_indirectos", [])
-        if mis:
+        if mis and depth < OUTLINE_BRANCHES:
+            lines.append(f"Medios indirectos: {_plural(len(mis), 'medio indirecto', 'medios indirectos')} (detalle omitido)")
+        elif mis:
             lines.append("Medios indirectos y fines:")
             for mi in mis:
                 midesc = (mi.get("descripcion") or "").strip()
+                fis = mi.get("fines_indirectos", [])
+                if depth < OUTLINE_FULL:
+                    suffix = f" ({_plural(len(fis), 'fin indirecto', 'fines indirectos')})" if fis else ""
+                    lines.append(f"  a) {midesc}{suffix}")
+                    continue
                 lines.append(f"  a) {midesc}")
-                for fi in mi.get("fines_indirectos", []):
+                for fi in fis:
                     lines.append(f"     * Fin indirecto: {(fi.get('descripcion') or '').strip()}")
     return "\n".join(lines)
 
 
-# -------------------------- Carga/guardado JSON --------------------------
+# -------------------------- Carga/guardado de árboles --------------------------
+# Formato binario compacto (.tree) o JSON anterior según TREE_STORE_FORMAT; la lectura acepta ambos
 def load_tree_json(path: str) -> Optional[Dict[str, Any]]:
-    try:
-        with open(path, "r", encoding="utf-8-sig") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    return load_tree(path)
 
 
-def save_tree_json(tree: Dict[str, Any], out_dir: str, base_filename: str, *, encoding: str = "utf-8-sig") -> str:
-    os.makedirs(out_dir, exist_ok=True)
-    out_path = os.path.join(out_dir, f"{base_filename}.json")
-    with open(out_path, "w", encoding=encoding) as f:
-        json.dump(tree, f, ensure_ascii=False, indent=2)
-    return out_path
+def save_tree_json(tree: Dict[str, Any], out_dir: str, base_filename: str) -> str:
+    with span("arbol.guardar"):
+        return save_tree(tree, out_dir, base_filename)
 
 
 # -------------------------- Generación de documento --------------------------
+# Orden obligatorio de secciones: (título, instrucción específica)
+DOC_SECTIONS: List[Tuple[str, str]] = [
+    ("Introducción", "Presenta el proyecto, su propósito y el contexto general."),
+    ("Planteamiento del problema u oportunidad", "Describe el problema u oportunidad con datos del usuario y cifras estimadas cuando falten."),
+    ("Localización", "Describe la ubicación del proyecto y la población involucrada."),
+    ("Marco del problema: Causas y efectos", "Para cada causa, usa '### Causa' con una explicación; luego '#### Efecto directo' y '#### Causas indirectas'."),
+    ("Marco de objetivos: Medios y fines", "Usa '### Objetivo', '#### Medio directo', '#### Fin directo' y '#### Medios indirectos'."),
+    ("Componentes del proyecto", "Enumera los componentes seleccionados por el usuario y explica brevemente su papel."),
+    ("Cadena de valor", "Relaciona productos, actividades e insumos con los objetivos del proyecto."),
+    ("Conclusión y justificación final", "Resume los hallazgos clave y cierra con una conclusión justificativa del proyecto."),
+]
+
+DOC_SECTION_CONCURRENCY = int(os.getenv("DOC_SECTION_CONCURRENCY", "4"))
+DOC_SECTION_MAX_TOKENS = int(os.getenv("DOC_SECTION_MAX_TOKENS", "1500"))
+DOC_SECTION_ATTEMPTS = 2
+
+_DOC_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PRIMER + "\nResponde exclusivamente en Markdown válido."}
+_LEADING_HEADING_RE = re.compile(r"^\s*#{1,2}\s+[^\n]*\n?")
+
+
+# Presupuesto de tokens del contexto compartido (DOC_PROMPT_BUDGET); cada sección suma su tarea
+# (~100 tokens) y su salida (DOC_SECTION_MAX_TOKENS)
+DOC_PROMPT = budget_from_env()
+_CLIP_CHARS = 300
+
+_CONTEXT_HEAD = (
+    "Eres un experto en formulación de proyectos bajo la Metodología General Ajustada (MGA) del Departamento Nacional de Planeación en Colombia (DNP). "
+    "Redacta en ESPAÑOL y devuelve el contenido en Markdown estructurado con ### y #### (sin códigos C1/O1 visibles ni siglas sin desarrollar). "
+    "El sistema convertirá luego a Word con títulos y estilos formales.\n\n"
+    "El documento completo tiene estas secciones, en este orden:\n"
+    + "".join(f"## {title}\n" for title, _ in DOC_SECTIONS) + "\n"
+    "INSTRUCCIONES GENERALES:\n"
+    "- Integra los datos del usuario y los árboles provistos.\n"
+    "- No uses siglas ni abreviaturas: escribe los nombres completos de las entidades (por ejemplo, 'Ministerio de Educación Nacional' en lugar de 'MinEducación').\n"
+    "- Mantén coherencia narrativa entre el problema y los objetivos.\n"
+    "- Todo el cuerpo del texto debe estar con alineación justificada.\n\n"
+)
+_CONTEXT_TAIL = (
+    "RECUERDA: No incluyas códigos como C1, CI1, O1, MI1 en los títulos ni en el texto. "
+    "Verifica consistencia numérica y define términos confusos. "
+    "En caso de que no te den algunos datos, pero lo puedas conseguir en internet colocalos y referencialos. Por ejemplo, la cantidad de habitantes de alguna zona, si te dan especificaciones de dónde está la pobklación y quiénes son, puedes buscar en tu base de datos o en internet para averiguar qué numero puede ser, estimandolo"
+)
+_OUTLINE_VARIANTS = (("completo", OUTLINE_FULL), ("sin hojas", OUTLINE_BRANCHES),
+                     ("sin ramas", OUTLINE_DIRECTS), ("solo raíces", OUTLINE_ROOTS))
+
+
+def _clip_values(value: Any, limit: int = _CLIP_CHARS) -> Any:
+    """Recorta los textos largos de las respuestas (p. ej. descripciones pegadas de otro documento)."""
+    if isinstance(value, str):
+        return value if len(value) <= limit else value[:limit].rstrip() + "…"
+    if isinstance(value, dict):
+        return {k: _clip_values(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clip_values(v, limit) for v in value]
+    return value
+
+
+def _outline_part(name: str, header: str, to_outline, tree: Optional[Dict[str, Any]], empty: str) -> PromptPart:
+    def render(depth: int) -> Callable[[], str]:
+        return lambda: header + (to_outline(tree, depth=depth) if tree else empty)
+    return PromptPart(name, 2, [(label, render(depth)) for label, depth in _OUTLINE_VARIANTS])
+
+
+def _briefs_part(briefs: List[Tuple[str, str]]) -> PromptPart:
+    header = "Componentes seleccionados (resumen por componente):\n"
+    if not briefs:
+        return PromptPart("componentes", 2, [("vacío", lambda: header + "(la plantilla no trae árboles para los componentes seleccionados)")])
+    return PromptPart("componentes", 2, [
+        ("completo", lambda: header + "\n\n".join(f"### {name}\n{brief}" for name, brief in briefs)),
+        ("solo componentes", lambda: header + "\n".join(f"- {name}" for name, _ in briefs)),
+    ])
+
+
+def _document_context(clean: dict, causas_tree: Optional[Dict[str, Any]],
+                      objetivos_tree: Optional[Dict[str, Any]],
+                      briefs: Optional[List[Tuple[str, str]]] = None) -> str:
+    """Encabezado de contexto compartido por todas las secciones del documento.
+
+    Con `briefs` (plantilla general) los árboles se sustituyen por los resúmenes por componente.
+    Se ajusta a DOC_PROMPT_BUDGET: primero se compactan los árboles (la parte más grande y de
+    menor prioridad), luego los datos del usuario; las instrucciones no se tocan. Dentro del
+    presupuesto el texto es idéntico al de siempre (y las llaves de la caché del LLM no cambian).
+    """
+    datos = "Datos del usuario (JSON):\n"
+    if briefs is not None:
+        trees = [_briefs_part(briefs)]
+    else:
+        trees = [
+            _outline_part("causas", "Árbol de causas/efectos (outline):\n", causas_tree_to_outline, causas_tree, "(sin causas)"),
+            _outline_part("objetivos", "Árbol de objetivos/medios/fines (outline):\n", objetivos_tree_to_outline, objetivos_tree, "(sin objetivos)"),
+        ]
+    fitted = DOC_PROMPT.fit([
+        PromptPart("instrucciones", 9, [("completo", lambda: _CONTEXT_HEAD)], truncatable=False),
+        PromptPart("datos", 3, [
+            ("completo", lambda: datos + json.dumps(clean, ensure_ascii=False, indent=2)),
+            ("JSON compacto", lambda: datos + json.dumps(clean, ensure_ascii=False, separators=(",", ":"))),
+            ("valores recortados", lambda: datos + json.dumps(_clip_values(clean), ensure_ascii=False, separators=(",", ":"))),
+        ]),
+        *trees,
+        PromptPart("cierre", 9, [("completo", lambda: _CONTEXT_TAIL)], truncatable=False),
+    ], label="contexto del documento")
+    t = fitted.texts
+    return t["instrucciones"] + "\n\n".join([t["datos"], *(t[p.name] for p in trees), t["cierre"]])
+
+
+def _generate_section(context_md: str, title: str, instruction: str, *, client,
+                      deadline: Optional[float] = None) -> str:
+    """Una sección: reintenta ante errores y empalma continuaciones (finish_reason == "length")."""
+    messages = [_DOC_SYSTEM_MSG, {"role": "user", "content": (
+        f"{context_md}\n\n"
+        f"TAREA: redacta ÚNICAMENTE el contenido de la sección '## {title}'. {instruction}\n"
+        "No repitas el título de la sección ni escribas otras secciones."
+    )}]
+    prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+    with span("documento.seccion", title=title, prompt_tokens=prompt_tokens):
+        return _generate_section_attempts(messages, title, prompt_tokens, client=client, deadline=deadline)
+
+
+def _generate_section_attempts(messages, title: str, prompt_tokens: int, *, client,
+                               deadline: Optional[float]) -> str:
+    error = None
+    for attempt in range(1, DOC_SECTION_ATTEMPTS + 1):
+        try:
+            t0 = time.perf_counter()
+            text = ask_markdown_azure(
+                messages, client=client, max_tokens=DOC_SECTION_MAX_TOKENS, temperature=0.4, use_primer=False,
+                deadline=deadline, site="seccion_documento"
+            )
+            logger.info("Sección '%s' generada en %.2fs (intento %d, %d tokens de entrada)", title,
+                        time.perf_counter() - t0, attempt, prompt_tokens)
+            return _LEADING_HEADING_RE.sub("", text, count=1).strip()
+        except DeadlineExceeded as e:
+            error = e
+            break
+        except Exception as e:
+            error = e
+            logger.warning("Falló la sección '%s' (intento %d): %s", title, attempt, e)
+    logger.error("Sección '%s' omitida: %s", title, error)
+    return "*No fue posible generar esta sección. Complétela manualmente.*"
+
+
+def generate_sections_markdown(
+    context_md: str,
+    *,
+    client,
+    sections: Optional[List[Tuple[str, str]]] = None,
+    max_workers: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """Pide cada sección en paralelo (hasta `max_workers` a la vez) y las une en el orden fijo.
+    La latencia total queda cerca de la de la sección más lenta y no de la suma.
+    Las secciones que no terminan antes de `deadline` quedan con un texto de reemplazo.
+    """
+    sections = DOC_SECTIONS if sections is None else sections
+    workers = max(1, min(max_workers or DOC_SECTION_CONCURRENCY, len(sections) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="doc-section") as pool:
+        futures = [pool.submit(bind(_generate_section), context_md, title, instr, client=client, deadline=deadline) for title, instr in sections]
+        bodies = [f.result() for f in futures]
+    return "\n\n".join(f"## {title}\n\n{body}" for (title, _), body in zip(sections, bodies))
+
+
+# -------------------------- Resúmenes por componente (map-reduce) --------------------------
+# La plantilla general trae una hoja por componente ({"IDEC-1-Gobernanza": {"causas": ..., "objetivos": ...}}).
+# Map: cada hoja de un componente elegido se resume en paralelo en un brief compacto.
+# Reduce: las secciones del documento se redactan a partir de esos briefs.
+# Componentes IDEC del flujo (idec_componentes) -> prefijo de su hoja en la plantilla
+IDEC_COMPONENT_SHEETS: Dict[str, str] = {
+    "Gobernanza de datos": "IDEC-1",
+    "Herramientas técnicas y tecnológicas": "IDEC-2",
+    "Interoperabilidad": "IDEC-3",
+    "Seguridad y privacidad de datos": "IDEC-4",
+    "Datos": "IDEC-5",
+    "Aprovechamiento de datos": "IDEC-6",
+}
+DOC_BRIEF_MAX_TOKENS = int(os.getenv("DOC_BRIEF_MAX_TOKENS", "600"))
+
+
+def is_multi_sheet_tree(tree: Optional[Dict[str, Any]]) -> bool:
+    """Árbol por hojas (plantilla general) en lugar de un único árbol con "items"."""
+    return bool(tree) and "items" not in tree and all(
+        isinstance(v, dict) and ("causas" in v or "objetivos" in v) for v in tree.values()
+    )
+
+
+def _sheet_prefix(sheet: str) -> str:
+    return "-".join(sheet.split("-")[:2])
+
+
+def _sheet_has_content(sheet_tree: Dict[str, Any]) -> bool:
+    return any((sheet_tree.get(k) or {}).get("items") for k in ("causas", "objetivos"))
+
+
+def select_component_sheets(tree: Dict[str, Any], responses: dict) -> List[Tuple[str, Dict[str, Any]]]:
+    """(componente, árbol de la hoja) para las hojas de los componentes elegidos, en el orden del libro.
+
+    - IDEC: las hojas de `responses['idec_componentes']` (todas las IDEC si la sesión no los guardó)
+    - IA: el flujo no pide componentes, así que entran todas las hojas IA si la vertical incluye IA
+    - Hojas vacías no cuentan; si ninguna hoja sigue la convención IDEC-n / IA-n se usan todas
+    """
+    vertical = str(responses.get("vertical") or "")
+    selected = responses.get("idec_componentes")
+    if isinstance(selected, str):
+        selected = [selected]
+    labels = {prefix: name for name, prefix in IDEC_COMPONENT_SHEETS.items()}
+    wanted = set(labels) if selected is None else {IDEC_COMPONENT_SHEETS[c] for c in selected if c in IDEC_COMPONENT_SHEETS}
+
+    known = [sheet for sheet in tree if sheet.startswith(("IDEC-", "IA-"))]
+    out = []
+    for sheet, sheet_tree in tree.items():
+        if not _sheet_has_content(sheet_tree):
+            continue
+        prefix = _sheet_prefix(sheet)
+        if not known:
+            out.append((sheet.replace("_", " "), sheet_tree))
+        elif sheet.startswith("IDEC-") and "IDEC" in vertical and prefix in wanted:
+            out.append((labels.get(prefix, sheet), sheet_tree))
+        elif sheet.startswith("IA-") and "IA" in vertical:
+            out.append(("IA: " + sheet.split("-", 2)[-1].replace("_", " "), sheet_tree))
+    return out
+
+
+def _component_brief(component: str, sheet_tree: Dict[str, Any], *, client, cache=None,
+                     deadline: Optional[float] = None) -> str:
+    """Map: brief de un componente a partir de sus árboles; si el modelo falla, su outline sin ramas."""
+    fitted = DOC_PROMPT.fit([
+        PromptPart("instrucciones", 9, [("completo", lambda: (
+            f"Resume el componente '{component}' de un proyecto de inversión pública (MGA, DNP Colombia) "
+            "a partir de sus árboles. Devuelve viñetas breves en Markdown, sin títulos ni códigos (C1, CI1, O1, MI1): "
+            "el problema central, cada causa con su efecto directo, cada objetivo con su medio y su fin, "
+            "y las causas/medios indirectos más relevantes. No inventes datos.\n\n"
+        ))], truncatable=False),
+        _outline_part("causas", "Árbol de causas/efectos (outline):\n", causas_tree_to_outline, sheet_tree.get("causas"), "(sin causas)"),
+        _outline_part("objetivos", "Árbol de objetivos/medios/fines (outline):\n", objetivos_tree_to_outline, sheet_tree.get("objetivos"), "(sin objetivos)"),
+    ], label=f"resumen de '{component}'")
+    t = fitted.texts
+    messages = [_DOC_SYSTEM_MSG, {"role": "user", "content": t["instrucciones"] + t["causas"] + "\n\n" + t["objetivos"]}]
+    try:
+        with span("documento.resumen", component=component, prompt_tokens=fitted.total):
+            return ask_markdown_azure(messages, client=client, max_tokens=DOC_BRIEF_MAX_TOKENS, temperature=0.2,
+                                      use_primer=False, cache=cache, deadline=deadline, site="resumen_componente").strip()
+    except Exception as e:
+        logger.warning("Resumen del componente '%s' no disponible (%s); se usa su outline", component, e)
+        return "\n".join((causas_tree_to_outline(sheet_tree.get("causas"), depth=OUTLINE_DIRECTS),
+                          objetivos_tree_to_outline(sheet_tree.get("objetivos"), depth=OUTLINE_DIRECTS)))
+
+
+def summarize_components(
+    components: List[Tuple[str, Dict[str, Any]]],
+    *,
+    client,
+    cache=None,
+    max_workers: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> List[Tuple[str, str]]:
+    """Map en paralelo (hasta `max_workers` a la vez): [(componente, brief)] en el mismo orden."""
+    if not components:
+        return []
+    t0 = time.perf_counter()
+    workers = max(1, min(max_workers or DOC_SECTION_CONCURRENCY, len(components)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="doc-brief") as pool:
+        futures = [pool.submit(bind(_component_brief), name, sheet_tree, client=client, cache=cache, deadline=deadline)
+                   for name, sheet_tree in components]
+        briefs = [(name, f.result()) for (name, _), f in zip(components, futures)]
+    logger.info("Resúmenes de %d componente(s) en %.2fs", len(briefs), time.perf_counter() - t0)
+    return briefs
+
+
+# Texto aclaratorio y recomendaciones que siempre va después del título
+NOTA_ACLARA_MD = (
+    "**Nota aclaratoria:** Esta plantilla es bosquejo preliminar para la estructuración del proyecto de inversión. "
+    "Recordar que esta información debe ser validada y trabajada por la entidad pública, dado que no se constituye "
+    "como un documento formal para ser presentado ante la Dirección de Inversiones.\n\n\n"
+    "## Recomendaciones\n\n"
+    "También con el ánimo de fortalecer el documento que se está construyendo se sugiere revisar las guías y documentos "
+    "oficiales sobre formulación de proyectos de inversión, en especial:\n\n"
+    "El Manual de usuario del asistente que lo encuentras en el botón de \"Manual de usuario\"\n\n\n"
+    "Manuales: Metodología General Ajustada para la formulación de proyectos de inversión pública en Colombia; "
+    "Guía orientadora para la definición de productos: "
+    "[Manuales DNP](https://www.dnp.gov.co/LaEntidad_/subdireccion-general-inversiones-seguimiento-evaluacion/direccion-proyectos-informacion-para-inversion-publica/Paginas/manuales.aspx)\n\n\n"
+    "Cadena de valor: Guía de Cadena de Valor\n\n"
+    "Guía para la formulación de indicadores: Guía Metodológica para la formulación de indicadores\n\n"
+    "Instrumento de la MGA que consiste en la estandarización de los bienes y servicios que se pueden financiar y generar "
+    "a través de los recursos públicos que son ejecutados a través de los proyectos de inversión pública. En este archivo "
+    "encontrará la información estandarizada a nivel de sectores, programas y subprogramas; sectores; y productos: "
+    "[Catálogo de Productos](https://colaboracion.dnp.gov.co/CDT/proyectosinformacioninversionpublica/catalogos/CATALOGO_DE_PRODUCTOS.xlsx?Web=1)\n\n\n"
+    "Las guías de recomendaciones para la formulación de proyectos de inversión de la IDEC e IA (Pendiente ruta)\n\n"
+    "Guía de recomendaciones para la formulación de proyectos IDEC e IA para las entidades territoriales: (Pendiente ruta)\n\n\n"
+)
+
+# Texto final que siempre va al final del documento
+TEXTO_FINAL_MD = (
+    "\n\n"
+    "Tener en cuenta que las siguientes secciones deben completarse en el documento final de proyectos de inversión, "
+    "dado que este documento es solo un bosquejo preliminar para la estructuración del proyecto de inversión.\n\n\n"
+    "En la plantilla que se descargue se incorporen elementos adicionales (vacíos) que debe tener el proyecto:\n\n\n"
+    "## Participantes\n\n"
+    "- Identificación de los participantes\n"
+    "- Análisis de los participantes\n\n"
+    "## Población\n\n"
+    "- Población afectada por el problema\n"
+    "- Población objetivo de la intervención\n\n"
+    "## Alternativas de la solución\n\n"
+    "- Soluciones identificadas\n"
+    "- Alternativa de solución seleccionada\n\n"
+    "## Estudio de necesidades\n\n"
+    "- Bien o servicio a entregar o demanda a satisfacer\n"
+    "- Análisis técnico de la alternativa\n"
+    "- Localización de la alternativa\n\n"
+    "## Localización\n\n"
+    "Localización (Región-Departamento-Municipio-Tipo de agrupación-Agrupación-Específica-Latitud-Longitud)\n\n"
+    "## Cadena de valor\n\n"
+    "Estructura del Enfoque de Marco Lógico en la cadena de valor con el desarrollo metodológico de las actividades:\n\n"
+    "- Producto\n"
+    "- Entregable\n"
+    "- Indicador\n"
+    "- Actividad\n\n"
+    "## Análisis de riesgos\n\n"
+    "Análisis de riesgos para la alternativa de solución seleccionada\n\n"
+    "## Análisis de cuantificación\n\n"
+    "Análisis de cuantificación de los ingresos y beneficios\n\n"
+    "## Análisis de la estrategia de sostenibilidad\n\n"
+    "Análisis de la estrategia de sostenibilidad de la alternativa seleccionada\n\n"
+    "## Regionalización de recursos\n\n"
+    "Regionalización de recursos (si aplica)\n\n"
+    "## Focalización de políticas transversales\n\n"
+    "Focalización de políticas transversales (si aplica)\n\n"
+    "### Resumen políticas con característica poblacional\n\n"
+    "- Políticas con población\n"
+    "- Políticas sin población\n"
+    "- Cruce de políticas\n"
+    "- Resumen de focalización\n"
+)
+
+# Esqueleto .docx con título vacío, nota aclaratoria, marcador del cuerpo y texto final.
+# Se renderiza una vez y se guarda en bytes; cada documento lo abre y solo renderiza el cuerpo.
+# La llave es el hash de los textos fijos: si cambian, el esqueleto se reconstruye solo.
+_BODY_MARKER = "{{cuerpo_del_documento}}"
+_skeleton_lock = threading.Lock()
+_skeleton: Dict[str, Any] = {}
+
+
+def _boilerplate_key() -> str:
+    return hashlib.sha256(f"{NOTA_ACLARA_MD}\x00{TEXTO_FINAL_MD}".encode("utf-8")).hexdigest()
+
+
+def _build_skeleton() -> Tuple[bytes, int]:
+    doc = Document()
+    doc.add_heading("", level=0).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    render_markdown(doc, NOTA_ACLARA_MD)
+    marker = doc.add_paragraph(_BODY_MARKER)
+    render_markdown(doc, TEXTO_FINAL_MD)
+    index = list(doc.element.body).index(marker._p)
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue(), index
+
+
+def _document_from_skeleton():
+    """Copia nueva del esqueleto y el párrafo marcador donde va el cuerpo generado."""
+    key = _boilerplate_key()
+    with _skeleton_lock:
+        if _skeleton.get("key") != key:
+            data, index = _build_skeleton()
+            _skeleton.update(key=key, data=data, index=index)
+        data, index = _skeleton["data"], _skeleton["index"]
+    doc = Document(BytesIO(data))
+    return doc, doc.element.body[index]
+
+
 def generate_project_document(
     responses: dict,
     *,
@@ -211,12 +763,18 @@ def generate_project_document(
     causas_tree: Optional[Dict[str, Any]] = None,
     objetivos_tree: Optional[Dict[str, Any]] = None,
     formularios_json_dir: Optional[str] = None,
+    deadline: Optional[float] = None,
+    cache=None,
 ) -> str:
     """Genera el .docx del proyecto con secciones que justifican el proyecto basado en
     los árboles de Causas/Efectos y Objetivos/Medios/Fines, manteniendo el orden de secciones definido.
+    Con la plantilla general (un árbol por hoja) se resumen primero, en paralelo, solo las hojas de
+    los componentes elegidos; `cache` (CompletionCache) reutiliza esos resúmenes entre documentos.
+    `deadline` (ver deadline_after) acota el tiempo total de las llamadas al LLM.
     """
     if not filename:
-        filename = f"proyecto_inversion_{int(time.time())}.docx"
+        # Sufijo aleatorio: varios trabajos pueden terminar en el mismo segundo
+        filename = f"proyecto_inversion_{int(time.time())}_{uuid.uuid4().hex[:6]}.docx"
     os.makedirs(documents_dir, exist_ok=True)
     filepath = os.path.join(documents_dir, filename)
 
@@ -225,11 +783,11 @@ def generate_project_document(
         # Para plantilla general, buscar archivo JSON único que contiene todo
         if causas_tree is None or objetivos_tree is None:
             if responses.get("upload_plantilla"):
-                # El archivo JSON tiene el mismo nombre base que el Excel pero con extensión .json
-                # Ejemplo: plantilla-mi-proyecto.xlsx -> plantilla-mi-proyecto.json
+                # El árbol tiene el mismo nombre base que el Excel (.tree, o .json si es anterior)
+                # Ejemplo: plantilla-mi-proyecto.xlsx -> plantilla-mi-proyecto.tree
                 base_plantilla = os.path.splitext(responses["upload_plantilla"])[0]  # sin .xlsx
-                json_path = os.path.join(formularios_json_dir, f"{base_plantilla}.json")
-                if os.path.exists(json_path):
+                json_path = find_tree(formularios_json_dir, base_plantilla)
+                if json_path:
                     # El JSON contiene todas las hojas con causas y objetivos
                     tree_data = load_tree_json(json_path)
                     if tree_data:
@@ -241,152 +799,38 @@ def generate_project_document(
             elif responses.get("upload_causa"):
                 base = os.path.splitext(responses["upload_causa"])[0]  # sin .xlsx
                 if causas_tree is None:
-                    causas_tree = load_tree_json(os.path.join(formularios_json_dir, f"{base}.json"))
+                    causas_tree = load_tree_json(os.path.join(formularios_json_dir, f"{base}.tree"))
             elif responses.get("upload_objetivo"):
                 base = os.path.splitext(responses["upload_objetivo"])[0]
                 if objetivos_tree is None:
-                    objetivos_tree = load_tree_json(os.path.join(formularios_json_dir, f"{base}.json"))
+                    objetivos_tree = load_tree_json(os.path.join(formularios_json_dir, f"{base}.tree"))
 
     clean = _filtered_responses_for_report(responses)
-    causas_outline = causas_tree_to_outline(causas_tree) if causas_tree else "(sin causas)"
-    objetivos_outline = objetivos_tree_to_outline(objetivos_tree) if objetivos_tree else "(sin objetivos)"
-
-    # Prompt con orden de secciones fijo y sin códigos de IDs visibles
-    prompt = (
-    "Eres un experto en formulación de proyectos bajo la Metodología General Ajustada (MGA) del Departamento Nacional de Planeación en Colombia (DNP). "
-    "Redacta en ESPAÑOL y devuelve el contenido en Markdown estructurado con #, ##, ### y #### (sin códigos C1/O1 visibles ni siglas sin desarrollar). "
-    "El sistema convertirá luego a Word con títulos y estilos formales.\n\n"
-    
-    "AL INICIO DEL DOCUMENTO, GENERA EL SIGUIENTE ENCABEZADO INSTITUCIONALCENTRADO:\n"
-    f"**{fecha_actual}**"
-    "\n\n"
-    
-    "ORDEN OBLIGATORIO DE SECCIONES (usa encabezados Markdown):\n"
-    "## Introducción\n"
-    "## Planteamiento del problema u oportunidad\n"
-    "## Localización\n"
-    "## Marco del problema: Causas y efectos\n"
-    "## Marco de objetivos: Medios y fines\n"
-    "## Componentes del proyecto\n"
-    "## Cadena de valor\n"
-    "## Conclusión y justificación final\n\n"
-    
-    "INSTRUCCIONES:\n"
-    "- Integra los datos del usuario y los árboles provistos.\n"
-    "- No uses siglas ni abreviaturas: escribe los nombres completos de las entidades (por ejemplo, 'Ministerio de Educación Nacional' en lugar de 'MinEducación').\n"
-    "- En 'Marco del problema: Causas y efectos': para cada causa, usa '### Causa' con una explicación; luego '#### Efecto directo' y '#### Causas indirectas'.\n"
-    "- En 'Marco de objetivos: Medios y fines': usa '### Objetivo', '#### Medio directo', '#### Fin directo' y '#### Medios indirectos'.\n"
-    "- En 'Componentes del proyecto' enumera los componentes seleccionados por el usuario y explica brevemente su papel.\n"
-    "- Mantén coherencia narrativa entre el problema y los objetivos, y finaliza con una conclusión justificativa del proyecto.\n\n"
-    "FORMATO:\n"
-    "- El título principal y los datos de encabezado deben ir centrados.\n"
-    "- Todo el cuerpo del texto debe estar con alineación justificada.\n\n"
-
-    f"Datos del usuario (JSON):\n{json.dumps(clean, ensure_ascii=False, indent=2)}\n\n"
-    "Árbol de causas/efectos (outline):\n" + causas_outline + "\n\n"
-    "Árbol de objetivos/medios/fines (outline):\n" + objetivos_outline + "\n\n"
-    "RECUERDA: No incluyas códigos como C1, CI1, O1, MI1 en los títulos ni en el texto. "
-    "Verifica consistencia numérica, define términos confusos y resume los hallazgos clave al final."
-    "En caso de que no te den algunos datos, pero lo puedas conseguir en internet colocalos y referencialos. Por ejemplo, la cantidad de habitantes de alguna zona, si te dan especificaciones de dónde está la pobklación y quiénes son, puedes buscar en tu base de datos o en internet para averiguar qué numero puede ser, estimandolo"
-)
-
 
-    completion = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        messages=[
-            {"role": "system", "content": SYSTEM_PRIMER + "\nResponde exclusivamente en Markdown válido."},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=3000,
-        temperature=0.4,
-    )
-    md_text = (completion.choices[0].message.content or "").strip()
-
-    # Escribir DOCX desde Markdown simple
-    doc = Document()
-    # Título del documento (nivel 0)
-    titulo = responses.get("nombre_proyecto") or "Proyecto de Inversión - IDEC/IA"
-    doc.add_heading(titulo, level=0)
-    
-    # Texto aclaratorio y recomendaciones que siempre va después del título
-    nota_aclara_md = (
-        "**Nota aclaratoria:** Esta plantilla es bosquejo preliminar para la estructuración del proyecto de inversión. "
-        "Recordar que esta información debe ser validada y trabajada por la entidad pública, dado que no se constituye "
-        "como un documento formal para ser presentado ante la Dirección de Inversiones.\n\n\n"
-        "## Recomendaciones\n\n"
-        "También con el ánimo de fortalecer el documento que se está construyendo se sugiere revisar las guías y documentos "
-        "oficiales sobre formulación de proyectos de inversión, en especial:\n\n"
-        "El Manual de usuario del asistente que lo encuentras en el botón de \"Manual de usuario\"\n\n\n"
-        "Manuales: Metodología General Ajustada para la formulación de proyectos de inversión pública en Colombia; "
-        "Guía orientadora para la definición de productos: "
-        "[Manuales DNP](https://www.dnp.gov.co/LaEntidad_/subdireccion-general-inversiones-seguimiento-evaluacion/direccion-proyectos-informacion-para-inversion-publica/Paginas/manuales.aspx)\n\n\n"
-        "Cadena de valor: Guía de Cadena de Valor\n\n"
-        "Guía para la formulación de indicadores: Guía Metodológica para la formulación de indicadores\n\n"
-        "Instrumento de la MGA que consiste en la estandarización de los bienes y servicios que se pueden financiar y generar "
-        "a través de los recursos públicos que son ejecutados a través de los proyectos de inversión pública. En este archivo "
-        "encontrará la información estandarizada a nivel de sectores, programas y subprogramas; sectores; y productos: "
-        "[Catálogo de Productos](https://colaboracion.dnp.gov.co/CDT/proyectosinformacioninversionpublica/catalogos/CATALOGO_DE_PRODUCTOS.xlsx?Web=1)\n\n\n"
-        "Las guías de recomendaciones para la formulación de proyectos de inversión de la IDEC e IA (Pendiente ruta)\n\n"
-        "Guía de recomendaciones para la formulación de proyectos IDEC e IA para las entidades territoriales: (Pendiente ruta)\n\n\n"
-    )
-    
-    # Agregar el texto aclaratorio al documento
-    for line in nota_aclara_md.splitlines():
-        _add_markdown_line(doc, line)
-    
-    # Agregar el contenido generado por la IA
-    for line in md_text.splitlines():
-        _add_markdown_line(doc, line)
-    
-    # Texto final que siempre va al final del documento
-    texto_final_md = (
-        "\n\n"
-        "Tener en cuenta que las siguientes secciones deben completarse en el documento final de proyectos de inversión, "
-        "dado que este documento es solo un bosquejo preliminar para la estructuración del proyecto de inversión.\n\n\n"
-        "En la plantilla que se descargue se incorporen elementos adicionales (vacíos) que debe tener el proyecto:\n\n\n"
-        "## Participantes\n\n"
-        "- Identificación de los participantes\n"
-        "- Análisis de los participantes\n\n"
-        "## Población\n\n"
-        "- Población afectada por el problema\n"
-        "- Población objetivo de la intervención\n\n"
-        "## Alternativas de la solución\n\n"
-        "- Soluciones identificadas\n"
-        "- Alternativa de solución seleccionada\n\n"
-        "## Estudio de necesidades\n\n"
-        "- Bien o servicio a entregar o demanda a satisfacer\n"
-        "- Análisis técnico de la alternativa\n"
-        "- Localización de la alternativa\n\n"
-        "## Localización\n\n"
-        "Localización (Región-Departamento-Municipio-Tipo de agrupación-Agrupación-Específica-Latitud-Longitud)\n\n"
-        "## Cadena de valor\n\n"
-        "Estructura del Enfoque de Marco Lógico en la cadena de valor con el desarrollo metodológico de las actividades:\n\n"
-        "- Producto\n"
-        "- Entregable\n"
-        "- Indicador\n"
-        "- Actividad\n\n"
-        "## Análisis de riesgos\n\n"
-        "Análisis de riesgos para la alternativa de solución seleccionada\n\n"
-        "## Análisis de cuantificación\n\n"
-        "Análisis de cuantificación de los ingresos y beneficios\n\n"
-        "## Análisis de la estrategia de sostenibilidad\n\n"
-        "Análisis de la estrategia de sostenibilidad de la alternativa seleccionada\n\n"
-        "## Regionalización de recursos\n\n"
-        "Regionalización de recursos (si aplica)\n\n"
-        "## Focalización de políticas transversales\n\n"
-        "Focalización de políticas transversales (si aplica)\n\n"
-        "### Resumen políticas con característica poblacional\n\n"
-        "- Políticas con población\n"
-        "- Políticas sin población\n"
-        "- Cruce de políticas\n"
-        "- Resumen de focalización\n"
-    )
-    
-    # Agregar el texto final al documento
-    for line in texto_final_md.splitlines():
-        _add_markdown_line(doc, line)
-    
-    doc.save(filepath)
+    # Plantilla general: map (un resumen por componente elegido) antes de redactar las secciones
+    briefs = None
+    if is_multi_sheet_tree(causas_tree):
+        components = select_component_sheets(causas_tree, responses)
+        briefs = summarize_components(components, client=client, cache=cache, deadline=deadline)
+
+    # Reduce: contexto común a todas las secciones (ajustado al presupuesto de tokens); cada sección se pide por separado y en paralelo
+    with span("documento.contexto"):
+        context_md = _document_context(clean, causas_tree, objetivos_tree, briefs)
+    md_text = f"<center>**{fecha_actual}**</center>\n\n" + generate_sections_markdown(context_md, client=client, deadline=deadline)
+
+    # Escribir DOCX: la nota aclaratoria y el texto final vienen ya renderizados en el esqueleto
+    with DOCX_SECONDS.time(), span("docx.render"):
+        doc, marker = _document_from_skeleton()
+        # Título del documento (nivel 0)
+        titulo = responses.get("nombre_proyecto") or "Proyecto de Inversión - IDEC/IA"
+        doc.paragraphs[0].add_run(titulo)
+
+        # Agregar el contenido generado por la IA (cuerpo justificado, como pide el prompt) en lugar del marcador
+        render_markdown(doc, md_text, justify=True, before=marker)
+        marker.getparent().remove(marker)
+
+        with span("docx.guardar"):
+            doc.save(filepath)
     return filepath
 
 
@@ -403,14 +847,6 @@ def _is_no(txt: str) -> bool:
     return bool(re.search(r"\bno\b", txt or "", flags=re.I))
 
 
-def _num_from_id(id_str: str) -> int:
-    """Convierte ID tipo 'C1' o 'O3' a número para ordenar de forma estable."""
-    if not id_str:
-        return 999999
-    digits = ''.join(ch for ch in id_str if ch.isdigit())
-    return int(digits) if digits else 999999
-
-
 def split_sheet_blocks(df: pd.DataFrame):
     """
     Divide automáticamente la hoja en dos bloques:
@@ -428,172 +864,47 @@ def split_sheet_blocks(df: pd.DataFrame):
 
 
 # -------------------------- Parsers Excel --------------------------
+def _iter_block_rows(rows):
+    """Itera filas como tuplas. Acepta tuplas de openpyxl o un DataFrame (NaN -> None,
+    enteros guardados como float -> int, igual que al pasar por un .xlsx)."""
+    if not isinstance(rows, pd.DataFrame):
+        yield from rows
+        return
+    for row in rows.itertuples(index=False, name=None):
+        vals = []
+        for v in row:
+            if v is None or v is pd.NA or v is pd.NaT or (isinstance(v, float) and v != v):
+                v = None
+            elif isinstance(v, float) and v.is_integer():
+                v = int(v)
+            vals.append(v)
+        yield tuple(vals)
+
+
 # Causas: A,B,C  | D (sep) | E,F,G (CI) | H (sep) | I,J,K (Efectos Indirectos)
 def parse_causas_xlsx(xlsx_path: str, *, sheet: Optional[str] = None, start_row: int = 3) -> Dict[str, Any]:
     wb = load_workbook(xlsx_path, data_only=True)
     ws = wb[sheet] if sheet else wb.active
-    causas: Dict[str, Any] = {}
-    ci_to_parent: Dict[str, str] = {}
-
-    for row in ws.iter_rows(min_row=start_row, values_only=True):
-        vals = list(row); vals += [None] * (11 - len(vals))
-        A,B,C,D,E,F,G,H,I,J,K = vals[:11]
-
-        if A:
-            id_causa = str(A).strip()
-            causas.setdefault(id_causa, {
-                "id": id_causa,
-                "descripcion": (str(B).strip() if B else None),
-                "efecto_directo": {"descripcion": (str(C).strip() if C else None)},
-                "causas_indirectas": {}
-            })
-
-        parent = str(E).strip() if E else None
-        ci_id  = str(F).strip() if F else None
-        ci_desc= str(G).strip() if G else None
-        if parent and ci_id:
-            base = causas.setdefault(parent, {
-                "id": parent, "descripcion": None,
-                "efecto_directo": {"descripcion": None},
-                "causas_indirectas": {}
-            })
-            base["causas_indirectas"].setdefault(ci_id, {
-                "id": ci_id, "descripcion": ci_desc, "efectos_indirectos": []
-            })
-            if ci_desc:
-                base["causas_indirectas"][ci_id]["descripcion"] = ci_desc
-            ci_to_parent[ci_id] = parent
-
-            if "*" in causas:
-                pend = causas["*"]["causas_indirectas"].pop(ci_id, None)
-                if pend:
-                    base["causas_indirectas"][ci_id]["efectos_indirectos"].extend(pend.get("efectos_indirectos", []))
-                    if not base["causas_indirectas"][ci_id].get("descripcion"):
-                        base["causas_indirectas"][ci_id]["descripcion"] = pend.get("descripcion")
-                if not causas["*"]["causas_indirectas"]:
-                    causas.pop("*", None)
-
-        ci_ref   = str(I).strip() if I else None
-        eff_id   = str(J).strip() if J else None
-        eff_desc = str(K).strip() if K else None
-        if ci_ref and eff_id:
-            parent = ci_to_parent.get(ci_ref)
-            ci_node = None
-            if parent and parent in causas:
-                ci_node = causas[parent]["causas_indirectas"].setdefault(
-                    ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
-                )
-            else:
-                for c in causas.values():
-                    if ci_ref in c["causas_indirectas"]:
-                        ci_node = c["causas_indirectas"][ci_ref]; break
-                if ci_node is None:
-                    dummy = causas.setdefault("*", {
-                        "id":"*","descripcion":None,
-                        "efecto_directo":{"descripcion":None},
-                        "causas_indirectas": {}
-                    })
-                    ci_node = dummy["causas_indirectas"].setdefault(
-                        ci_ref, {"id":ci_ref,"descripcion":None,"efectos_indirectos":[]}
-                    )
-            ci_node["efectos_indirectos"].append({"id": eff_id, "descripcion": eff_desc})
+    return parse_causas_rows(ws.iter_rows(min_row=start_row, values_only=True))
 
-    out: List[Dict[str, Any]] = []
-    for cid, c in list(causas.items()):
-        if cid == "*": continue
-        c["causas_indirectas"] = list(c["causas_indirectas"].values())
-        has_content = c.get("descripcion") or (c.get("efecto_directo") or {}).get("descripcion") or c["causas_indirectas"]
-        if not has_content: continue
-        out.append(c)
 
-    out.sort(key=lambda x: (_num_from_id(x.get("id", "")), x.get("id", "")))
-    return {"tipo": "causas", "items": out}
+def parse_causas_rows(rows) -> Dict[str, Any]:
+    """Arma el árbol de causas desde filas en memoria (tuplas de openpyxl o un DataFrame),
+    ya posicionadas en la primera fila de datos."""
+    return build_tree(_iter_block_rows(rows), CAUSAS_SPEC)
 
 
 # Objetivos: A,B,C,D | E (sep) | F,G,H (MI) | I (sep) | J,K,L (Fines Indirectos)
 def parse_objetivos_xlsx(xlsx_path: str, *, sheet: Optional[str] = None, start_row: int = 3) -> Dict[str, Any]:
     wb = load_workbook(xlsx_path, data_only=True)
     ws = wb[sheet] if sheet else wb.active
-    objetivos: Dict[str, Any] = {}
-    mi_to_parent: Dict[str, str] = {}
-
-    for row in ws.iter_rows(min_row=start_row, values_only=True):
-        vals = list(row); vals += [None] * (12 - len(vals))
-        A,B,C,D,E,F,G,H,I,J,K,L = vals[:12]
-
-        if A:
-            id_obj = str(A).strip()
-            objetivos.setdefault(id_obj, {
-                "id": id_obj,
-                "descripcion": (str(B).strip() if B else None),
-                "medio_directo": {"descripcion": (str(C).strip() if C else None)},
-                "fin_directo": {"descripcion": (str(D).strip() if D else None)},
-                "medios_indirectos": {}
-            })
-
-        parent = str(F).strip() if F else None
-        mi_id  = str(G).strip() if G else None
-        mi_desc= str(H).strip() if H else None
-        if parent and mi_id:
-            base = objetivos.setdefault(parent, {
-                "id": parent,
-                "descripcion": None,
-                "medio_directo": {"descripcion": None},
-                "fin_directo": {"descripcion": None},
-                "medios_indirectos": {}
-            })
-            base["medios_indirectos"].setdefault(mi_id, {
-                "id": mi_id, "descripcion": mi_desc, "fines_indirectos": []
-            })
-            if mi_desc:
-                base["medios_indirectos"][mi_id]["descripcion"] = mi_desc
-            mi_to_parent[mi_id] = parent
-
-            if "*" in objetivos:
-                pend = objetivos["*"]["medios_indirectos"].pop(mi_id, None)
-                if pend:
-                    base["medios_indirectos"][mi_id]["fines_indirectos"].extend(pend.get("fines_indirectos", []))
-                    if not base["medios_indirectos"][mi_id].get("descripcion"):
-                        base["medios_indirectos"][mi_id]["descripcion"] = pend.get("descripcion")
-                if not objetivos["*"]["medios_indirectos"]:
-                    objetivos.pop("*", None)
-
-        mi_ref  = str(J).strip() if J else None
-        fi_id   = str(K).strip() if K else None
-        fi_desc = str(L).strip() if L else None
-        if mi_ref and fi_id:
-            parent = mi_to_parent.get(mi_ref)
-            mi_node = None
-            if parent and parent in objetivos:
-                mi_node = objetivos[parent]["medios_indirectos"].setdefault(
-                    mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
-                )
-            else:
-                for o in objetivos.values():
-                    if mi_ref in o["medios_indirectos"]:
-                        mi_node = o["medios_indirectos"][mi_ref]; break
-                if mi_node is None:
-                    dummy = objetivos.setdefault("*", {
-                        "id":"*","descripcion":None,
-                        "medio_directo":{"descripcion":None},
-                        "fin_directo":{"descripcion":None},
-                        "medios_indirectos": {}
-                    })
-                    mi_node = dummy["medios_indirectos"].setdefault(
-                        mi_ref, {"id":mi_ref,"descripcion":None,"fines_indirectos":[]}
-                    )
-            mi_node["fines_indirectos"].append({"id": fi_id, "descripcion": fi_desc})
+    return parse_objetivos_rows(ws.iter_rows(min_row=start_row, values_only=True))
 
-    out: List[Dict[str, Any]] = []
-    for oid, o in list(objetivos.items()):
-        if oid == "*": continue
-        o["medios_indirectos"] = list(o["medios_indirectos"].values())
-        has_content = o.get("descripcion") or (o.get("medio_directo") or {}).get("descripcion") or (o.get("fin_directo") or {}).get("descripcion") or o["medios_indirectos"]
-        if not has_content: continue
-        out.append(o)
 
-    out.sort(key=lambda x: (_num_from_id(x.get("id", "")), x.get("id", "")))
-    return {"tipo": "objetivos", "items": out}
+def parse_objetivos_rows(rows) -> Dict[str, Any]:
+    """Arma el árbol de objetivos desde filas en memoria (tuplas de openpyxl o un DataFrame),
+    ya posicionadas en la primera fila de datos."""
+    return build_tree(_iter_block_rows(rows), OBJETIVOS_SPEC)
 
 
 # -------------------------- Render rápido de árboles a MD (para preview) --------------------------
@@ -631,40 +942,127 @@ def objetivos_tree_to_markdown(tree: Dict[str, Any]) -> str:
 def parse_mixed_sheet(filepath: str, sheet: str, start_row: int = 3) -> Dict[str, Any]:
     """
     Procesa una hoja que contiene causas y objetivos mezclados.
-    Divide la hoja por bloques y usa los parsers existentes.
+    Divide la hoja por bloques y pasa cada bloque en memoria a los parsers (sin archivos temporales).
     """
     df = pd.read_excel(filepath, sheet_name=sheet, header=None)
 
     causas_df, obj_df = split_sheet_blocks(df)
+    skip = max(start_row - 1, 0)
+
+    return {
+        "causas": parse_causas_rows(causas_df.iloc[skip:]),
+        "objetivos": parse_objetivos_rows(obj_df.iloc[skip:])
+    }
 
-    # Guardar como excels temporales para usar tus parsers existentes
-    tmp_causas = "/tmp/causas_tmp.xlsx"
-    tmp_obj = "/tmp/objetivos_tmp.xlsx"
 
-    causas_df.to_excel(tmp_causas, index=False, header=False)
-    obj_df.to_excel(tmp_obj, index=False, header=False)
+# Bloques de la hoja mixta: causas en A–K, objetivos en L–W
+CAUSAS_SLICE = slice(0, 11)
+OBJETIVOS_SLICE = slice(11, 23)
 
-    # Usamos tus parsers originales
-    causas_tree = parse_causas_xlsx(tmp_causas, sheet=None, start_row=start_row)
-    objetivos_tree = parse_objetivos_xlsx(tmp_obj, sheet=None, start_row=start_row)
+# Mismos textos que pd.read_excel interpreta como celda vacía (na_values por defecto)
+_NA_STRINGS = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
 
+
+def _row_block(row: tuple, cols: slice) -> Optional[tuple]:
+    """Recorta un bloque de columnas de la fila; None si el bloque está vacío (como dropna(how='all'))."""
+    block = tuple(None if (isinstance(v, str) and v in _NA_STRINGS) else v for v in row[cols])
+    if all(v is None for v in block):
+        return None
+    return block
+
+
+def parse_sheet_rows(rows, start_row: int = 3) -> Dict[str, Any]:
+    """
+    Procesa en una sola pasada las filas de una hoja mixta (causas + objetivos).
+    Reproduce el comportamiento de parse_mixed_sheet: cada bloque descarta sus filas
+    vacías y los datos empiezan en la fila `start_row` del bloque resultante.
+    """
+    causas_rows, obj_rows = [], []
+    for row in rows:
+        c = _row_block(row, CAUSAS_SLICE)
+        if c is not None:
+            causas_rows.append(c)
+        o = _row_block(row, OBJETIVOS_SLICE)
+        if o is not None:
+            obj_rows.append(o)
+
+    skip = max(start_row - 1, 0)
     return {
-        "causas": causas_tree,
-        "objetivos": objetivos_tree
+        "causas": parse_causas_rows(causas_rows[skip:]),
+        "objetivos": parse_objetivos_rows(obj_rows[skip:])
     }
 
 
-def parse_excel_all_sheets(filepath: str, start_row: int = 3) -> Dict[str, Any]:
-    wb = load_workbook(filepath, data_only=True)
-    result = {}
+# Parseo paralelo por hoja: solo para libros grandes (por debajo del umbral el pool no compensa)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+PARSE_PARALLEL_MIN_BYTES = int(os.getenv("PARSE_PARALLEL_MIN_BYTES", str(2 * 1024 * 1024)))
 
-    for sheet in wb.sheetnames:
-        parsed = parse_mixed_sheet(filepath, sheet, start_row=start_row)
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_workers = 0
+_parse_pool_lock = threading.Lock()
 
-        # Guardar incluso si alguna parte está vacía
-        result[sheet] = parsed
 
-    return result
+def _get_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool de procesos perezoso y reutilizado (uno por proceso worker de gunicorn)."""
+    global _parse_pool, _parse_pool_workers
+    with _parse_pool_lock:
+        if _parse_pool is None or _parse_pool_workers != workers:
+            if _parse_pool is not None:
+                _parse_pool.shutdown(wait=False)
+            # spawn: el proceso padre tiene hilos (cola de trabajos), fork no es seguro
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _parse_pool_workers = workers
+            atexit.register(_parse_pool.shutdown, wait=False)
+        return _parse_pool
+
+
+def _parse_sheets(filepath: str, sheet_names: Optional[List[str]], start_row: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Abre el libro en modo streaming y procesa las hojas indicadas (todas si sheet_names es None)."""
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheets = wb.worksheets if sheet_names is None else [wb[name] for name in sheet_names]
+        parsed = []
+        for ws in sheets:
+            with span("libro.hoja", sheet=ws.title):
+                parsed.append((ws.title, parse_sheet_rows(ws.iter_rows(values_only=True), start_row=start_row)))
+        return parsed
+    finally:
+        wb.close()
+
+
+def parse_excel_all_sheets(filepath: str, start_row: int = 3, *, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Abre el libro una sola vez (modo streaming) y procesa cada hoja recorriendo sus filas una vez.
+    Con `workers` > 1 (o PARSE_WORKERS) y un archivo de al menos PARSE_PARALLEL_MIN_BYTES, reparte
+    las hojas en un pool de procesos; el resultado conserva el orden de las hojas del libro.
+    """
+    with PARSE_SECONDS.time(), span("libro.parsear", bytes=os.path.getsize(filepath)) as sp:
+        sheets = _parse_workbook(filepath, start_row, workers)
+        sp.set(sheets=len(sheets))
+    WORKBOOK_SHEETS.observe(len(sheets))
+    return sheets
+
+
+def _parse_workbook(filepath: str, start_row: int, workers: Optional[int]) -> Dict[str, Any]:
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers > 1 and os.path.getsize(filepath) >= PARSE_PARALLEL_MIN_BYTES:
+        wb = load_workbook(filepath, read_only=True)
+        names = list(wb.sheetnames)
+        wb.close()
+        if len(names) > 1:
+            n = min(workers, len(names))
+            pool = _get_parse_pool(workers)
+            # Las hojas se parsean en otros procesos: la traza solo ve la espera de los lotes
+            with span("libro.pool", workers=n):
+                futures = [pool.submit(_parse_sheets, filepath, names[i::n], start_row) for i in range(n)]
+                parsed = dict(item for fut in futures for item in fut.result())
+            # Guardar incluso si alguna parte está vacía
+            return {name: parsed[name] for name in names}
+
+    # Guardar incluso si alguna parte está vacía
+    return dict(_parse_sheets(filepath, None, start_row))
 
 
 def process_uploaded_excel(tipo: str, filepath: str, out_dir: str) -> Dict[str, Any]:
@@ -715,11 +1113,13 @@ conversation_flow = {
     "gate_1_ciclo": {
         "prompt": "🔎 ¿Conoces el ciclo de inversión pública y las fases que lo componen?",
         "options": ["Sí, lo conozco", "No, no lo conozco"],
+        "alt_topic": "Explica el ciclo de inversión pública y sus fases principales.",
         "next_step": "gate_2_herramienta"
     },
     "gate_2_herramienta": {
         "prompt": "🧭 ¿Comprende que esta herramienta es de orientación y que el borrador resultante puede emplearse como insumo o apoyo en la etapa de formulación?",
         "options": ["Sí, lo comprendo", "No, no lo tengo claro"],
+        "alt_topic": "Explica por qué esta herramienta es de orientación y cómo el borrador sirve como insumo en formulación (MGA).",
         "next_step": "elige_vertical"
     },
 
@@ -730,12 +1130,24 @@ conversation_flow = {
 
     "elige_vertical": {
         "prompt": "💡 ¿Deseas construir un proyecto de inversión asociando componentes de tecnologías de la información y las comunicaciones en temas de Infraestructura de datos (IDEC) o Inteligencia Artificial (IA)? Puedes seleccionar una o ambas opciones.",
+        "multiselect": {"items": ["IDEC", "IA"], "hint": "\n\nSelecciona una o más opciones y pulsa **Confirmar**."},
         "next_step": "nombre_proyecto"
     },
 
     "idec_componentes": {
         "prompt":
             "📚 La siguiente es la lista de los componentes que integran la IDEC, por favor selecciona los componentes que deseas incluir en tu proyecto de inversión. Selección múltiple :\n",
+        "multiselect": {
+            "items": [
+                "Gobernanza de datos",
+                "Interoperabilidad",
+                "Herramientas técnicas y tecnológicas",
+                "Seguridad y privacidad de datos",
+                "Datos",
+                "Aprovechamiento de datos"
+            ],
+            "hint": "\n\nSelecciona una o más tarjetas y pulsa **Confirmar**."
+        },
         "next_step": "nombre_proyecto"
     },
 
@@ -754,6 +1166,7 @@ conversation_flow = {
         "2. Seleccione la **PlantillaIDEC-IA.xlsx**.\n"
         "3. Diligénciela con los árboles de problemas, objetivos, productos e indicadores.\n"
         "4. Súbala en el recuadro que aparece debajo.\n\n",
+        "upload": "plantilla",
         "next_step": "finalizado"
     }
 }